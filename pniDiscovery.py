@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import sys
+import os
 import getopt
 import logging
 
@@ -52,6 +53,13 @@ def main(args):
             try:
                 with open(inventory_file) as sf:
                     inv = sf.read()
+                # The discovery data of every node is removed, so that the next discovery is a full one rather than an
+                # incremental one reusing the saved interfaces and ACL status.
+                for node in filter(lambda line: line[0] != '#', [n for n in inv.split('\n') if n != '']):
+                    try:
+                        os.remove('.do_not_modify_'.upper() + node + '.dsc')
+                    except OSError:
+                        pass
                 with open(inventory_file, "w") as sf:
                     sf.write(inv)
             except IOError:
@@ -61,7 +69,7 @@ def main(args):
                 rootLogger.error("inventory_file is not defined in the %s" % config_file)
                 sys.exit(2)
             else:
-                rootLogger.info("Inventory Updated. Changes should take effect in the next polling cycle")
+                rootLogger.info("Inventory Updated. All nodes will be fully rediscovered in the next polling cycle")
 
 
 if __name__ == '__main__':
@@ -14,8 +14,25 @@ import paramiko
 import getpass
 import datetime
 import operator
+import functools
+import contextlib
 import gzip
+import zlib
 import fcntl
+import signal
+import atexit
+import pniMonitor_snmp
+import pniMonitor_engine
+import pniMonitor_ssh
+import pniMonitor_store
+import pniMonitor_decision
+import pniMonitor_audit
+import pniMonitor_fastpath
+import pniMonitor_events
+import pniMonitor_alerts
+import pniMonitor_metrics
+import pniMonitor_profile
+import pniMonitor_config
 
 ssh_logger = logging.getLogger('paramiko')
 ssh_formatter = logging.Formatter('%(asctime)-15s [%(levelname)s]: %(message)s')
@@ -31,6 +48,13 @@ main_fh.setFormatter(main_formatter)
 main_logger.setLevel(logging.INFO)
 main_logger.addHandler(main_fh)
 
+profile_logger = logging.getLogger('pniMonitor_profile')
+profile_fh = handlers.TimedRotatingFileHandler('pniMonitor_profile.log', when='midnight', delay=True)
+profile_fh.setFormatter(logging.Formatter('%(asctime)-15s %(threadName)-10s: %(message)s'))
+profile_logger.setLevel(logging.INFO)
+profile_logger.addHandler(profile_fh)
+profile_logger.propagate = False
+
 def tstamp(format):
     if format == 'hr':
         return time.asctime()
@@ -40,8 +64,16 @@ def tstamp(format):
 hd = os.environ['HOME']
 un = getpass.getuser()
 
-ssh = paramiko.SSHClient()
-ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+ssh_pool = pniMonitor_ssh.SessionPool()
+sample_cache = pniMonitor_store.SampleCache(main_logger)
+acl_auditor = pniMonitor_audit.Auditor()
+fast_path = pniMonitor_fastpath.FastPath(logger=main_logger)
+event_listener = pniMonitor_events.Listener(main_logger)
+alert_dispatcher = pniMonitor_alerts.Dispatcher('localhost', 'no-reply@automation.domain1.com',
+                                                'Virgin Media PNI Monitor', fallback=main_fh)
+metrics = pniMonitor_metrics.Registry()
+metrics_exporter = pniMonitor_metrics.Exporter(metrics, main_logger)
+profiler = pniMonitor_profile.Profiler(profile_logger)
 
 oidlist = ['.1.3.6.1.2.1.31.1.1.1.1',  #0 IF-MIB::ifName
            '.1.3.6.1.2.1.31.1.1.1.18', #1 IF-MIB::ifDescr
@@ -55,16 +87,122 @@ oidlist = ['.1.3.6.1.2.1.31.1.1.1.1',  #0 IF-MIB::ifName
            ".1.3.6.1.2.1.31.1.1.1.10",  #9 ifHCOutOctets
            ".1.3.6.1.4.1.9.9.187.1.2.5.1.3", #10 cbgpPeer2State 3active 6established
            ".1.3.6.1.4.1.9.9.187.1.2.8.1.1", #11 cbgpPeer2AcceptedPrefixes
-           #".1.3.6.1.4.1.9.9.808.1.1.4" #12 caAclAccessGroupCfgTable
+           ".1.3.6.1.2.1.1.3.0",  #12 sysUpTime
+           ".1.3.6.1.2.1.31.1.5.0",  #13 ifTableLastChange
+           #".1.3.6.1.4.1.9.9.808.1.1.4" #14 caAclAccessGroupCfgTable
            ]
 
+community = 'kN8qpTxH'
+
+# Labels and value formats used to render native SNMP responses the same way NetSNMP does with MIB translation enabled
+netsnmp_labels = {'.1.3.6.1.2.1.31.1.1.1.1': 'IF-MIB::ifName',
+                  '.1.3.6.1.2.1.31.1.1.1.18': 'IF-MIB::ifAlias',
+                  '.1.3.6.1.2.1.4.34.1.3': 'IP-MIB::ipAddressIfIndex',
+                  '.1.3.6.1.2.1.2.2.1.7': 'IF-MIB::ifAdminStatus',
+                  '.1.3.6.1.2.1.2.2.1.8': 'IF-MIB::ifOperStatus',
+                  '.1.3.6.1.2.1.31.1.1.1.15': 'IF-MIB::ifHighSpeed',
+                  '.1.3.6.1.2.1.31.1.1.1.6': 'IF-MIB::ifHCInOctets',
+                  '.1.3.6.1.2.1.31.1.1.1.10': 'IF-MIB::ifHCOutOctets',
+                  '.1.3.6.1.4.1': 'SNMPv2-SMI::enterprises'}
+netsnmp_strings = ('.1.3.6.1.2.1.31.1.1.1.1', '.1.3.6.1.2.1.31.1.1.1.18')
+netsnmp_enums = {'.1.3.6.1.2.1.2.2.1.7': {1: 'up', 2: 'down', 3: 'testing'},
+                 '.1.3.6.1.2.1.2.2.1.8': {1: 'up', 2: 'down', 3: 'testing', 4: 'unknown', 5: 'dormant',
+                                          6: 'notPresent', 7: 'lowerLayerDown'}}
+inet_types = {1: 'ipv4', 2: 'ipv6', 3: 'ipv4z', 4: 'ipv6z', 16: 'dns'}
+snmp_sessions = {}
+snmp_lock = threading.Lock()
+
+# Deadline (epoch) of the cycle run by the current thread; every SNMP, SSH and subprocess operation is bounded by it.
+cycle = threading.local()
+
+# Lines of interest in the 'sh access-lists <name> usage pfilter loc all' output
+acl_usage_re = re.compile(r'(Interface|Location|Input|Output)(?:\s+ACL)?\s*:\s*(.*?)$', re.I)
+
+
+def timeticks(value):
+    # TimeTicks as rendered by the native backend, (12345), or by NetSNMP, 1:2:03:04.56; None if neither.
+    try:
+        if value.startswith('('):
+            return int(value.strip('()'))
+        days, hours, minutes, seconds = value.split(':')
+        return ((int(days) * 24 + int(hours)) * 60 + int(minutes)) * 6000 + int(round(float(seconds) * 100))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _kill(proc, expired):
+    expired.set()
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def communicate(args, timeout):
+    # Popen.communicate() under a deadline. The child process (and anything it has spawned) is killed when the deadline
+    # expires, in which case None is returned instead of the (stdout, stderr) tuple.
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, preexec_fn=os.setsid)
+    expired = threading.Event()
+    timer = threading.Timer(timeout, _kill, [proc, expired])
+    timer.daemon = True
+    timer.start()
+    try:
+        output = proc.communicate()
+    finally:
+        timer.cancel()
+    return None if expired.is_set() else output
+
+
+def netsnmp_format(o, value, quiet='on'):
+    o = str(o)
+    column = max([c for c in netsnmp_labels if o.startswith(c + '.')] or [''], key=len)
+    if isinstance(value, (pniMonitor_snmp.OctetString, pniMonitor_snmp.Opaque)):
+        if column in netsnmp_strings:
+            vtype, text = 'STRING', str(value)
+        else:
+            vtype, text = 'Hex-STRING', ''.join('%02X ' % ord(c) for c in value)
+    elif isinstance(value, (int, long)) and column in netsnmp_enums and value in netsnmp_enums[column]:
+        vtype, text = 'INTEGER', netsnmp_enums[column][value] if quiet is 'on' else \
+            '%s(%d)' % (netsnmp_enums[column][value], value)
+    elif isinstance(value, pniMonitor_snmp.ObjectIdentifier):
+        vtype, text = 'OID', str(value)
+    elif isinstance(value, pniMonitor_snmp.IpAddress):
+        vtype, text = 'IpAddress', str(value)
+    elif isinstance(value, pniMonitor_snmp.TimeTicks):
+        vtype, text = 'Timeticks', '(%d)' % value
+    elif isinstance(value, (pniMonitor_snmp.Counter32, pniMonitor_snmp.Gauge32, pniMonitor_snmp.Counter64)):
+        vtype, text = type(value).__name__, str(value)
+    elif isinstance(value, (int, long)):
+        vtype, text = 'INTEGER', str(value)
+    else:
+        vtype, text = None, str(value)
+    if quiet is 'on':
+        return text
+    if column == '':
+        label = o
+    else:
+        index = o[len(column) + 1:]
+        if column == oidlist[2]:
+            index = [int(n) for n in index.split('.')]
+            if index[0] == 1 and len(index) == 6:
+                address = '.'.join(str(n) for n in index[2:])
+            else:
+                address = ':'.join(format(n, '02x') for n in index[2:])
+            index = '%s."%s"' % (inet_types.get(index[0], index[0]), address)
+        label = netsnmp_labels[column] + '.' + index
+    if vtype is None:
+        return '%s = %s' % (label, text)
+    return '%s = %s: %s' % (label, vtype, text)
+
 
 class Router(threading.Thread):
     dsc_oids = oidlist[:4]
     int_oids = oidlist[5:10]
-    bgp_oids = oidlist[10:]
+    bgp_oids = oidlist[10:12]
+    chg_oids = oidlist[12:14]
     def __init__(self, threadID, node, pw, dswitch, rising_threshold, falling_threshold, cdn_serving_cap,
-                 acl_name, dryrun, dataretention, int_identifiers, pfx_thresholds, snmptimeout, snmpretries):
+                 acl_name, dryrun, dataretention, int_identifiers, pfx_thresholds, snmptimeout, snmpretries,
+                 snmpbackend, probemode, snmppacketsize, sshtimeout=30, cycletimeout=None, discoverytimeout=None):
         threading.Thread.__init__(self, name='thread-%d_%s' % (threadID, node))
         self.node = node
         self.pw = pw
@@ -79,24 +217,52 @@ class Router(threading.Thread):
         self.dataretention = dataretention
         self.snmptimeout = snmptimeout
         self.snmpretries = snmpretries
+        self.snmpbackend = snmpbackend
+        self.probemode = probemode
+        self.snmppacketsize = snmppacketsize
+        self.sshtimeout = sshtimeout
+        self.cycletimeout = cycletimeout
+        self.discoverytimeout = discoverytimeout
+        self.thresholds = pniMonitor_decision.Thresholds(rising_threshold, falling_threshold, cdn_serving_cap,
+                                                         self.ipv4_minPfx, self.ipv6_minPfx)
 
     def run(self):
+        started = time.time()
+        try:
+            with profiler.cycle(self.node):
+                self._cycle()
+        finally:
+            metrics.observe('pnimonitor_cycle_duration_seconds', time.time() - started, node=self.node)
+            metrics.set('pnimonitor_last_cycle_timestamp_seconds', time.time(), node=self.node)
+
+    def _cycle(self):
         main_logger.info("Starting")
+        cycle.deadline = None if self.cycletimeout is None else time.time() + self.cycletimeout
         self.tstamp = tstamp('mr')
-        self.ipaddr = self.dns(self.node)
+        with self._phase('dns'):
+            self.ipaddr = self.dns(self.node)
+        self.dsc_indicators = {}
         if self.switch:
             main_logger.info("Inventory updated. Initializing node discovery")
-            for f in os.listdir('.'):
-                if self.node+'.dsc' in f or self.node+'.prb' in f:
-                    os.remove(f)
-            disc = self.discovery(self.ipaddr)
+            # The interfaces that are no longer monitored must not be exported with their last values.
+            for name in ('pnimonitor_interface_utilisation_mbps', 'pnimonitor_interface_utilisation_percent'):
+                metrics.remove(name, node=self.node)
+            try:
+                cached, cached_indicators = pniMonitor_store.load_discovery('.do_not_modify_'.upper() + self.node +
+                                                                            '.dsc')
+            except (IOError, pniMonitor_store.StoreError):
+                cached, cached_indicators = None, None
+            disc = self._discover(self.ipaddr, cached, cached_indicators)
         else:
             try:
-                with open('.do_not_modify_'.upper() + self.node + '.dsc') as tf:
-                    disc = eval(tf.read())
+                disc, self.dsc_indicators = pniMonitor_store.load_discovery('.do_not_modify_'.upper() + self.node +
+                                                                            '.dsc')
             except IOError:
                 main_logger.info("Discovery file(s) could not be located. Initializing node discovery")
-                disc = self.discovery(self.ipaddr)
+                disc = self._discover(self.ipaddr)
+            except pniMonitor_store.StoreError as err:
+                main_logger.warning("%s. Initializing node discovery" % err)
+                disc = self._discover(self.ipaddr)
         main_logger.info("Discovery data loaded")
         main_logger.debug("DISC successfully loaded: %s" % disc)
         self.pni_interfaces = [int for int in disc if disc[int]['type'] == 'pni']
@@ -104,11 +270,82 @@ class Router(threading.Thread):
         self.interfaces = self.pni_interfaces + self.cdn_interfaces
         if self.interfaces != []:
             main_logger.debug("Discovered interfaces: PNI %s CDN %s" % (self.pni_interfaces, self.cdn_interfaces))
-            self._process(self.ipaddr, disc)
+            event_listener.register(self.node, self.ipaddr, disc, self.reevaluate)
+            with fast_path.node_lock(self.node):
+                # Read again under the node lock, as the fast path may have blocked CDN interfaces (and saved their
+                # aclStatus) since the discovery data was loaded above. The audit saves the discovery data as well.
+                disc = self._reload(disc)
+                self._process(self.ipaddr, disc)
+                if self.cdn_interfaces != [] and acl_auditor.claim(self.node):
+                    with self._phase('audit'):
+                        self.audit(self.ipaddr, disc)
         else:
             main_logger.warning("No interfaces eligible for monitoring")
         main_logger.info("Completed")
 
+    def _discover(self, ipaddr, cached=None, cached_indicators=None):
+        # A full discovery of a large node can take longer than a polling cycle, so it is bounded by discovery_timeout
+        # instead of the cycle deadline, and the rest of the cycle is given a deadline of its own once it completes.
+        cycle.deadline = None if self.discoverytimeout is None else time.time() + self.discoverytimeout
+        with self._phase('discovery'):
+            disc = self.discovery(ipaddr, cached, cached_indicators)
+        cycle.deadline = None if self.cycletimeout is None else time.time() + self.cycletimeout
+        return disc
+
+    def _reload(self, disc):
+        # The discovery data as last saved; disc itself if the file can no longer be read.
+        try:
+            disc, self.dsc_indicators = pniMonitor_store.load_discovery('.do_not_modify_'.upper() + self.node + '.dsc')
+        except (IOError, pniMonitor_store.StoreError):
+            pass
+        return disc
+
+    def reevaluate(self, events):
+        # Out-of-band probe and process of the node, triggered by the trap / syslog listener. It runs on the worker
+        # thread of the node in the listener, so that the ACL push does not hold up the events of the other nodes,
+        # and under the node lock, as the regular cycle or the fast path of the node may be running at the same time.
+        main_logger.info("Out-of-band re-evaluation triggered by: %s" % ', '.join(events))
+        with fast_path.node_lock(self.node):
+            try:
+                disc, self.dsc_indicators = pniMonitor_store.load_discovery('.do_not_modify_'.upper() + self.node +
+                                                                            '.dsc')
+            except (IOError, pniMonitor_store.StoreError) as err:
+                main_logger.warning("Out-of-band re-evaluation skipped. Discovery data could not be loaded: %s" % err)
+                return
+            self.switch = False
+            cycle.deadline = None if self.cycletimeout is None else time.time() + self.cycletimeout
+            self.tstamp = tstamp('mr')
+            self._process(self.ipaddr, disc)
+        main_logger.info("Out-of-band re-evaluation completed")
+
+    @contextlib.contextmanager
+    def _phase(self, phase):
+        # Also records the duration of phases that are halted (sys.exit) or fail half way.
+        started = time.time()
+        try:
+            yield
+        finally:
+            self._observe(phase, time.time() - started)
+
+    def _observe(self, phase, elapsed):
+        metrics.observe('pnimonitor_phase_duration_seconds', elapsed, node=self.node, phase=phase)
+        profiler.phase(self.node, phase, elapsed)
+
+    def _timeout(self, operation, limit=None):
+        # Time left for an operation: its own limit, capped by what is left until the cycle deadline.
+        deadline = getattr(cycle, 'deadline', None)
+        if deadline is None:
+            return limit
+        if deadline - time.time() <= 0:
+            self._expired(operation, 0)
+        return deadline - time.time() if limit is None else min(limit, deadline - time.time())
+
+    def _expired(self, operation, elapsed):
+        metrics.inc('pnimonitor_deadline_exceeded_total', node=self.node)
+        main_logger.error("Operation halted. Deadline exceeded [node: %s, operation: %s, elapsed: %.1f seconds]"
+                          % (self.node, operation, elapsed))
+        sys.exit(3)
+
     def dns(self,node):
         try:
             ipaddr = socket.gethostbyname(node)
@@ -123,63 +360,74 @@ class Router(threading.Thread):
             sys.exit(3)
         return ipaddr
 
-    def discovery(self, ipaddr):
+    def indicators(self, ipaddr, ifDescrTable):
+        # Cheap change indicators compared against the ones saved with the last discovery data.
+        uptime, lastchange = self.snmp(ipaddr, self.chg_oids, cmd='snmpget')
+        return {'sysUpTime': timeticks(uptime), 'ifTableLastChange': lastchange,
+                'ifDescr': '%08x' % (zlib.crc32('\n'.join(' '.join(i) for i in ifDescrTable)) & 0xffffffff),
+                'pni_interface_tag': self.pni_identifier, 'cdn_interface_tag': self.cdn_identifier,
+                'acl_name': self.acl_name}
+
+    def discovery(self, ipaddr, cached=None, cached_indicators=None):
+        # With the discovery data of a previous run (cached), only the tables that may have changed are walked again
+        # and the probe history and ACL status of the unchanged interfaces are kept.
         pni_interfaces = []
         cdn_interfaces = []
         disc = {}
-        ifNameTable, ifDescrTable, ipTable, peerTable = tuple([i.split(' ') for i in n] for n in
-                                            map(lambda oid: self.snmp(ipaddr, [oid], quiet='off'), self.dsc_oids))
-        for i, j in zip(ifDescrTable, ifNameTable):
-            if 'no-mon' not in (' ').join(i[3:]) and self.pni_identifier in (' ').join(i[3:]) \
-                    and 'Bundle-Ether' in j[3]:
-                pni_interfaces.append(j[3])
-                disc[j[3]] = {'ifIndex': j[0].split('.')[1]}
-                disc[j[3]]['type'] = 'pni'
-            elif 'no-mon' not in (' ').join(i[3:]) and self.cdn_identifier in (' ').join(i[3:]) \
-                    and ('Bundle-Ether' in j[3] or 'HundredGigE' in j[3]):
-                cdn_interfaces.append(j[3])
-                disc[j[3]] = {'ifIndex': j[0].split('.')[1]}
-                disc[j[3]]['type'] = 'cdn'
-        #main_logger.debug("ipTable %s" % ipTable)
-        for interface in pni_interfaces:
-            for i in ipTable:
-                if disc[interface]['ifIndex'] == i[3]:
-                    type = i[0].split('"')[0].split('.')[1]
-                    if type == 'ipv4' or type == 'ipv6':
-                        if not disc[interface].has_key('local_' + type):
-                            disc[interface]['local_' + type] = [i[0].split('"')[1]]
-                        else:
-                            disc[interface]['local_' + type] += [i[0].split('"')[1]]
-        #main_logger.debug("peerTable %s" % peerTable)
-        for interface in pni_interfaces:
-            for i in peerTable:
-                if len(i) == 8:
-                    locaddr = ('.').join([str(int(i[n], 16)) for n in range(3, 7)])
-                    if disc[interface].has_key('local_ipv4'):
-                        if locaddr in disc[interface]['local_ipv4']:
-                            peeraddr = ('.').join(i[0].split('.')[-4:])
-                            cbgpPeer2index = ('.').join(i[0].split('.')[-6:])
-                            if not disc[interface].has_key('peer_ipv4'):
-                                disc[interface]['peer_ipv4'] = [(peeraddr, cbgpPeer2index)]
-                            else:
-                                disc[interface]['peer_ipv4'] += [(peeraddr, cbgpPeer2index)]
-                elif len(i) == 20:
-                    locaddr = (':').join([str(i[n]) for n in range(3, 19)])
-                    if disc[interface].has_key('local_ipv6'):
-                        if locaddr in disc[interface]['local_ipv6']:
-                            peeraddr = (':').join([format(int(n), '02x') for n in i[0].split('.')[-16:]])
-                            cbgpPeer2index = ('.').join(i[0].split('.')[-18:])
-                            if not disc[interface].has_key('peer_ipv6'):
-                                disc[interface]['peer_ipv6'] = [(peeraddr, cbgpPeer2index)]
-                            else:
-                                disc[interface]['peer_ipv6'] += [(peeraddr, cbgpPeer2index)]
-        raw_acl_status = self._ssh(ipaddr, ["sh access-lists %s usage pfilter loc all" % self.acl_name])
-        for interface in sorted(disc):
-            if disc[interface]['type'] == 'cdn':
-                disc[interface]['aclStatus'] = self.acl_check(raw_acl_status[-1], interface, self.acl_name)
+        ifDescrTable = [i.split(' ') for i in self.snmp(ipaddr, [self.dsc_oids[1]], quiet='off')]
+        indicators = self.indicators(ipaddr, ifDescrTable)
+        full = cached is None or not cached_indicators or cached_indicators.get('sysUpTime') is None \
+            or indicators['sysUpTime'] is None or indicators['sysUpTime'] < cached_indicators['sysUpTime']
+        # The saved classification and ACL status are only valid for the tags and acl_name they were discovered with.
+        settings = [key for key in ('pni_interface_tag', 'cdn_interface_tag', 'acl_name')
+                    if cached_indicators and cached_indicators.get(key) != indicators[key]]
+        if cached is not None and settings != []:
+            main_logger.info('%s changed since the last discovery. Initializing full node discovery'
+                             % ', '.join(settings))
+            full = True
+        if not full and cached_indicators['ifTableLastChange'] == indicators['ifTableLastChange'] \
+                and cached_indicators['ifDescr'] == indicators['ifDescr']:
+            main_logger.info('No interface changes detected since the last discovery')
+            disc = cached
+        else:
+            ifNameTable = [i.split(' ') for i in self.snmp(ipaddr, [self.dsc_oids[0]], quiet='off')]
+            for i, j in zip(ifDescrTable, ifNameTable):
+                if 'no-mon' not in (' ').join(i[3:]) and self.pni_identifier in (' ').join(i[3:]) \
+                        and 'Bundle-Ether' in j[3]:
+                    pni_interfaces.append(j[3])
+                    disc[j[3]] = {'ifIndex': j[0].split('.')[1]}
+                    disc[j[3]]['type'] = 'pni'
+                elif 'no-mon' not in (' ').join(i[3:]) and self.cdn_identifier in (' ').join(i[3:]) \
+                        and ('Bundle-Ether' in j[3] or 'HundredGigE' in j[3]):
+                    cdn_interfaces.append(j[3])
+                    disc[j[3]] = {'ifIndex': j[0].split('.')[1]}
+                    disc[j[3]]['type'] = 'cdn'
+            if full:
+                new = sorted(disc)
+            else:
+                new = sorted(n for n in disc if n not in cached or cached[n]['ifIndex'] != disc[n]['ifIndex'] or
+                             cached[n]['type'] != disc[n]['type'])
+                for n in disc:
+                    if n not in new:
+                        disc[n] = cached[n]
+                main_logger.info('Interface changes detected. New or modified: %s Removed: %s'
+                                 % (new, sorted(n for n in cached if n not in disc)))
+            if full or [n for n in new if disc[n]['type'] == 'pni'] != []:
+                ipTable, peerTable = tuple([i.split(' ') for i in self.snmp(ipaddr, [oid], quiet='off')]
+                                           for oid in self.dsc_oids[2:4])
+                self.correlate(disc, pni_interfaces, ipTable, peerTable)
+            if [n for n in new if disc[n]['type'] == 'cdn'] != []:
+                raw_acl_status = self._ssh(ipaddr, ["sh access-lists %s usage pfilter loc all" % self.acl_name])
+                acl_usage = self.acl_usage(raw_acl_status[-1])
+                for interface in new:
+                    if disc[interface]['type'] == 'cdn':
+                        disc[interface]['aclStatus'] = self.acl_status(acl_usage, interface)
+            if cached is not None:
+                sample_cache.forget(self.node, [n for n in cached if n in disc and
+                                                cached[n]['ifIndex'] != disc[n]['ifIndex']])
+        self.dsc_indicators = indicators
         try:
-            with open('.do_not_modify_'.upper() + self.node + '.dsc', 'w') as tf:
-                tf.write(str(disc))
+            pniMonitor_store.save_discovery('.do_not_modify_'.upper() + self.node + '.dsc', disc, indicators)
         except:
             main_logger.error('Unexpected error while writing discovery data to file: %s:%s' % sys.exc_info()[:2])
             sys.exit(1)
@@ -187,53 +435,64 @@ class Router(threading.Thread):
             main_logger.info('Discovery data saved.')
         return disc
 
+    def correlate(self, disc, pni_interfaces, ipTable, peerTable):
+        #main_logger.debug("ipTable %s" % ipTable)
+        # The IP and BGP tables are indexed in a single pass each (ifIndex -> local addresses, local address -> peers),
+        # so that associating the addresses and peers with the PNI interfaces takes one lookup per address.
+        # IPv6 addresses are compared in lower case, as NetSNMP renders the Hex-STRING values in upper case.
+        local_addresses = {}
+        for i in ipTable:
+            if len(i) > 3 and '"' in i[0]:
+                type = i[0].split('"')[0].split('.')[1]
+                if type == 'ipv4' or type == 'ipv6':
+                    local_addresses.setdefault(i[3], []).append((type, i[0].split('"')[1].lower()))
+        #main_logger.debug("peerTable %s" % peerTable)
+        peers = {}
+        for row, i in enumerate(peerTable):
+            if len(i) == 8:
+                locaddr = ('.').join([str(int(i[n], 16)) for n in range(3, 7)])
+                peeraddr = ('.').join(i[0].split('.')[-4:])
+                cbgpPeer2index = ('.').join(i[0].split('.')[-6:])
+                peers.setdefault(('ipv4', locaddr), []).append((row, peeraddr, cbgpPeer2index))
+            elif len(i) == 20:
+                locaddr = (':').join([str(i[n]) for n in range(3, 19)]).lower()
+                peeraddr = (':').join([format(int(n), '02x') for n in i[0].split('.')[-16:]])
+                cbgpPeer2index = ('.').join(i[0].split('.')[-18:])
+                peers.setdefault(('ipv6', locaddr), []).append((row, peeraddr, cbgpPeer2index))
+        for interface in pni_interfaces:
+            for key in ('local_ipv4', 'local_ipv6', 'peer_ipv4', 'peer_ipv6'):
+                disc[interface].pop(key, None)
+            for type, address in local_addresses.get(disc[interface]['ifIndex'], []):
+                disc[interface].setdefault('local_' + type, []).append(address)
+            for type in ('ipv4', 'ipv6'):
+                found = sorted(peer for address in set(disc[interface].get('local_' + type, []))
+                               for peer in peers.get((type, address), []))
+                if found != []:
+                    disc[interface]['peer_' + type] = [(peeraddr, cbgpPeer2index)
+                                                       for row, peeraddr, cbgpPeer2index in found]
+
     def probe(self, ipaddr, disc):
         prv, nxt = {}, {}
-        args = ['tail', '-1', '.do_not_modify_'.upper() + self.node + '.prb']
-        try:
-            with open(args[2]) as sf:
-                lines = sf.readlines()
-        except IOError as ioerr:
-            if "No such file or directory" in ioerr:
-                pass
-            else:
-                main_logger.error("Operation halted. Unexpected error while starting probe() file rotation: %s" % ioerr)
-                sys.exit(3)
-        except:
-            main_logger.error("Operation halted. Unexpected error while starting probe() file rotation: "
-                              "%s:%s" % sys.exc_info()[:2])
-            sys.exit(3)
-        else:
-            if len(lines) > self.dataretention:
-                try:
-                    with open(args[2],'w') as pf:
-                        for line in lines[1:]:
-                            pf.write(line)
-                except:
-                    main_logger.error("Operation halted. Unexpected error while completing probe() file rotation: "
-                                      "%s:%s" % sys.exc_info()[:2])
-                    sys.exit(3)
-                else:
-                    main_logger.debug('probe() file rotation completed')
-            lines = None
+        prb = '.do_not_modify_'.upper() + self.node + '.prb'
         try:
-            ptup = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
+            # The probe file is only read when the node is first seen by this process; afterwards the previous sample
+            # is served from memory.
+            prv = sample_cache.load(self.node, prb, self.dataretention)
+            prv = dict((interface, prv[interface]) for interface in prv if interface in disc)
         except:
-            main_logger.error("Operation halted. Unexpected error in function probe(): %s:%s" % sys.exc_info()[:2])
+            main_logger.error("Operation halted. Unexpected error while opening the probe() data store: %s:%s"
+                              % sys.exc_info()[:2])
             sys.exit(3)
         else:
-            if ptup[1] == '':
-                prv = eval(ptup[0])
-            elif "No such file or directory" in ptup[1]:
+            if prv == {}:
                 if self.switch:
                     main_logger.info("Inventory updates detected")
                 else:
-                    main_logger.warning("probe() file could not be located. This will delay the processing by one (1) "
+                    main_logger.warning("probe() data could not be located. This will delay the processing by one (1) "
                                         "polling cycle")
-            else:
-                main_logger.error("Operation halted. Unexpected output in the probe() function: %s" % str(ptup))
-                sys.exit(3)
-        finally:
+        if self.probemode == 'bulk':
+            nxt = self._probe_bulk(ipaddr, disc)
+        else:
             for interface in sorted(disc):
                 int_status = self.snmp(ipaddr, [i + '.' + disc[interface]['ifIndex'] for i in
                                                 self.int_oids], cmd='snmpget')
@@ -258,67 +517,68 @@ class Router(threading.Thread):
                             nxt[interface]['peerStatus_ipv6'][n[0]] = peer_status
                     if not disc[interface].has_key('peer_ipv4') and not disc[interface].has_key('peer_ipv6'):
                         main_logger.warning("PNI interface %s has no BGP sessions" % interface)
-            try:
-                with open('.do_not_modify_'.upper() + self.node + '.prb', 'a') as pf:
-                    pf.write(str(nxt) + '\n')
-            except:
-                main_logger.error('Unexpected error while writing probe() data to file: %s:%s' % sys.exc_info()[:2])
-            else:
-                main_logger.debug('probe() data saved.')
+        sample_cache.put(self.node, prb, self.dataretention, nxt)
+        main_logger.debug('probe() data queued for saving.')
         return prv, nxt
 
+    def _probe_bulk(self, ipaddr, disc):
+        # Collects the interface and BGP peer counters of the whole node in as few GET requests as possible and
+        # demultiplexes the responses back into the per-interface structure built by the single-request probe.
+        nxt, oids, slots = {}, [], []
+        for interface in sorted(disc):
+            nxt[interface] = {'ts': str(self.tstamp)}
+            oids += [i + '.' + disc[interface]['ifIndex'] for i in self.int_oids]
+            slots += [(interface, key) for key in ('adminStatus', 'operStatus', 'ifSpeed', 'ifInOctets',
+                                                   'ifOutOctets')]
+            if disc[interface]['type'] == 'pni':
+                for afi, suffix in (('ipv4', '.1.1'), ('ipv6', '.2.1')):
+                    nxt[interface]['peerStatus_' + afi] = {}
+                    if disc[interface].has_key('peer_' + afi):
+                        for n in disc[interface]['peer_' + afi]:
+                            nxt[interface]['peerStatus_' + afi][n[0]] = []
+                            oids += [self.bgp_oids[0] + '.' + n[1], self.bgp_oids[1] + '.' + n[1] + suffix]
+                            slots += [(interface, 'peerStatus_' + afi, n[0])] * 2
+                if not disc[interface].has_key('peer_ipv4') and not disc[interface].has_key('peer_ipv6'):
+                    main_logger.warning("PNI interface %s has no BGP sessions" % interface)
+        values = self.snmp_bulk(ipaddr, oids)
+        if len(values) != len(oids):
+            main_logger.error("Operation halted. Unexpected output in the _probe_bulk() function: %d values received "
+                              "for %d objects" % (len(values), len(oids)))
+            sys.exit(3)
+        for slot, value in zip(slots, values):
+            if len(slot) == 2:
+                nxt[slot[0]][slot[1]] = value
+            else:
+                nxt[slot[0]][slot[1]][slot[2]].append(value)
+        return nxt
+
     def _process(self, ipaddr, disc):
-        prv, nxt = self.probe(ipaddr, disc)
+        with self._phase('probe'):
+            prv, nxt = self.probe(ipaddr, disc)
+        started = time.time()
         main_logger.debug("prev: %s" % prv)
         main_logger.debug("next: %s" % nxt)
-        actualCdnIn, physicalCdnIn, maxCdnIn, unblocked_maxCdnIn, actualPniOut, physicalPniOut, usablePniOut \
-            = 0, 0, 0, 0, 0, 0, 0
-        unblocked, blocked = [], []
-        dF = "%Y-%m-%d %H:%M:%S.%f"
-        if prv != {} and len(prv) == len(nxt):
-            for p , n in zip(sorted(prv), sorted(nxt)):
-                if n in self.pni_interfaces:
-                    disc[n]['util'] = 0
-                    disc[n]['util_prc'] = 0
-                    if nxt[n]['operStatus'] == 'up':
-                        physicalPniOut += int(nxt[n]['ifSpeed'])
-                    if nxt[n]['operStatus'] == 'up' \
-                            and reduce(lambda x, y: int(x) + int(y),
-                                       [nxt[n]['peerStatus_ipv4'][x][1] for x in nxt[n]['peerStatus_ipv4']
-                                        if nxt[n]['peerStatus_ipv4'][x][0] == '6'], 0) > self.ipv4_minPfx \
-                            or reduce(lambda x, y: int(x) + int(y),
-                                      [nxt[n]['peerStatus_ipv6'][x][1] for x in nxt[n]['peerStatus_ipv6']
-                                       if nxt[n]['peerStatus_ipv6'][x][0] == '6'], 0) > self.ipv6_minPfx:
-                        usablePniOut += int(nxt[n]['ifSpeed'])
-                        if prv[p]['operStatus'] == 'up':
-                            delta_time = (datetime.datetime.strptime(nxt[n]['ts'], dF) -
-                                          datetime.datetime.strptime(prv[p]['ts'], dF)).total_seconds()
-                            delta_ifOutOctets = int(nxt[n]['ifOutOctets']) - int(prv[p]['ifOutOctets'])
-                            int_util_prc = (delta_ifOutOctets * 800) / (delta_time * int(nxt[n]['ifSpeed']) * 10**6)
-                            disc[n]['util_prc'] = int_util_prc
-                            int_util = (delta_ifOutOctets * 8) / (delta_time * 10 ** 6)
-                            disc[n]['util'] = int_util
-                            actualPniOut += int_util
-                elif n in self.cdn_interfaces:
-                    disc[n]['util'] = 0
-                    disc[n]['util_prc'] = 0
-                    if nxt[n]['operStatus'] == 'up':
-                        physicalCdnIn += int(nxt[n]['ifSpeed'])
-                        maxCdnIn += int(nxt[n]['ifSpeed']) * self.serving_cap / 100
-                        if prv[p]['operStatus'] == 'up':
-                            delta_time = (datetime.datetime.strptime(nxt[n]['ts'], dF) -
-                                          datetime.datetime.strptime(prv[p]['ts'], dF)).total_seconds()
-                            delta_ifInOctets = int(nxt[n]['ifInOctets']) - int(prv[p]['ifInOctets'])
-                            int_util_prc = (delta_ifInOctets * 800) / (delta_time * int(nxt[n]['ifSpeed']) * 10**6)
-                            disc[n]['util_prc'] = int_util_prc
-                            int_util = (delta_ifInOctets * 8) / (delta_time * 10 ** 6)
-                            disc[n]['util'] = int_util
-                            actualCdnIn += int_util
-                        if disc[n]['aclStatus'] == 'off':
-                            unblocked.append(n)
-                            unblocked_maxCdnIn += int(nxt[n]['ifSpeed']) * self.serving_cap / 100
-                        elif disc[n]['aclStatus'] == 'on':
-                            blocked.append(n)
+        warming = sorted(interface for interface in nxt if interface not in prv)
+        if [interface for interface in self.pni_interfaces if interface in prv and interface in nxt] != []:
+            if warming != []:
+                main_logger.info("New interface(s) discovered: %s. These will be included in the _process() function "
+                                 "from the next polling cycle" % warming)
+            capacity = pniMonitor_decision.capacity(pniMonitor_decision.Columns(disc, prv, nxt), self.serving_cap,
+                                                    self.ipv4_minPfx, self.ipv6_minPfx)
+            for interface, util, util_prc in zip(sorted(nxt), capacity['util'], capacity['util_prc']):
+                disc[interface]['util'] = util
+                disc[interface]['util_prc'] = util_prc
+                metrics.set('pnimonitor_interface_utilisation_mbps', util, node=self.node, interface=interface,
+                            type=disc[interface]['type'])
+                metrics.set('pnimonitor_interface_utilisation_percent', util_prc, node=self.node, interface=interface,
+                            type=disc[interface]['type'])
+            for total in ('actualCdnIn', 'physicalCdnIn', 'maxCdnIn', 'unblocked_maxCdnIn', 'actualPniOut',
+                          'physicalPniOut', 'usablePniOut'):
+                metrics.set('pnimonitor_capacity_mbps', capacity[total], node=self.node, total=total)
+            actualCdnIn, physicalCdnIn, maxCdnIn, unblocked_maxCdnIn, actualPniOut, physicalPniOut, usablePniOut = \
+                [capacity[k] for k in ('actualCdnIn', 'physicalCdnIn', 'maxCdnIn', 'unblocked_maxCdnIn',
+                                       'actualPniOut', 'physicalPniOut', 'usablePniOut')]
+            unblocked, blocked = capacity['unblocked'], capacity['blocked']
             for interface in disc:
                 main_logger.debug("%s(%s): %.2f%%", interface, disc[interface]['type'], disc[interface]['util_prc'])
             main_logger.debug("Physical CDN Capacity: %.2f Mbps" % physicalCdnIn)
@@ -329,141 +589,157 @@ class Router(threading.Thread):
             main_logger.debug("Usable PNI Egress: %.2f Mbps" % usablePniOut)
             main_logger.debug("Actual PNI Egress: %.2f Mbps" % actualPniOut)
             main_logger.debug("DISC: %s" % disc)
-            if usablePniOut == 0:
-                if unblocked != []:
-                    if not self.dryrun:
-                        main_logger.warning('No usable PNI egress capacity available. Applying RHM Block on all CDN '
-                                            'interfaces: %s' % unblocked)
-                        results, output = self._acl(ipaddr, 'block', unblocked)
-                        if results == ['on' for i in range(len(unblocked))]:
-                            for interface in unblocked:
-                                disc[interface]['aclStatus'] = 'on'
-                            try:
-                                with open('.do_not_modify_'.upper() + self.node + '.dsc', 'w') as tf:
-                                    tf.write(str(disc))
-                            except:
-                                main_logger.error('Following interfaces are now blocked, however inventory update '
-                                                  'failed (%s : %s). Data inconsistencies will occur. Run '
-                                                  './pniDiscovery.py to clear: %s', sys.exc_info()[0],
-                                                  sys.exc_info()[1], unblocked)
-                            else:
-                                main_logger.warning('Following interfaces are now blocked: %s' % unblocked)
-                        else:
-                            main_logger.error('Interface blocking attempt failed: %s' % unblocked)
-                        for interface in blocked:
-                            main_logger.info('Interface %s was already blocked' % interface)
-                    elif self.dryrun:
-                        main_logger.warning('No usable PNI egress capacity available. All CDN interfaces must be '
-                                            'blocked (Simulation Mode): %s' % unblocked)
-                else:
-                    main_logger.info('No usable PNI egress capacity available. However all CDN interfaces are '
-                                     'currently down or in blocked state. No valid actions left.')
-            # We can't use actualCDNIn while calculating the rising_threshold because it won't include P2P traffic
-            # and / or the CDN overflow from the other site(s). It is worth revisiting later for DE though.
-            elif actualPniOut / usablePniOut * 100 >= self.rising_threshold:
-                if unblocked != []:
-                    if not self.dryrun:
-                        main_logger.warning('The ratio of actual PNI egress traffic to available egress capacity is '
-                                            'equal to or greater than the pre-defined Rising Threshold. Applying RHM Block'
-                                            'on all CDN interfaces: %s' % unblocked)
-                        results, output = self._acl(ipaddr, 'block', unblocked)
-                        if results == ['on' for i in range(len(unblocked))]:
-                            for interface in unblocked:
-                                disc[interface]['aclStatus'] = 'on'
-                            try:
-                                with open('.do_not_modify_'.upper() + self.node + '.dsc', 'w') as tf:
-                                    tf.write(str(disc))
-                            except:
-                                main_logger.error('Following interfaces are now blocked, however inventory update '
-                                                  'failed (%s : %s). Data inconsistencies will occur. Run '
-                                                  './pniDiscovery.py to clear: %s', sys.exc_info()[0],
-                                                  sys.exc_info()[1], unblocked)
-                            else:
-                                main_logger.warning('Following interfaces are now blocked: %s' % unblocked)
-                        else:
-                            main_logger.error('Interface blocking attempt failed: %s' % unblocked)
-                        for interface in blocked:
-                            main_logger.info('Interface %s was already blocked' % interface)
-                    elif self.dryrun:
-                        main_logger.warning('The ratio of actual PNI egress traffic to available egress capacity is '
-                                            'equal to or greater than the pre-defined Rising Threshold. %s must be blocked'
-                                            % unblocked)
-                else:
-                    main_logger.info('Rising Threshold hit. However all CDN interfaces are currently down or in blocked '
-                                     'state. No valid actions left.')
-            elif blocked != [] and actualPniOut / usablePniOut * 100 < self.falling_threshold:
-                if maxCdnIn + actualPniOut < usablePniOut:
-                    if not self.dryrun:
-                        main_logger.info('Risk mitigated. Re-enabling all CDN interfaces: %s' % blocked)
-                        results, output = self._acl(ipaddr, 'unblock', blocked)
-                        if results == ['off' for i in range(len(blocked))]:
-                            for interface in blocked:
-                                disc[interface]['aclStatus'] = 'off'
-                            try:
-                                with open('.do_not_modify_'.upper() + self.node + '.dsc', 'w') as tf:
-                                    tf.write(str(disc))
-                            except:
-                                main_logger.error('Following interfaces are now enabled, however inventory update '
-                                                  'failed (%s : %s). Data inconsistencies will occur. Run '
-                                                  './pniDiscovery.py to clear: %s', sys.exc_info()[0],
-                                                  sys.exc_info()[1], blocked)
-                            else:
-                                main_logger.info('Following interfaces are now enabled: %s' % blocked)
-                        else:
-                            main_logger.error('Interface unblocking attempt failed: %s' % blocked)
-                        for interface in unblocked:
-                            main_logger.info('Interface %s was already unblocked' % interface)
-                    elif self.dryrun:
-                        main_logger.info('Risk mitigated. All CDN interfaces should be enabled (Simulation Mode): %s'
-                                         % blocked)
-                else:
-                    for value in sorted([util for util in [disc[interface]['util'] for interface in
-                                                           self.cdn_interfaces]], reverse=True):
-                        candidate_interface = filter(lambda interface: disc[interface]['util'] == value, disc)[0]
-                        self_maxCdnIn = int(nxt[candidate_interface]['ifSpeed']) * self.serving_cap / 100
-                        if actualPniOut - actualCdnIn + unblocked_maxCdnIn + self_maxCdnIn < usablePniOut:
-                            if not self.dryrun:
-                                if usablePniOut < physicalPniOut:
-                                    main_logger.info('Risk partially mitigated. Re-enabling interface: %s' %
-                                                     candidate_interface)
-                                else:
-                                    main_logger.info('Risk mitigated. Re-enabling interface: %s' % candidate_interface)
-                                results, output = self._acl(ipaddr, 'unblock', [candidate_interface])
-                                if results == ['off']:
-                                    disc[candidate_interface]['aclStatus'] = 'off'
-                                    try:
-                                        with open('.do_not_modify_'.upper() + self.node + '.dsc', 'w') as tf:
-                                            tf.write(str(disc))
-                                    except:
-                                        main_logger.error('Following interface is now enabled, however inventory '
-                                                          'update failed (%s : %s). Data inconsistencies will occur. '
-                                                          'Run ./pniDiscovery.py to clear: %s', sys.exc_info()[0],
-                                                          sys.exc_info()[1], candidate_interface)
-                                    else:
-                                        main_logger.info('Interface %s is now enabled' % candidate_interface)
-                                else:
-                                    main_logger.error('Interface unblocking attempt failed: %s' % candidate_interface)
-                                break
-                            elif self.dryrun:
-                                if usablePniOut < physicalPniOut:
-                                    main_logger.info('Risk partially mitigated. %s should be enabled (Simulation Mode)'
-                                                     % candidate_interface)
-                                else:
-                                    main_logger.info('Risk mitigated. %s should be enabled (Simulation Mode)'
-                                                     % candidate_interface)
-            else:
+            actions = pniMonitor_decision.decide(disc, prv, nxt, self.thresholds, capacity)
+            self._observe('process', time.time() - started)
+            if actions == []:
                 main_logger.info('_process() completed. No action taken nor was necessary.')
+            for decision, interfaces, reason in actions:
+                self._apply(ipaddr, disc, decision, interfaces, reason, blocked, unblocked)
+            if usablePniOut > 0 and actions == [] and fast_path.margin > 0 and unblocked != [] and \
+                    actualPniOut / usablePniOut * 100 >= self.rising_threshold - fast_path.margin:
+                if fast_path.arm(self.node, self._fast_process, (ipaddr, disc, nxt)):
+                    main_logger.info('PNI egress is within %s%% of the Rising Threshold (%.2f%%). Fast-path polling '
+                                     'activated every %s seconds' % (fast_path.margin, actualPniOut / usablePniOut *
+                                                                     100, fast_path.frequency))
+            elif fast_path.disarm(self.node):
+                main_logger.info('Fast-path polling deactivated')
         elif prv == {} and len(nxt) > 0:
             main_logger.info("Inventory updates detected. _process() function will be activated in the next polling "
                              "cycle")
-        elif prv != {} and len(prv) < len(nxt):
-            main_logger.info("New interface discovered.")
-            # There is no persistence in this release (*.prb files are removed when a new interface is discovered)
-            # So the elif statement is a placeholder.
-            # This will be revisited in version-2 when persistence is enabled, so that _process() function can
-            # continue running for the already existing interfaces.
         else:
-            main_logger.error("Unexpected error in the _process() function\nprev:%r\nnext:%r" % (prv, nxt))
+            main_logger.info("No PNI interfaces with previous probe() data (warming up: %s). _process() function will "
+                             "be activated in the next polling cycle" % warming)
+
+    def _probe_fast(self, ipaddr, disc, last):
+        # Polls the operational status, egress counters and BGP peers of the PNI interfaces only. The remaining
+        # values, and the whole sample of the CDN interfaces, are carried over from the last sample.
+        nxt, oids, slots = {}, [], []
+        ts = str(tstamp('mr'))
+        for interface in sorted(last):
+            nxt[interface] = dict(last[interface])
+            if disc[interface]['type'] == 'pni':
+                nxt[interface]['ts'] = ts
+                oids += [self.int_oids[1] + '.' + disc[interface]['ifIndex'],
+                         self.int_oids[4] + '.' + disc[interface]['ifIndex']]
+                slots += [(interface, 'operStatus'), (interface, 'ifOutOctets')]
+                for afi, suffix in (('ipv4', '.1.1'), ('ipv6', '.2.1')):
+                    nxt[interface]['peerStatus_' + afi] = {}
+                    for n in disc[interface].get('peer_' + afi, []):
+                        nxt[interface]['peerStatus_' + afi][n[0]] = []
+                        oids += [self.bgp_oids[0] + '.' + n[1], self.bgp_oids[1] + '.' + n[1] + suffix]
+                        slots += [(interface, 'peerStatus_' + afi, n[0])] * 2
+        values = self.snmp_bulk(ipaddr, oids)
+        if len(values) != len(oids):
+            main_logger.error("Fast-path polling halted. Unexpected output in the _probe_fast() function: %d values "
+                              "received for %d objects" % (len(values), len(oids)))
+            return None
+        for slot, value in zip(slots, values):
+            if len(slot) == 2:
+                nxt[slot[0]][slot[1]] = value
+            else:
+                nxt[slot[0]][slot[1]][slot[2]].append(value)
+        return nxt
+
+    def _fast_process(self, state):
+        # One fast-path cycle; only blocking actions are taken here, re-enabling is left to the regular cycle.
+        ipaddr, disc, prv = state
+        cycle.deadline = time.time() + fast_path.frequency
+        nxt = self._probe_fast(ipaddr, disc, prv)
+        if nxt is None:
+            return None
+        capacity = pniMonitor_decision.capacity(pniMonitor_decision.Columns(disc, prv, nxt), self.serving_cap,
+                                                self.ipv4_minPfx, self.ipv6_minPfx)
+        usablePniOut, actualPniOut = capacity['usablePniOut'], capacity['actualPniOut']
+        if usablePniOut > 0:
+            main_logger.debug("Fast-path: Usable PNI Egress: %.2f Mbps, Actual PNI Egress: %.2f Mbps (%.2f%%)"
+                              % (usablePniOut, actualPniOut, actualPniOut / usablePniOut * 100))
+        blocks = [action for action in pniMonitor_decision.decide(disc, prv, nxt, self.thresholds, capacity)
+                  if action[0] == 'block']
+        if blocks != []:
+            # fast_path_frequency bounds the SNMP poll only; the ACL push gets the time of a regular cycle, as a push
+            # halted half-way would leave nothing blocked.
+            cycle.deadline = None if self.cycletimeout is None else time.time() + self.cycletimeout
+        for decision, interfaces, reason in blocks:
+            self._apply(ipaddr, disc, decision, interfaces, reason, capacity['blocked'], capacity['unblocked'])
+        if blocks != []:
+            main_logger.info('Fast-path polling deactivated')
+            return None
+        if usablePniOut > 0 and actualPniOut / usablePniOut * 100 < self.rising_threshold - fast_path.margin:
+            main_logger.info('Headroom restored (%.2f%%). Fast-path polling deactivated'
+                             % (actualPniOut / usablePniOut * 100))
+            return None
+        return ipaddr, disc, nxt
+
+    def _apply(self, ipaddr, disc, decision, interfaces, reason, blocked, unblocked):
+        if decision is None:
+            if reason == 'no_capacity':
+                main_logger.info('No usable PNI egress capacity available. However all CDN interfaces are currently '
+                                 'down or in blocked state. No valid actions left.')
+            else:
+                main_logger.info('Rising Threshold hit. However all CDN interfaces are currently down or in blocked '
+                                 'state. No valid actions left.')
+            return
+        if self.dryrun:
+            if reason == 'no_capacity':
+                main_logger.warning('No usable PNI egress capacity available. All CDN interfaces must be blocked '
+                                    '(Simulation Mode): %s' % interfaces)
+            elif reason == 'rising_threshold':
+                main_logger.warning('The ratio of actual PNI egress traffic to available egress capacity is equal to '
+                                    'or greater than the pre-defined Rising Threshold. %s must be blocked'
+                                    % interfaces)
+            elif reason == 'risk_mitigated':
+                main_logger.info('Risk mitigated. All CDN interfaces should be enabled (Simulation Mode): %s'
+                                 % interfaces)
+            elif reason == 'risk_partially_mitigated_interface':
+                main_logger.info('Risk partially mitigated. %s should be enabled (Simulation Mode)' % interfaces[0])
+            else:
+                main_logger.info('Risk mitigated. %s should be enabled (Simulation Mode)' % interfaces[0])
+            return
+        if reason == 'no_capacity':
+            main_logger.warning('No usable PNI egress capacity available. Applying RHM Block on all CDN interfaces: '
+                                '%s' % interfaces)
+        elif reason == 'rising_threshold':
+            main_logger.warning('The ratio of actual PNI egress traffic to available egress capacity is equal to or '
+                                'greater than the pre-defined Rising Threshold. Applying RHM Block on all CDN '
+                                'interfaces: %s' % interfaces)
+        elif reason == 'risk_mitigated':
+            main_logger.info('Risk mitigated. Re-enabling all CDN interfaces: %s' % interfaces)
+        elif reason == 'risk_partially_mitigated_interface':
+            main_logger.info('Risk partially mitigated. Re-enabling interface: %s' % interfaces[0])
+        else:
+            main_logger.info('Risk mitigated. Re-enabling interface: %s' % interfaces[0])
+        status = 'on' if decision == 'block' else 'off'
+        with self._phase('acl'):
+            results, output = self._acl(ipaddr, decision, interfaces)
+        if results == [status for i in range(len(interfaces))]:
+            for interface in interfaces:
+                disc[interface]['aclStatus'] = status
+            metrics.inc('pnimonitor_acl_changes_total', len(interfaces), node=self.node, action=decision, reason=reason)
+            try:
+                pniMonitor_store.save_discovery('.do_not_modify_'.upper() + self.node + '.dsc', disc,
+                                                self.dsc_indicators)
+            except:
+                main_logger.error('Following interface(s) are now %s, however inventory update failed (%s : %s). Data '
+                                  'inconsistencies will occur. Run ./pniDiscovery.py to clear: %s',
+                                  'blocked' if decision == 'block' else 'enabled', sys.exc_info()[0],
+                                  sys.exc_info()[1], interfaces)
+            else:
+                if decision == 'block':
+                    main_logger.warning('Following interfaces are now blocked: %s' % interfaces)
+                elif reason == 'risk_mitigated':
+                    main_logger.info('Following interfaces are now enabled: %s' % interfaces)
+                else:
+                    main_logger.info('Interface %s is now enabled' % interfaces[0])
+        else:
+            main_logger.error('Interface %s attempt failed: %s'
+                              % (decision + 'ing', interfaces[0] if reason.endswith('_interface') else interfaces))
+            metrics.inc('pnimonitor_acl_failures_total', node=self.node, action=decision)
+        if decision == 'block':
+            for interface in blocked:
+                main_logger.info('Interface %s was already blocked' % interface)
+        elif reason == 'risk_mitigated':
+            for interface in unblocked:
+                main_logger.info('Interface %s was already unblocked' % interface)
 
     def _acl(self, ipaddr, decision, interfaces):
         results, output = [], []
@@ -471,109 +747,169 @@ class Router(threading.Thread):
         if decision == 'block':
             for interface in interfaces:
                 commands[1:1] = ["interface " + interface, "ipv4 access-group %s egress" % self.acl_name, "exit"]
-            output = self._ssh(ipaddr, commands)
+            output = self._ssh(ipaddr, commands, pipeline=True)
+            acl_usage = self.acl_usage(output[-1])
             for interface in interfaces:
-                results.append(self.acl_check(output[-1], interface, self.acl_name))
+                results.append(self.acl_status(acl_usage, interface))
         else:
             for interface in interfaces:
                 commands[1:1] = ["interface " + interface, "no ipv4 access-group %s egress" % self.acl_name, "exit"]
-            output = self._ssh(ipaddr, commands)
+            output = self._ssh(ipaddr, commands, pipeline=True)
+            acl_usage = self.acl_usage(output[-1])
             for interface in interfaces:
-                results.append(self.acl_check(output[-1], interface, self.acl_name))
+                results.append(self.acl_status(acl_usage, interface))
         return results, output
 
+    def audit(self, ipaddr, disc):
+        # Re-verifies the ACL status saved in the discovery data against the node and corrects any drift, e.g. an ACL
+        # attached or removed manually.
+        output = self._ssh(ipaddr, ["sh access-lists %s usage pfilter loc all" % self.acl_name])
+        if output == [] or not output[-1].rstrip().endswith('#'):
+            main_logger.warning('ACL audit incomplete. It will be retried within the next audit window')
+            return
+        acl_usage = self.acl_usage(output[-1])
+        drift = [interface for interface in sorted(self.cdn_interfaces)
+                 if self.acl_status(acl_usage, interface) != disc[interface].get('aclStatus')]
+        if drift == []:
+            main_logger.info('ACL audit completed. No drift detected')
+            return
+        for interface in drift:
+            main_logger.warning('ACL drift detected on interface %s. Saved status: %s, actual status: %s'
+                                % (interface, disc[interface].get('aclStatus'), self.acl_status(acl_usage, interface)))
+            disc[interface]['aclStatus'] = self.acl_status(acl_usage, interface)
+        try:
+            pniMonitor_store.save_discovery('.do_not_modify_'.upper() + self.node + '.dsc', disc, self.dsc_indicators)
+        except:
+            main_logger.error('ACL drift corrected, however inventory update failed (%s : %s). Data inconsistencies '
+                              'will occur. Run ./pniDiscovery.py to clear: %s', sys.exc_info()[0], sys.exc_info()[1],
+                              drift)
+        else:
+            main_logger.info('ACL drift corrected in the discovery data: %s' % drift)
+
+    def acl_usage(self, rawinput):
+        # Parses the output of 'sh access-lists <name> usage pfilter loc all' in a single pass and returns
+        # {interface: {'input': ..., 'output': ..., 'location': ...}}. An interface listed under more than one location
+        # keeps the first ACL found applied to it.
+        usage, entry, location = {}, None, None
+        for line in rawinput.split('\n'):
+            line = line.strip('\r').strip(' ')
+            match = acl_usage_re.match(line)
+            if match is None:
+                continue
+            key, value = match.group(1).lower(), match.group(2)
+            if key == 'interface':
+                entry = usage.setdefault(value, {'input': 'N/A', 'output': 'N/A', 'location': location})
+            elif key == 'location':
+                location = value
+            elif entry is not None and entry[key] == 'N/A':
+                entry[key] = value
+                if value != 'N/A':
+                    entry['location'] = location
+        return usage
+
+    def acl_status(self, usage, interface):
+        return 'on' if usage.get(interface, {}).get('output') == self.acl_name else 'off'
+
     def acl_check(self, rawinput, interface, acl_name):
-        result = 'off'
-        rawinput = rawinput.split('\n')
-        for i in rawinput:
-            if re.search(r'Interface : (%s)$' % interface, i.strip('\r').strip(' ')) is not None:
-                acl = re.search(r'Output ACL : (%s)$' % acl_name,
-                                rawinput[rawinput.index(i) + 2].strip('\r').strip(' '))
-                if acl is not None:
-                    if acl.group(1) == acl_name:
-                        result = 'on'
-        return result
+        return 'on' if self.acl_usage(rawinput).get(interface, {}).get('output') == acl_name else 'off'
 
-    def _ssh(self, ipaddr, commandlist):
+    def _ssh(self, ipaddr, commandlist, pipeline=False):
         if len(commandlist) == 1:
             mssg = 'Data Collection / Node Discovery'
         else:
             mssg = 'Configuration Attempt'
+        timeout = self._timeout('SSH connect', self.sshtimeout)
+        started = time.time()
         try:
-            ssh.connect(ipaddr, username=un, password=self.pw, timeout=5, look_for_keys=False, allow_agent=False)
+            conn = ssh_pool.acquire(self.node, ipaddr, un, self.pw, timeout)
         except KeyboardInterrupt:
-            ssh.close()
             main_logger.info("Keyboard Interrupt")
             sys.exit(0)
         except paramiko.ssh_exception.AuthenticationException as auth_failure:
-            ssh.close()
             main_logger.warning('%s - %s Failed' % (auth_failure, mssg))
             sys.exit(1)
         except paramiko.ssh_exception.NoValidConnectionsError as conn_failure:
-            ssh.close()
             main_logger.error('%s - %s Failed' % (conn_failure, mssg))
             sys.exit(1)
         except:
-            ssh.close()
             main_logger.error('Unexpected error while connecting to the node [_ssh() Err no.2]: %s:%s - %s Failed',
                                  sys.exc_info()[0], sys.exc_info()[1], mssg)
             sys.exit(1)
         else:
-            main_logger.debug("SSH connection successful")
-            try:
-                session = ssh.invoke_shell()
-            except:
-                ssh.close()
-                main_logger.error('Unexpected error while invoking SSH shell [_ssh() Err no.4]: %s:%s - %s Failed',
-                                     sys.exc_info()[0], sys.exc_info()[1], mssg)
-                sys.exit(1)
+            if conn.reused:
+                main_logger.debug("SSH connection reused")
             else:
+                metrics.observe('pnimonitor_ssh_connect_duration_seconds', time.time() - started, node=self.node)
+                main_logger.debug("SSH connection successful")
+            healthy = False
+            try:
+                try:
+                    conn.invoke_shell()
+                except:
+                    main_logger.error('Unexpected error while invoking SSH shell [_ssh() Err no.4]: %s:%s - %s Failed',
+                                         sys.exc_info()[0], sys.exc_info()[1], mssg)
+                    sys.exit(1)
                 main_logger.debug("SSH shell session successful")
-                commandlist.insert(0, 'term len 0')
+                # With pipelining the configuration batch is sent in one go, and the verification command after it.
+                if pipeline:
+                    batches = [(commandlist[:-1], True), (commandlist[-1:], False)]
+                else:
+                    batches = [(commandlist, False)]
                 output = []
-                for cmd in commandlist:
-                    cmd_output = ''
-                    try:
-                        session.send(cmd + '\n')
-                    except socket.error as sc_err:
-                        ssh.close()
-                        main_logger.error('%s - %s Failed' % (sc_err, mssg))
-                        sys.exit(1)
-                    else:
-                        while not session.exit_status_ready():
-                            while session.recv_ready():
-                                cmd_output += session.recv(1024)
-                            else:
-                                if '/CPU0:' + self.node not in cmd_output:
-                                    time.sleep(0.2)
-                                else:
-                                    break
-                        else:
-                            main_logger.warning("SSH connection closed prematurely")
-                        output.append(cmd_output)
                 try:
-                    session.send('exit\n')
-                except socket.error:
-                    ssh.close()
-                finally:
-                    main_logger.debug("SSH connection closed")
-        return output[1:]
+                    for commands, pipelined in batches:
+                        started = time.time()
+                        output += conn.run(commands, self._timeout('SSH %s' % mssg, self.sshtimeout), pipelined)
+                except socket.error as sc_err:
+                    main_logger.error('%s - %s Failed' % (sc_err, mssg))
+                    sys.exit(1)
+                except pniMonitor_ssh.SshTimeout:
+                    # The session is discarded (and the channel closed) on release, as it is not healthy.
+                    self._expired('SSH %s: %s' % (mssg, ' / '.join(commands)), time.time() - started)
+                except pniMonitor_ssh.SshClosed as ssh_closed:
+                    main_logger.warning("SSH connection closed prematurely")
+                    output += ssh_closed.outputs
+                    output += ['' for i in range(len(commandlist) - len(output))]
+                else:
+                    healthy = True
+                for cmd, latency in conn.latencies:
+                    main_logger.debug("SSH command completed in %.3f seconds: %s" % (latency, cmd))
+                    metrics.observe('pnimonitor_ssh_command_duration_seconds', latency, node=self.node)
+            finally:
+                # The session is kept open for the next use unless it is in an unknown state.
+                ssh_pool.release(conn, discard=not healthy)
+                main_logger.debug("SSH session released")
+        return output
 
     def snmp(self, ipaddr, oids, cmd='snmpwalk', quiet='on'):
-        args = [cmd, '-v2c', '-c', 'kN8qpTxH', '-t', str(self.snmptimeout), '-r', str(self.snmpretries), ipaddr]
+        args = [cmd, '-v2c', '-c', community, '-t', str(self.snmptimeout), '-r', str(self.snmpretries), ipaddr]
         if quiet is 'on':
             args.insert(1, '-Oqv')
         args += oids
+        # A get is bounded by the time NetSNMP needs for all its retries; a walk only by the cycle deadline.
+        started = time.time()
+        timeout = self._timeout(cmd, (self.snmpretries + 1) * self.snmptimeout + 5 if cmd == 'snmpget' else None)
         try:
-            stup = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
+            if self.snmpbackend == 'native':
+                stup = self._snmp_native(ipaddr, oids, cmd, quiet)
+            elif timeout is None:
+                stup = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
+            else:
+                stup = communicate(args, timeout)
         except:
             main_logger.error("Unexpected error during %s operation [_snmp() Err no.1]: %s:%s", cmd, sys.exc_info()[0],
                               sys.exc_info()[1])
             sys.exit(3)
         else:
-            if stup[1] == '':
+            if self.snmpbackend != 'native':
+                metrics.observe('pnimonitor_snmp_request_duration_seconds', time.time() - started, node=self.node,
+                                backend=self.snmpbackend)
+            if stup is None:
+                self._expired(cmd, time.time() - started)
+            elif stup[1] == '':
                 snmpr = stup[0].strip('\n').split('\n')
             elif 'Timeout' in stup[1]:
+                metrics.inc('pnimonitor_snmp_timeouts_total', node=self.node)
                 try:
                     pingresult = self.ping(self.ipaddr)
                 except:
@@ -605,16 +941,63 @@ class Router(threading.Thread):
                 sys.exit(3)
         return snmpr
 
+    def snmp_bulk(self, ipaddr, oids):
+        # The native backend packs and pipelines the requests itself. NetSNMP's snmpget is limited to 128 objects per
+        # invocation, so the list is packed into requests of at most snmp_packet_size bytes here instead.
+        if self.snmpbackend == 'native':
+            return self.snmp(ipaddr, oids, cmd='snmpget')
+        values = []
+        for start, chunk in pniMonitor_snmp.pack(oids, self.snmppacketsize, community, max_varbinds=128):
+            values += self.snmp(ipaddr, chunk, cmd='snmpget')
+        return values
+
+    def _snmp_native(self, ipaddr, oids, cmd, quiet):
+        # Returns an (stdout, stderr) tuple formatted as the NetSNMP tools would, so that both backends share the
+        # same parsing and error handling.
+        with snmp_lock:
+            if ipaddr not in snmp_sessions:
+                snmp_sessions[ipaddr] = pniMonitor_snmp.Session(ipaddr, community)
+            session = snmp_sessions[ipaddr]
+        # The session is shared with the other threads polling the same node, so the limits of this call are passed
+        # with each request rather than set on it.
+        limits = dict(timeout=self.snmptimeout, retries=self.snmpretries, deadline=getattr(cycle, 'deadline', None))
+        latencies = []
+        try:
+            if cmd == 'snmpget':
+                varbinds, latencies = session.get_many(oids, self.snmppacketsize, **limits)
+            else:
+                varbinds = []
+                for oid in oids:
+                    walked, measured = session.walk(oid, **limits)
+                    varbinds += walked
+                    latencies += measured
+        except pniMonitor_snmp.SnmpDeadline as snmp_err:
+            latencies += getattr(snmp_err, 'latencies', [])
+            return None
+        except pniMonitor_snmp.SnmpError as snmp_err:
+            latencies += getattr(snmp_err, 'latencies', [])
+            return '', str(snmp_err)
+        finally:
+            for rtt, retries in latencies:
+                if rtt is not None:
+                    metrics.observe('pnimonitor_snmp_request_duration_seconds', rtt, node=self.node, backend='native')
+                if retries > 0:
+                    metrics.inc('pnimonitor_snmp_retries_total', retries, node=self.node)
+        return '\n'.join(netsnmp_format(o, v, quiet) for o, v in varbinds) + '\n', ''
+
     def ping(self,ipaddr):
         pingr = None
+        timeout = self._timeout('ping', 5)
         try:
-            ptup = subprocess.Popen(['ping', '-i', '0.2', '-w', '2', '-c', '500', ipaddr, '-q'], stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE).communicate()
+            ptup = communicate(['ping', '-i', '0.2', '-w', '2', '-c', '500', ipaddr, '-q'], timeout)
         except:
             main_logger.error("Unexpected error during ping test [Err no.1]: %s:%s" % sys.exc_info()[:2])
             sys.exit(3)
         else:
-            if ptup[1] == '':
+            if ptup is None:
+                main_logger.debug("Unexpected error during ping test [Err no.5]: No result within %.1f seconds"
+                                  % timeout)
+            elif ptup[1] == '':
                 n = re.search(r'(\d+)\%\spacket loss', ptup[0])
                 if n is not None:
                     if int(n.group(1)) == 0:
@@ -632,6 +1015,14 @@ class Router(threading.Thread):
         return pingr
 
 
+def router_job(rediscover, index, pw, args, node):
+    # Job factory of the scheduler engine. A pending rediscovery (inventory update) is carried over to the node's next
+    # run, however late it starts.
+    t = Router(index[node] + 1, node, pw, node in rediscover, *args)
+    rediscover.discard(node)
+    return t.name, t.run
+
+
 def _GzipnRotate(log_retention):
     unrotated_cronfiles = filter(lambda file: re.search(r'pniMonitor_cron.log$', file), os.listdir(os.getcwd()))
     now = tstamp('mr').time()
@@ -643,7 +1034,7 @@ def _GzipnRotate(log_retention):
                 main_logger.warning('%s could not be rotated. s% : s%', cronfile, sys.exc_info()[0], sys.exc_info()[1])
             else:
                 main_logger.info('%s rotated.' % cronfile)
-    unzipped_logfiles = filter(lambda file: re.search(r'pniMonitor_(main|ssh|cron).log.*[^gz]$', file),
+    unzipped_logfiles = filter(lambda file: re.search(r'pniMonitor_(main|ssh|cron|profile).log.*[^gz]$', file),
                                os.listdir(os.getcwd()))
     for file in unzipped_logfiles:
         with open(file) as ulf:
@@ -653,7 +1044,7 @@ def _GzipnRotate(log_retention):
         main_logger.info('%s compressed and saved.', file)
         os.remove(file)
     zipped_logfiles = {file: os.stat(file).st_mtime for file in
-                       filter(lambda file: re.search(r'pniMonitor_(main|ssh|cron).log.*[gz]$', file),
+                       filter(lambda file: re.search(r'pniMonitor_(main|ssh|cron|profile).log.*[gz]$', file),
                               os.listdir(os.getcwd()))}
     if len(zipped_logfiles) > int(log_retention):
         sortedlogfiles = sorted(zipped_logfiles.items(), key=operator.itemgetter(1))
@@ -672,7 +1063,7 @@ def usage(arg, opt=False):
             usage(arg)
             sys.exit(2)
     else:
-        print 'USAGE:\n\t%s\t[-h] [--help] [--documentation]' % arg
+        print 'USAGE:\n\t%s\t[-h] [--help] [--documentation] [-p] [--profile]' % arg
 
 
 def get_pw(c=3):
@@ -686,6 +1077,8 @@ def get_pw(c=3):
         except getpass.GetPassWarning as echo_warning:
             print echo_warning
         else:
+            ssh = paramiko.SSHClient()
+            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
             try:
                 ssh.connect(hn, username=un, password=pw, timeout=1, look_for_keys=False, allow_agent=False)
             except KeyboardInterrupt:
@@ -722,30 +1115,17 @@ def main(args):
     except IOError:
         print "Another instance is already running."
         sys.exit(1)
-    inventory_file = 'inventory.txt'
-    frequency = 30
-    rising_threshold = 95
-    falling_threshold = 90
-    loglevel = 'INFO'
-    log_retention = 7
-    data_retention = 2
-    email_alert_severity = 'ERROR'
-    acl_name = 'CDPautomation_RhmUdpBlock'
-    pni_interface_tag = 'CDPautomation_PNI'
-    cdn_interface_tag = 'CDPautomation_CDN'
-    ipv4_min_prefixes = 0
-    ipv6_min_prefixes = 50
-    cdn_serving_cap = 90
-    dryrun = False
-    runtime = 'infinite'
-    peak_start = datetime.time(17, 30)
-    peak_end = datetime.time(23, 59)
-    off_peak_frequency = 180
-    email_distro = ['support@domain1.com', 'dl@domain2.com']
-    snmp_timeout = 3
-    snmp_retries = 2
+    # Buffered probe samples are written out on every exit path, including the sys.exit() calls below.
+    atexit.register(sample_cache.flush)
+    config = pniMonitor_config.Config(args[0][:-3] + '.conf', main_logger)
+    router_args = None
+    runtime = None
+    pool = None
+    scheduler = None
+    rediscover = set()
+    profile_cli = False
     try:
-        options, remainder = getopt.getopt(args[1:], "hm", ["help", "manual"])
+        options, remainder = getopt.getopt(args[1:], "hmp", ["help", "manual", "profile"])
     except getopt.GetoptError as getopterr:
         print getopterr
         sys.exit(2)
@@ -757,6 +1137,8 @@ def main(args):
             elif opt in ('-m', '--manual'):
                 usage(args[0], opt=True)
                 sys.exit(0)
+            elif opt in ('-p', '--profile'):
+                profile_cli = True
             else:
                 print "Invalid option specified on the command line: %s" % (opt)
                 sys.exit(2)
@@ -767,496 +1149,150 @@ def main(args):
             print "Authentication successful"
             main_logger.info("Authentication successful")
     lastChanged = ""
-    try:
-        with open(args[0][:-3] + ".conf") as pf:
-            parameters = [tuple(i.split('=')) for i in
-                          filter(lambda line: line[0] != '#', [n.strip('\n')
-                                                               for n in pf.readlines() if n != '\n'])]
-    except IOError as ioerr:
-        rg = re.search(r'(\'.+\')', str(ioerr))
-        main_logger.warning("'%s could not be located. The program will continue with its default settings."
-                            "\nUse '%s -m or %s --manual to see detailed usage instructions."
-                            % (rg.group(1)[3:], args[0], args[0]))
-    else:
-        try:
-            for opt, arg in parameters:
-                if opt == 'inventory_file':
-                    if inventory_file != arg:
-                        main_logger.info('Inventory file has been set: %s' % arg)
-                    inventory_file = arg
-                elif opt.lower() == 'pni_interface_tag':
-                    if pni_interface_tag != arg:
-                        main_logger.info('pni_interface_tag has been set: %s' % arg)
-                    pni_interface_tag = str(arg)
-                elif opt.lower() == 'cdn_interface_tag':
-                    if cdn_interface_tag != arg:
-                        main_logger.info('cdn_interface_tag has been set: %s' % arg)
-                    cdn_interface_tag = str(arg)
-                elif opt.lower() == 'acl_name':
-                    if acl_name != arg:
-                        main_logger.info('acl_name has been set: %s' % arg)
-                    acl_name = str(arg)
-        except ValueError:
-            main_logger.warning("Invalid configuration line detected and ignored. All configuration parameters must "
-                                "be provided as key value pairs separated by an equal sign (=). Use '%s -m' or '%s "
-                                "--manual' for more details." % (args[0], args[0]))
+    alert_dispatcher.setFormatter(main_formatter)
     while True:
+        tick = time.time()
         try:
-            with open(args[0][:-3] + ".conf") as pf:
-                parameters = [tuple(i.split('=')) for i in
-                              filter(lambda line: line[0] != '#', [n.strip('\n')
-                                                                   for n in pf.readlines() if n != '\n'])]
+            changed = config.load()
         except KeyboardInterrupt:
             main_logger.info("Keyboard Interrupt")
             sys.exit(0)
-        except IOError as ioerr:
-            rg = re.search(r'(\'.+\')', str(ioerr))
-            if lastChanged == "":
-                main_logger.warning("'%s could not be located. The program will continue with its default settings."
-                                    "\nUse '%s -m or %s --manual to see detailed usage instructions."
-                                     % (rg.group(1)[3:], args[0], args[0]))
+        settings = config.values
+        if changed != []:
+            main_logger.setLevel(logging.getLevelName(settings['log_level']))
+            config.dump()
+            alert_dispatcher.configure(settings['email_distribution_list'], settings['email_digest_window'])
+            alert_dispatcher.setLevel(logging.getLevelName(settings['email_alert_severity']))
+            main_logger.addHandler(alert_dispatcher)
+            ssh_pool.configure(settings['ssh_keepalive'], settings['ssh_idle_timeout'])
+            acl_auditor.configure(settings['acl_audit_budget'])
+            fast_path.configure(settings['fast_path_frequency'], settings['fast_path_margin'])
+            event_listener.configure(settings['trap_port'], settings['syslog_port'])
+            metrics_exporter.configure(settings['metrics_port'], settings['metrics_file'])
+            profiler.configure(settings['profile'] or profile_cli, settings['profile_slowest'])
+            if runtime is None or 'runtime' in changed:
+                runtime = settings['runtime']
+            new_args = (settings['rising_threshold'], settings['falling_threshold'], settings['cdn_serving_cap'],
+                        settings['acl_name'], settings['simulation_mode'], settings['data_retention'],
+                        (settings['pni_interface_tag'], settings['cdn_interface_tag']),
+                        (settings['ipv4_min_prefixes'], settings['ipv6_min_prefixes']), settings['snmp_timeout'],
+                        settings['snmp_retries'], settings['snmp_backend'], settings['probe_mode'],
+                        settings['snmp_packet_size'], settings['ssh_timeout'])
+            if router_args is not None and new_args != router_args:
+                # Armed nodes poll with the settings of the Router that armed them; the next regular cycle re-arms
+                # them with the new ones.
+                disarmed = fast_path.reset()
+                if disarmed != []:
+                    main_logger.info("Configuration updated. Fast-path polling stopped until the next polling cycle "
+                                     "of: %s" % sorted(disarmed))
+            router_args = new_args
+        _GzipnRotate(settings['log_retention'])
+        inventory_file = settings['inventory_file']
+        frequency = settings['frequency']
+        peak_start, peak_end = settings['peak_hours']
+        try:
+            with open(inventory_file) as sf:
+                inventory = filter(lambda line: line[0] != '#', [n.strip('\n')
+                                                                 for n in sf.readlines() if n != '\n'])
+            if lastChanged != os.stat(inventory_file).st_mtime:
+                dswitch = True
             else:
-                main_logger.warning("'%s could not be located. The program will continue with the last known good "
-                                    "configuration.\nUse '%s -m or %s --manual to see detailed usage instructions."
-                                    % (rg.group(1)[3:], args[0], args[0]))
+                dswitch = False
+        except IOError as ioerr:
+            main_logger.critical('%s. Exiting.' % ioerr)
+            sys.exit(1)
+        except OSError as oserr:
+            main_logger.critical('%s. Exiting.' % oserr)
+            sys.exit(1)
         else:
-            try:
-                for opt, arg in parameters:
-                    if opt == 'log_level':
-                        if arg.lower() in ('debug', 'info', 'warning', 'error', 'critical'):
-                            if loglevel != arg.upper():
-                                main_logger.info('Loglevel has been updated: %s' % arg.upper())
-                            loglevel = arg.upper()
-                        else:
-                            if lastChanged == "":
-                                main_logger.warning('Invalid value specified for log_level. Resetting to default '
-                                                    'setting: %s' % loglevel)
-                            else:
-                                main_logger.warning('Invalid value specified for log_level. Resetting to last known '
-                                                    'good configuration: %s' % loglevel)
-                    elif opt == 'log_retention':
-                        try:
-                            arg = int(arg)
-                        except ValueError:
-                            if lastChanged == "":
-                                main_logger.warning('The value of the log_retention argument must be an integer. '
-                                                    'Resetting to default setting: %s' % log_retention)
-                            else:
-                                main_logger.warning('The value of the log_retention argument must be an integer. '
-                                                    'Resetting to last known good configuration: %s' % log_retention)
-                        else:
-                            if 0 <= arg <= 90:
-                                if log_retention != arg:
-                                    main_logger.info('Log retention parameter has been updated: %s' % arg)
-                                log_retention = arg
-                            else:
-                                if lastChanged == "":
-                                    main_logger.warning('The value of the log_retention argument must be an integer '
-                                                        'between 0 and 90. Resetting to default setting: %s'
-                                                        % log_retention)
-                                else:
-                                    main_logger.warning('The value of the log_retention argument must be an integer '
-                                                        'between 0 and 90. Resetting to last known good configuration: '
-                                                        '%s' % log_retention)
-                    elif opt == 'data_retention':
-                        try:
-                            arg = int(arg)
-                        except ValueError:
-                            if lastChanged == "":
-                                main_logger.warning('The value of the data_retention argument must be an integer. '
-                                                    'Resetting to default setting: %s' % data_retention)
-                            else:
-                                main_logger.warning('The value of the log_retention argument must be an integer. '
-                                                    'Resetting to last known good configuration: %s' % data_retention)
-                        else:
-                            if 2 <= arg <= 60:
-                                if data_retention != arg:
-                                    main_logger.info('Data retention parameter has been updated: %s' % arg)
-                                data_retention = arg
-                            else:
-                                if lastChanged == "":
-                                    main_logger.warning('The value of the data_retention argument must be an integer '
-                                                        'between 2 and 60. Resetting to default setting: %s'
-                                                        % data_retention)
-                                else:
-                                    main_logger.warning('The value of the data_retention argument must be an integer '
-                                                        'between 2 and 60. Resetting to last known good configuration: '
-                                                        '%s' % data_retention)
-                    elif opt == 'email_alert_severity':
-                        if arg.lower() in ('warning', 'error', 'critical'):
-                            if email_alert_severity != arg.upper():
-                                main_logger.info('Email alert severity has been updated: %s' % arg.upper())
-                            email_alert_severity = arg.upper()
-                        else:
-                            if lastChanged == "":
-                                main_logger.warning('Invalid severity specified for email alerts. Resetting to default '
-                                                    'setting: %s' % email_alert_severity)
-                            else:
-                                main_logger.warning('Invalid severity specified for email alerts. Resetting to last '
-                                                    'known good configuration: %s' % email_alert_severity)
-                    elif opt == 'rising_threshold':
-                        try:
-                            arg = int(arg)
-                        except ValueError:
-                            if lastChanged == "":
-                                main_logger.warning('The value of the rising_threshold argument must be an integer. '
-                                                    'Resetting to default setting: %s' % rising_threshold)
-                            else:
-                                main_logger.warning('The value of the rising_threshold argument must be an integer. '
-                                                    'Resetting to last known good configuration: %s' % rising_threshold)
-                        else:
-                            if 0 <= arg <= 100:
-                                if arg > falling_threshold:
-                                    if rising_threshold != arg:
-                                        main_logger.info('Rising Threshold has been updated: %s' % arg)
-                                    rising_threshold = arg
-                                else:
-                                    if lastChanged == "":
-                                        main_logger.warning('The value of the rising_threshold must be larger than the '
-                                                            'falling_threshold (%s). Resetting to default setting: %s' 
-                                                            % falling_threshold, rising_threshold)
-                                    else:
-                                        main_logger.warning('The value of the rising_threshold must be larger than the '
-                                                            'falling_threshold (%s). Resetting to last known good '
-                                                            'configuration: %s' % falling_threshold, rising_threshold)
-                            else:
-                                if lastChanged == "":
-                                    main_logger.warning('The value of the rising_threshold argument must be an integer '
-                                                        'between 0 and 100. Resetting to default setting: %s'
-                                                        % rising_threshold)
-                                else:
-                                    main_logger.warning('The value of the rising_threshold argument must be an integer '
-                                                        'between 0 and 100. Resetting to last known good configuration: '
-                                                        '%s' % rising_threshold)
-                    elif opt == 'falling_threshold':
-                        try:
-                            arg = int(arg)
-                        except ValueError:
-                            if lastChanged == "":
-                                main_logger.warning('The value of the falling_threshold argument must be an integer. '
-                                                    'Resetting to default setting: %s' % falling_threshold)
-                            else:
-                                main_logger.warning('The value of the falling_threshold argument must be an integer. '
-                                                    'Resetting to last known good configuration: %s' % falling_threshold)
-                        else:
-                            if 0 <= arg <= 100:
-                                if arg < rising_threshold:
-                                    if falling_threshold != arg:
-                                        main_logger.info('Falling Threshold has been updated: %s' % arg)
-                                    falling_threshold = arg
-                                else:
-                                    if lastChanged == "":
-                                        main_logger.warning('The value of the falling_threshold must be smaller than '
-                                                            'the rising_threshold (%s). Resetting to default setting: '
-                                                            '%s' % rising_threshold, falling_threshold)
-                                    else:
-                                        main_logger.warning('The value of the falling_threshold must be smaller than '
-                                                            'the rising_threshold (%s). Resetting to last known good '
-                                                            'configuration: %s' % rising_threshold, falling_threshold)
-                            else:
-                                if lastChanged == "":
-                                    main_logger.warning('The value of the falling_threshold argument must be an '
-                                                        'integer between 0 and 100. Resetting to default setting: %s'
-                                                        % falling_threshold)
-                                else:
-                                    main_logger.warning('The value of the falling_threshold argument must be an '
-                                                        'integer between 0 and 100. Resetting to last known good '
-                                                        'configuration: %s' % falling_threshold)
-                    elif opt == 'frequency':
-                        try:
-                            arg = int(arg)
-                        except ValueError:
-                            if lastChanged == "":
-                                main_logger.warning('The value of the frequency argument must be an integer. Resetting '
-                                                    'to default setting: %s' % frequency)
-                            else:
-                                main_logger.warning('The value of the frequency argument must be an integer. Resetting '
-                                                    'to last known good configuration: %s' % frequency)
-                        else:
-                            if 30 <= arg <= 300:
-                                if frequency != arg:
-                                    main_logger.info('Running frequency has been updated or reset: %s' % arg)
-                                frequency = arg
-                            else:
-                                if lastChanged == "":
-                                    main_logger.warning('The running frequency can not be shorter than 30 or longer '
-                                                        'than 300 seconds. Resetting to default setting: %s'
-                                                        % frequency)
-                                else:
-                                    main_logger.warning('The running frequency can not be shorter than 30 or longer '
-                                                        'than 300 seconds. Resetting to last known good configuration: '
-                                                        '%s' % frequency)
-                    elif opt == 'off_peak_frequency':
-                        try:
-                            arg = int(arg)
-                        except ValueError:
-                            if lastChanged == "":
-                                main_logger.warning('The value of the off-peak frequency must be an integer. Resetting '
-                                                    'to default setting: %s' % off_peak_frequency)
-                            else:
-                                main_logger.warning('The value of the off-peak frequency must be an integer. Resetting '
-                                                    'to last known good configuration: %s' % off_peak_frequency)
-                        else:
-                            if 30 <= arg <= 300:
-                                if off_peak_frequency != arg:
-                                    main_logger.info('Off-peak running frequency has been updated: %s' % arg)
-                                off_peak_frequency = arg
-                            else:
-                                if lastChanged == "":
-                                    main_logger.warning('The running frequency can not be shorter than 30 or longer '
-                                                        'than 300 seconds. Resetting to default setting: %s'
-                                                        % off_peak_frequency)
-                                else:
-                                    main_logger.warning('The running frequency can not be shorter than 30 or longer '
-                                                        'than 300 seconds. Resetting to last known good configuration: '
-                                                        '%s' % off_peak_frequency)
-                    elif opt == 'peak_hours':
-                        try:
-                            start, end = arg.split('-')
-                            start_h, start_m = start.split(':')
-                            end_h, end_m = end.split(':')
-                            peak_start_time = datetime.time(int(start_h), int(start_m))
-                            peak_end_time = datetime.time(int(end_h), int(end_m))
-                            assert peak_start_time < peak_end_time
-                        except AssertionError:
-                            main_logger.warning("Configured peak end time must be later than the start time. "
-                                                "Resetting to default or last known good configuration: %s-%s",
-                                                peak_start, peak_end)
-                        except:
-                            main_logger.warning("Invalid configuration detected in the peak hours argument (%s : %s). "
-                                                "Resetting to default or last known good configuration: %s-%s",
-                                                sys.exc_info()[0], sys.exc_info()[1], peak_start, peak_end)
-                        else:
-                            if peak_start != peak_start_time or peak_end != peak_end_time:
-                                main_logger.info("Peak hours configuration has been updated: %s-%s",
-                                                 peak_start, peak_end)
-                            peak_start = peak_start_time
-                            peak_end = peak_end_time
-                    elif opt == 'cdn_serving_cap':
-                        try:
-                            arg = int(arg)
-                        except ValueError:
-                            if lastChanged == "":
-                                main_logger.warning('The value of the cdn_serving_cap must be an integer. Resetting '
-                                                    'to default setting: %s' % cdn_serving_cap)
-                            else:
-                                main_logger.warning('The value of the cdn_serving_cap must be an integer. Resetting '
-                                                    'to last known good configuration: %s' % cdn_serving_cap)
-                        else:
-                            if 0 <= arg <= 100:
-                                if cdn_serving_cap != arg:
-                                    main_logger.info('CDN Serving Cap has been updated: %s' % arg)
-                                cdn_serving_cap = arg
-                            else:
-                                if lastChanged == "":
-                                    main_logger.warning('The cdn_serving_cap must be an integer between 0 and 100. '
-                                                        'Resetting to default setting: %s' % cdn_serving_cap)
-                                else:
-                                    main_logger.warning('The cdn_serving_cap must be an integer between 0 and 100.'
-                                                        'Resetting to last known good configuration: %s'
-                                                        % cdn_serving_cap)
-                    elif opt == 'runtime':
-                        if arg.lower() == 'infinite':
-                            if runtime != arg.lower():
-                                main_logger.info('Runtime has been updated: "infinite"')
-                            runtime = 'infinite'
-                        else:
-                            try:
-                                arg = int(arg)
-                            except ValueError:
-                                main_logger.warning('The value of the runtime argument must be either be "infinite" or '
-                                                    'an integer')
-                            else:
-                                if runtime != arg:
-                                    main_logger.info('Runtime has been updated: %s' % arg)
-                                runtime = arg
-                    elif opt.lower() == 'ipv4_min_prefixes':
-                        try:
-                            arg = int(arg)
-                        except ValueError:
-                            if lastChanged == "":
-                                main_logger.warning('The value of the ipv4_min_prefixes must be an integer. Resetting '
-                                                    'to default setting: %s' % ipv4_min_prefixes)
-                            else:
-                                main_logger.warning('The value of the ipv4_min_prefixes must be an integer. Resetting '
-                                                    'to last known good configuration: %s' % ipv4_min_prefixes)
-                        else:
-                            if ipv4_min_prefixes != arg:
-                                main_logger.info('ipv4_min_prefix count has been updated: %s' % arg)
-                            ipv4_min_prefixes = arg
-                    elif opt.lower() == 'ipv6_min_prefixes':
-                        try:
-                            arg = int(arg)
-                        except ValueError:
-                            if lastChanged == "":
-                                main_logger.warning('The value of the ipv6_min_prefixes must be an integer. Resetting '
-                                                    'to default setting: %s' % ipv6_min_prefixes)
-                            else:
-                                main_logger.warning('The value of the ipv6_min_prefixes must be an integer. Resetting '
-                                                    'to last known good configuration: %s' % ipv6_min_prefixes)
-                        else:
-                            if ipv6_min_prefixes != arg:
-                                main_logger.info('ipv6_min_prefix count has been updated: %s' % arg)
-                            ipv6_min_prefixes = arg
-                    elif opt.lower() == 'snmp_timeout':
-                        try:
-                            arg = int(arg)
-                        except ValueError:
-                            if lastChanged == "":
-                                main_logger.warning('The value of the snmp_timeout parameter must be an integer. '
-                                                    'Resetting to default setting: %s' % snmp_timeout)
-                            else:
-                                main_logger.warning('The value of the snmp_timeout parameter must be an integer. '
-                                                    'Resetting to last known good configuration: %s' % snmp_timeout)
-                        else:
-                            if snmp_timeout != arg:
-                                main_logger.info('snmp_timeout parameter has been updated: %s' % arg)
-                            snmp_timeout = arg
-                    elif opt.lower() == 'snmp_retries':
-                        try:
-                            arg = int(arg)
-                        except ValueError:
-                            if lastChanged == "":
-                                main_logger.warning('The value of the snmp_retries parameter must be an integer. '
-                                                    'Resetting to default setting: %s' % snmp_retries)
-                            else:
-                                main_logger.warning('The value of the snmp_retries parameter must be an integer. '
-                                                    'Resetting to last known good configuration: %s' % snmp_retries)
-                        else:
-                            if snmp_retries != arg:
-                                main_logger.info('snmp_retries parameter has been updated: %s' % arg)
-                            snmp_retries = arg
-                    elif opt == 'email_distribution_list':
-                        split_lst = arg.split(',')
-                        try:
-                            for email in split_lst:
-                                match = re.search(r"[\w.-]+@(domain1.com|domain2.com)", email)
-                                match.group()
-                        except AttributeError:
-                            if lastChanged == "":
-                                main_logger.warning('Invalid email address found in the distribution list. Resetting '
-                                                    'to default setting: %s' % email_distro)
-                            else:
-                                main_logger.warning('Invalid email address found in the distribution list. Resetting '
-                                                    'to last known good configuration: %s' % email_distro)
-                        else:
-                            if email_distro != split_lst:
-                                main_logger.info('Email distribution list has been updated: %s' % split_lst)
-                            email_distro = split_lst
-                    elif opt == 'simulation_mode':
-                        if arg.lower() == 'on':
-                            dryrun = True
-                            main_logger.info('Program running in simulation mode')
-                        elif arg.lower() == 'off':
-                            if dryrun != False:
-                                main_logger.info('Simulation mode turned off')
-                            dryrun = False
-                        else:
-                            main_logger.warning('Invalid configuration. The simulation_mode parameter has only two '
-                                                'valid arguments: "on" or "off"')
-                    elif opt.lower() in ('pni_interface_tag', 'cdn_interface_tag', 'ssh_loglevel',
-                                         'acl_name', 'persistence', 'inventory_file', 'ssh_timeout'):
-                        pass
-                    else:
-                        if lastChanged == "":
-                            main_logger.warning("Invalid parameter found in the configuration file: (%s). The program "
-                                                "will continue with its default settings. Use '%s -m' or '%s --manual' "
-                                                "to see detailed usage instructions." % (opt, args[0], args[0]))
-                        else:
-                            main_logger.warning("Invalid parameter found in the configuration file: (%s). The program "
-                                                "will continue with the last known good configuration. Use '%s -m' or"
-                                                " '%s --manual' to see detailed usage instructions." % (opt, args[0],
-                                                                                                        args[0]))
-            except ValueError:
-                main_logger.warning("Invalid configuration line detected and ignored. All configuration parameters "
-                                    "must be provided as key value pairs separated by an equal sign (=). Use '%s -m' "
-                                    "or '%s --manual' for more details." % (args[0], args[0]))
-        finally:
-            main_logger.setLevel(logging.getLevelName(loglevel))
-            try:
-                main_logger.removeHandler(main_eh)
-            except NameError:
-                pass
-            main_eh = handlers.SMTPHandler('localhost', 'no-reply@automation.domain1.com', email_distro,
-                                           'Virgin Media PNI Monitor')
-            main_eh.setFormatter(main_formatter)
-            main_eh.setLevel(logging.getLevelName(email_alert_severity))
-            main_logger.addHandler(main_eh)
-            main_logger.debug("Inventory File: %s", inventory_file)
-            main_logger.debug("ACL Name: %s", acl_name)
-            main_logger.debug("PNI Interface Tag: %s", pni_interface_tag)
-            main_logger.debug("CDN Interface Tag: %s", cdn_interface_tag)
-            main_logger.debug("Frequency: %s", frequency)
-            main_logger.debug("Off Peak Frequency: %s", off_peak_frequency)
-            main_logger.debug("Peak Hours: %s-%s", peak_start, peak_end)
-            main_logger.debug("Rising Threshold: %s", rising_threshold)
-            main_logger.debug("Falling Threshold: %s", falling_threshold)
-            main_logger.debug("CDN Serving Cap: %s", cdn_serving_cap)
-            main_logger.debug("IPv4 Min Prefixes: %s", ipv4_min_prefixes)
-            main_logger.debug("IPv6 Min Prefixes: %s", ipv6_min_prefixes)
-            main_logger.debug("Log Level: %s", loglevel)
-            main_logger.debug("Log Retention (days): %s", log_retention)
-            main_logger.debug("Email Alert Severity: %s", email_alert_severity)
-            main_logger.debug("Email Distribution List: %s", email_distro)
-            main_logger.debug("Simulation Mode: %s", dryrun)
-            main_logger.debug("Runtime: %s", runtime)
-            main_logger.debug("Data Retention (polling cycles): %s", data_retention)
-            main_logger.debug("SNMP Timeout (seconds): %s", snmp_timeout)
-            main_logger.debug("SNMP Retries: %s", snmp_retries)
-            _GzipnRotate(log_retention)
-            try:
-                with open(inventory_file) as sf:
-                    inventory = filter(lambda line: line[0] != '#', [n.strip('\n')
-                                                                     for n in sf.readlines() if n != '\n'])
-                if lastChanged != os.stat(inventory_file).st_mtime:
-                    dswitch = True
-                else:
-                    dswitch = False
-            except IOError as ioerr:
-                main_logger.critical('%s. Exiting.' % ioerr)
-                sys.exit(1)
-            except OSError as oserr:
-                main_logger.critical('%s. Exiting.' % oserr)
-                sys.exit(1)
+            now = tstamp('mr').time()
+            if not peak_start < now < peak_end:
+                frequency = settings['off_peak_frequency']
+                main_logger.info("Operating in off-peak frequency: %s" % frequency)
+            threads = []
+            audits = acl_auditor.schedule(inventory)
+            if audits != []:
+                main_logger.debug("ACL audits scheduled: %s (audit window: %s minutes)"
+                                  % (audits, acl_auditor.window(len(inventory))))
+            if settings['engine'] == 'scheduler':
+                if scheduler is None:
+                    scheduler = pniMonitor_engine.Scheduler(main_logger)
+                if dswitch:
+                    rediscover.update(inventory)
+                scheduler.update(inventory, frequency,
+                                 functools.partial(router_job, rediscover,
+                                                   dict((node, n) for n, node in enumerate(inventory)), pw,
+                                                   router_args + (frequency, settings['discovery_timeout'])))
+                for node, running in scheduler.overdue():
+                    main_logger.warning("%s has been running for %.1f seconds, past the end of its polling slot. "
+                                        "Its next cycles are delayed until it completes; other nodes are not "
+                                        "affected" % (node, running))
+                stats = scheduler.stats()
+                for node in sorted(stats):
+                    main_logger.debug("%s: cycle lag %.3f seconds, duration %.3f seconds, runs %d, polling slots "
+                                      "skipped %d" % ((node,) + stats[node]))
+                ran = [node for node in stats if stats[node][2] > 0]
+                if ran != []:
+                    slowest = max(ran, key=lambda node: stats[node][0])
+                    main_logger.info("Nodes scheduled: %d. Max cycle lag: %.3f seconds (%s). Polling slots "
+                                     "skipped: %d" % (len(stats), stats[slowest][0], slowest,
+                                                      sum(stats[node][3] for node in stats)))
             else:
-                now = tstamp('mr').time()
-                if not peak_start < now < peak_end:
-                    frequency = off_peak_frequency
-                    main_logger.info("Operating in off-peak frequency: %s" % frequency)
-                threads = []
+                if scheduler is not None:
+                    scheduler.stop(0)
+                    scheduler = None
                 main_logger.info("Initializing subThreads")
+                if settings['engine'] == 'pool':
+                    if pool is None:
+                        pool = pniMonitor_engine.Engine(settings['max_concurrency'], main_logger)
+                    elif pool.max_workers != settings['max_concurrency']:
+                        pool.resize(settings['max_concurrency'])
                 for n, node in enumerate(inventory):
-                    t = Router(n + 1, node, pw, dswitch, rising_threshold, falling_threshold,
-                               cdn_serving_cap, acl_name, dryrun, data_retention,
-                               (pni_interface_tag, cdn_interface_tag), (ipv4_min_prefixes, ipv6_min_prefixes),
-                               snmp_timeout, snmp_retries)
-                    threads.append(t)
-                    t.start()
+                    t = Router(n + 1, node, pw, dswitch, *(router_args + (frequency, settings['discovery_timeout'])))
+                    if settings['engine'] == 'pool':
+                        threads.append(pool.submit(t.name, t.run))
+                    else:
+                        threads.append(t)
+                        t.start()
                 hungThreads = []
-                for t in threads:
-                    t.join(frequency - 0.2)
-                    if t.isAlive():
-                        hungThreads.append(t)
+                if settings['engine'] == 'pool':
+                    hungThreads = pool.wait(threads, frequency - 0.2)
+                else:
+                    for t in threads:
+                        t.join(frequency - 0.2)
+                        if t.isAlive():
+                            hungThreads.append(t)
                 if hungThreads != []:
-                    main_logger.warning("Threads detected in hung state: %r. Hibernating inactive threads until status "
-                                        "cleared." % [t.name for t in hungThreads])
-                    for t in hungThreads:
-                        t.join()
+                    main_logger.warning("Threads detected in hung state: %r. Hibernating inactive threads until "
+                                        "status cleared." % [t.name for t in hungThreads])
+                    if settings['engine'] == 'pool':
+                        pool.wait(hungThreads)
+                    else:
+                        for t in hungThreads:
+                            t.join()
                     main_logger.warning("Hung threads status cleared. Resuming normal operation")
-                    #subprocess.Popen(['kill', '-9', pid], stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
+                    #subprocess.Popen(['kill', '-9', pid], stdout=subprocess.PIPE,
+                    #                 stderr=subprocess.PIPE).communicate()
                 main_logger.info("All subThreads completed")
-                lastChanged = os.stat(inventory_file).st_mtime
-                if type(runtime) == int:
-                    runtime -= 1
-            finally:
-                if runtime == 0:
-                    main_logger.info("Runtime exceeded. Exiting.")
-                    break
-                try:
+            lastChanged = os.stat(inventory_file).st_mtime
+            metrics_exporter.write()
+            profiler.report()
+            if type(runtime) == int:
+                runtime -= 1
+        finally:
+            if runtime == 0:
+                main_logger.info("Runtime exceeded. Exiting.")
+                if scheduler is not None:
+                    scheduler.stop(frequency)
+                break
+            try:
+                if settings['engine'] == 'scheduler':
+                    time.sleep(max(tick + frequency - time.time(), 0))
+                else:
                     time.sleep(frequency)
-                except KeyboardInterrupt:
-                    main_logger.info("Keyboard Interrupt")
-                    sys.exit(0)
+            except KeyboardInterrupt:
+                main_logger.info("Keyboard Interrupt")
+                sys.exit(0)
 
 
 if __name__ == '__main__':
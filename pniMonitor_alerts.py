@@ -0,0 +1,161 @@
+#!/usr/bin/env python2.7
+
+# Email alerting for pniMonitor.py. Log records at or above email_alert_severity are put on a bounded queue by the
+# thread that logged them, and sent by a dedicated worker thread, so that a stalled or unreachable SMTP server never
+# delays the polling cycle or the ACL change of the node that raised the alert. Records are grouped by node and error
+# code (e.g. _snmp() Err no.2); all groups collected within email_digest_window seconds of the first record are sent as
+# a single digest email. Failed deliveries are retried with an exponential backoff. Records that arrive while the queue
+# is full are dropped and counted in the next digest.
+
+import logging
+import smtplib
+import socket
+import threading
+import Queue
+import collections
+import re
+import time
+from email.utils import formatdate
+
+err_code_re = re.compile(r'\[([^\[\]]*Err no\.\d+)\]')
+dF = "%Y-%m-%d %H:%M:%S"
+
+
+def _node(thread_name):
+    # Per-node threads and jobs are named <kind>_<node> (e.g. thread-3_router1, fastpath_router1).
+    if '_' in thread_name:
+        return thread_name.split('_', 1)[1]
+    return None
+
+
+def _code(record, message):
+    match = err_code_re.search(message)
+    if match:
+        return match.group(1)
+    return '%s: %s' % (record.levelname, message.split('\n')[0][:60])
+
+
+class Dispatcher(logging.Handler):
+    def __init__(self, mailhost, fromaddr, subject, fallback=None, queue_size=1000, retries=3, retry_interval=5,
+                 timeout=10):
+        logging.Handler.__init__(self)
+        if isinstance(mailhost, tuple):
+            self.mailhost, self.mailport = mailhost
+        else:
+            self.mailhost, self.mailport = mailhost, smtplib.SMTP_PORT
+        self.fromaddr = fromaddr
+        self.toaddrs = []
+        self.subject = subject
+        self.fallback = fallback
+        self.retries = retries
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.window = 60
+        self.queue = Queue.Queue(queue_size)
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.thread = None
+
+    def configure(self, toaddrs, window):
+        self.toaddrs = list(toaddrs)
+        self.window = window
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name='alert-dispatcher')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def emit(self, record):
+        # Called on the logging thread; must never block.
+        try:
+            message = self.format(record)
+            self.queue.put_nowait((record.created, _node(record.threadName), _code(record, record.getMessage()),
+                                   message))
+        except Queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            groups = collections.OrderedDict()
+            stop = False
+            end = time.time() + self.window
+            while item is not None:
+                created, node, code, message = item
+                group = groups.setdefault((node, code), [0, created, message, created, message])
+                group[0] += 1
+                group[3], group[4] = created, message
+                try:
+                    item = self.queue.get(True, end - time.time()) if end > time.time() else self.queue.get_nowait()
+                except Queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+            self._send(groups)
+            if stop:
+                return
+
+    def _send(self, groups):
+        self.acquire()
+        try:
+            dropped, self.dropped = self.dropped, 0
+        finally:
+            self.release()
+        if self.toaddrs == []:
+            return
+        alerts = sum(group[0] for group in groups.values())
+        nodes = set(node for node, code in groups)
+        if alerts == 1 and dropped == 0:
+            subject = self.subject
+        else:
+            subject = '%s - %d alerts from %d source(s)' % (self.subject, alerts + dropped, len(nodes))
+        body = []
+        for (node, code), (count, first, first_message, last, last_message) in groups.items():
+            if count > 1:
+                body.append('[%s] %s: %d occurrences between %s and %s' % (node or 'pniMonitor', code, count,
+                                                                          time.strftime(dF, time.localtime(first)),
+                                                                          time.strftime(dF, time.localtime(last))))
+                body += [first_message, '...', last_message, '']
+            else:
+                body += [first_message, '']
+        if dropped:
+            body.append('%d further alert(s) were dropped while the alert queue was full.' % dropped)
+        msg = "From: %s\r\nTo: %s\r\nSubject: %s\r\nDate: %s\r\n\r\n%s" % (self.fromaddr, ','.join(self.toaddrs),
+                                                                          subject, formatdate(), '\n'.join(body))
+        for attempt in range(self.retries + 1):
+            try:
+                smtp = smtplib.SMTP(self.mailhost, self.mailport, timeout=self.timeout)
+                try:
+                    smtp.sendmail(self.fromaddr, self.toaddrs, msg)
+                    smtp.quit()
+                finally:
+                    smtp.close()
+            except (smtplib.SMTPException, socket.error) as err:
+                if attempt < self.retries:
+                    time.sleep(self.retry_interval * 2 ** attempt)
+            else:
+                self.sent += 1
+                return
+        self.failed += 1
+        self._log(logging.WARNING, 'Email alert could not be delivered after %d attempt(s): %s. %d alert(s) discarded'
+                  % (self.retries + 1, err, alerts))
+
+    def _log(self, level, message):
+        # Own failures are written to the fallback handler only, so that they are not queued as alerts themselves.
+        if self.fallback is not None:
+            self.fallback.handle(logging.LogRecord(__name__, level, __file__, 0, message, None, None))
+
+    def close(self, timeout=None):
+        # Sends what has been queued so far; called by logging.shutdown() at exit.
+        if self.thread is not None and self.thread.is_alive():
+            try:
+                self.queue.put(None, True, 1)
+            except Queue.Full:
+                pass
+            else:
+                self.thread.join(self.timeout if timeout is None else timeout)
+        logging.Handler.close(self)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python2.7
+
+# ACL drift reconciliation for pniMonitor.py. The ACL status of the CDN interfaces is otherwise only verified on the
+# routers during discovery and when the program changes it itself. In every polling cycle the auditor grants a re-audit
+# to the nodes that have gone longest without one, within a global budget of SSH sessions per minute
+# (acl_audit_budget), so that every node is verified within a bounded window without a burst of SSH sessions.
+
+import threading
+import time
+import math
+
+
+class Auditor(object):
+    def __init__(self, budget=6):
+        self.budget = budget
+        self.tokens = float(budget)
+        self.updated = time.time()
+        self.last_audit = {}
+        self.granted = set()
+        self.lock = threading.Lock()
+
+    def configure(self, budget):
+        with self.lock:
+            self.budget = budget
+            self.tokens = min(self.tokens, float(budget))
+
+    def schedule(self, nodes):
+        # Refills the budget for the time elapsed since the previous cycle and grants the whole tokens available to the
+        # nodes that have gone longest without an audit attempt. Grants left unclaimed from the previous cycle (nodes
+        # without CDN interfaces, or halted before the audit) count as attempts, so that those nodes go to the back of
+        # the queue instead of holding on to the budget.
+        with self.lock:
+            now = time.time()
+            for node in self.granted:
+                self.last_audit[node] = self.updated
+            self.tokens = min(float(self.budget), self.tokens + (now - self.updated) * self.budget / 60.0)
+            self.updated = now
+            self.granted = set(sorted(nodes, key=lambda node: self.last_audit.get(node, 0))[:int(self.tokens)])
+            return [node for node in nodes if node in self.granted]
+
+    def claim(self, node):
+        # Called right before the audit session is opened; a token is charged only then. A failed audit is retried
+        # once the other nodes have had theirs.
+        with self.lock:
+            if node in self.granted and self.tokens >= 1:
+                self.granted.discard(node)
+                self.tokens -= 1
+                self.last_audit[node] = time.time()
+                return True
+            return False
+
+    def window(self, nodes):
+        # Minutes within which every node is audited at least once; None if auditing is disabled.
+        if self.budget == 0:
+            return None
+        return int(math.ceil(float(nodes) / self.budget))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python2.7
+
+# Benchmark of the decision step of pniMonitor.py (pniMonitor_decision.decide) over synthetic routers.
+#
+# Usage: pniMonitor_benchmark.py [-r <routers>] [-p <pni interfaces>] [-b <bgp peers per pni>] [-c <cdn interfaces>]
+#                                [-n <iterations>]
+#
+# Reports the decisions per second and the number of objects tracked by the garbage collector that are allocated and
+# retained per decision, so that regressions in the hot path can be spotted before they reach production.
+
+import sys
+import getopt
+import gc
+import time
+import random
+import datetime
+import resource
+import pniMonitor_decision
+
+dF = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def synthetic_router(pni, peers, cdn, seed):
+    rnd = random.Random(seed)
+    disc, prv, nxt = {}, {}, {}
+    t0 = datetime.datetime(2018, 1, 1, 20, 0, 0)
+    ts = [t0.strftime(dF), (t0 + datetime.timedelta(seconds=30)).strftime(dF)]
+    for n in range(pni + cdn):
+        name = 'Bundle-Ether%d' % (n + 1)
+        speed = rnd.choice([10000, 20000, 40000, 100000])
+        disc[name] = {'ifIndex': str(n + 1), 'type': 'pni' if n < pni else 'cdn'}
+        if n >= pni:
+            disc[name]['aclStatus'] = rnd.choice(['on', 'off'])
+        counter = rnd.randint(0, 2 ** 62)
+        for sample, t in ((prv, 0), (nxt, 1)):
+            counter += int(speed * 10 ** 6 / 8 * 30 * rnd.random() * 0.9) * t
+            sample[name] = {'ts': ts[t], 'adminStatus': 'up', 'operStatus': 'up', 'ifSpeed': str(speed),
+                            'ifInOctets': str(counter), 'ifOutOctets': str(counter)}
+            if n < pni:
+                for afi in ('ipv4', 'ipv6'):
+                    sample[name]['peerStatus_' + afi] = dict(('%s-%d-%d' % (afi, n, p), ['6', str(rnd.randint(0, 900))])
+                                                             for p in range(peers))
+    return disc, prv, nxt
+
+
+def main(args):
+    routers, pni, peers, cdn, iterations = 50, 4, 2, 4, 200
+    try:
+        options, remainder = getopt.getopt(args[1:], "r:p:b:c:n:")
+        for opt, arg in options:
+            if opt == '-r':
+                routers = int(arg)
+            elif opt == '-p':
+                pni = int(arg)
+            elif opt == '-b':
+                peers = int(arg)
+            elif opt == '-c':
+                cdn = int(arg)
+            elif opt == '-n':
+                iterations = int(arg)
+    except (getopt.GetoptError, ValueError) as err:
+        print err
+        print "Usage: %s [-r <routers>] [-p <pni>] [-b <peers per pni>] [-c <cdn>] [-n <iterations>]" % args[0]
+        sys.exit(2)
+    thresholds = pniMonitor_decision.Thresholds(95, 90, 90, 0, 50)
+    fleet = [synthetic_router(pni, peers, cdn, seed) for seed in range(routers)]
+    print "Routers: %d, PNI interfaces: %d (%d BGP peers per AFI each), CDN interfaces: %d, iterations: %d" \
+          % (routers, pni, peers, cdn, iterations)
+    print "Backend: %s" % ('numpy' if pniMonitor_decision.numpy is not None else 'python')
+    actions = {}
+    for disc, prv, nxt in fleet:
+        for decision, interfaces, reason in pniMonitor_decision.decide(disc, prv, nxt, thresholds):
+            actions[reason] = actions.get(reason, 0) + 1
+    print "Decisions per cycle: %s" % (actions or 'no action')
+    gc.collect()
+    gc.disable()
+    objects, allocated = len(gc.get_objects()), 0
+    start, cpu = time.time(), time.clock()
+    for i in range(iterations):
+        before = gc.get_count()[0]
+        for disc, prv, nxt in fleet:
+            pniMonitor_decision.decide(disc, prv, nxt, thresholds)
+        allocated += max(gc.get_count()[0] - before, 0)
+    elapsed, cpu = time.time() - start, time.clock() - cpu
+    retained = len(gc.get_objects()) - objects
+    gc.enable()
+    decisions = routers * iterations
+    print "Decisions per second: %.0f (wall), %.0f (cpu)" % (decisions / elapsed, decisions / cpu)
+    print "Latency per decision: %.1f us" % (elapsed / decisions * 10 ** 6)
+    print "GC-tracked objects per decision: %.1f allocated (net of those freed), %.2f retained" \
+          % (float(allocated) / decisions, float(retained) / decisions)
+    print "Peak RSS: %.1f MB" % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
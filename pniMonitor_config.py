@@ -0,0 +1,239 @@
+#!/usr/bin/env python2.7
+
+# Configuration file (pniMonitor.conf) handling of pniMonitor.py. The parameters are declared in a schema (default,
+# parser with type and range checks, startup-only or runtime) and the constraints between them, e.g. rising_threshold >
+# falling_threshold, are checked on the configuration as a whole. The file is re-read only when its mtime or size has
+# changed, and re-parsed only when its content has; the validated configuration then replaces the previous one in a
+# single assignment, so that readers always see a consistent set of values. In polling cycles where the file has not
+# changed, nothing is validated or logged again.
+
+import os
+import re
+import hashlib
+import datetime
+import collections
+import logging
+
+email_re = re.compile(r"[\w.-]+@(domain1.com|domain2.com)")
+
+
+def integer(low=None, high=None):
+    def parse(arg):
+        try:
+            value = int(arg)
+        except ValueError:
+            raise ValueError('must be an integer')
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise ValueError('must be an integer between %s and %s' % (low, high))
+        return value
+    return parse
+
+
+def choice(*choices):
+    def parse(arg):
+        if arg.lower() not in choices:
+            raise ValueError('must be one of: %s' % ', '.join(choices))
+        return arg.lower()
+    return parse
+
+
+def severity(*levels):
+    def parse(arg):
+        return choice(*levels)(arg).upper()
+    return parse
+
+
+def switch(arg):
+    if arg.lower() not in ('on', 'off'):
+        raise ValueError('has only two valid arguments: "on" or "off"')
+    return arg.lower() == 'on'
+
+
+def string(arg):
+    return arg
+
+
+def peak_hours(arg):
+    try:
+        start, end = arg.split('-')
+        start_h, start_m = start.split(':')
+        end_h, end_m = end.split(':')
+        start, end = datetime.time(int(start_h), int(start_m)), datetime.time(int(end_h), int(end_m))
+    except ValueError:
+        raise ValueError('must be given as hh:mm-hh:mm')
+    if not start < end:
+        raise ValueError('must have an end time later than the start time')
+    return start, end
+
+
+def runtime(arg):
+    if arg.lower() == 'infinite':
+        return 'infinite'
+    try:
+        return int(arg)
+    except ValueError:
+        raise ValueError('must either be "infinite" or an integer')
+
+
+def email_list(arg):
+    addresses = arg.split(',')
+    for address in addresses:
+        if not email_re.search(address):
+            raise ValueError('contains an invalid email address (%s)' % address)
+    return addresses
+
+
+# name: (default, parser, startup only, label)
+schema = collections.OrderedDict([
+    ('inventory_file', ('inventory.txt', string, True, 'Inventory File')),
+    ('acl_name', ('CDPautomation_RhmUdpBlock', string, True, 'ACL Name')),
+    ('pni_interface_tag', ('CDPautomation_PNI', string, True, 'PNI Interface Tag')),
+    ('cdn_interface_tag', ('CDPautomation_CDN', string, True, 'CDN Interface Tag')),
+    ('frequency', (30, integer(30, 300), False, 'Frequency')),
+    ('off_peak_frequency', (180, integer(30, 300), False, 'Off Peak Frequency')),
+    ('peak_hours', ((datetime.time(17, 30), datetime.time(23, 59)), peak_hours, False, 'Peak Hours')),
+    ('rising_threshold', (95, integer(0, 100), False, 'Rising Threshold')),
+    ('falling_threshold', (90, integer(0, 100), False, 'Falling Threshold')),
+    ('cdn_serving_cap', (90, integer(0, 100), False, 'CDN Serving Cap')),
+    ('ipv4_min_prefixes', (0, integer(), False, 'IPv4 Min Prefixes')),
+    ('ipv6_min_prefixes', (50, integer(), False, 'IPv6 Min Prefixes')),
+    ('log_level', ('INFO', severity('debug', 'info', 'warning', 'error', 'critical'), False, 'Log Level')),
+    ('log_retention', (7, integer(0, 90), False, 'Log Retention (days)')),
+    ('email_alert_severity', ('ERROR', severity('warning', 'error', 'critical'), False, 'Email Alert Severity')),
+    ('email_distribution_list', (['support@domain1.com', 'dl@domain2.com'], email_list, False,
+                                 'Email Distribution List')),
+    ('email_digest_window', (60, integer(0, 3600), False, 'Email Digest Window (seconds)')),
+    ('simulation_mode', (False, switch, False, 'Simulation Mode')),
+    ('runtime', ('infinite', runtime, False, 'Runtime')),
+    ('data_retention', (2, integer(2, 60), False, 'Data Retention (polling cycles)')),
+    ('snmp_timeout', (3, integer(), False, 'SNMP Timeout (seconds)')),
+    ('snmp_retries', (2, integer(), False, 'SNMP Retries')),
+    ('snmp_backend', ('netsnmp', choice('netsnmp', 'native'), False, 'SNMP Backend')),
+    ('probe_mode', ('single', choice('single', 'bulk'), False, 'Probe Mode')),
+    ('snmp_packet_size', (1472, integer(484, 65507), False, 'SNMP Packet Size')),
+    ('engine', ('threads', choice('threads', 'pool', 'scheduler'), False, 'Engine')),
+    ('max_concurrency', (50, integer(1, 1000), False, 'Max Concurrency')),
+    ('ssh_keepalive', (30, integer(0, 300), False, 'SSH Keepalive (seconds)')),
+    ('ssh_idle_timeout', (900, integer(0, 86400), False, 'SSH Idle Timeout (seconds)')),
+    ('ssh_timeout', (30, integer(1, 300), False, 'SSH Timeout (seconds)')),
+    ('discovery_timeout', (300, integer(30, 3600), False, 'Discovery Timeout (seconds)')),
+    ('acl_audit_budget', (6, integer(0, 600), False, 'ACL Audit Budget (SSH sessions per minute)')),
+    ('fast_path_frequency', (5, integer(1, 30), False, 'Fast-Path Frequency (seconds)')),
+    ('fast_path_margin', (5, integer(0, 50), False, 'Fast-Path Margin')),
+    ('trap_port', (0, integer(0, 65535), False, 'Trap Port')),
+    ('syslog_port', (0, integer(0, 65535), False, 'Syslog Port')),
+    ('metrics_port', (0, integer(0, 65535), False, 'Metrics Port')),
+    ('metrics_file', ('', string, False, 'Metrics File')),
+    ('profile', (False, switch, False, 'Profile')),
+    ('profile_slowest', (0, integer(0, 20), False, 'Profile Slowest (cycles per day)')),
+])
+
+# (parameters, check, message); if a check fails, all of its parameters keep their previous values.
+constraints = [
+    (('rising_threshold', 'falling_threshold'), lambda values: values['rising_threshold'] > values['falling_threshold'],
+     'The value of the rising_threshold must be larger than the falling_threshold'),
+]
+
+# Parameters under development; accepted and ignored.
+ignored = ('persistence', 'ssh_loglevel', 'ssh_log_level')
+
+
+def _format(value):
+    if isinstance(value, tuple):
+        return '-'.join(str(v) for v in value)
+    return value
+
+
+class Config(object):
+    def __init__(self, path, logger=None):
+        self.path = path
+        self.logger = logger or logging.getLogger(__name__)
+        self.values = dict((name, spec[0]) for name, spec in schema.items())
+        self.stat = None
+        self.digest = None
+        self.started = False
+
+    def _fallback(self):
+        return 'last known good configuration' if self.started else 'default setting'
+
+    def load(self):
+        # Returns the names of the parameters that have changed; all of them on the first call.
+        try:
+            st = os.stat(self.path)
+            stat = (st.st_mtime, st.st_size, st.st_ino)
+            if stat == self.stat:
+                return []
+            with open(self.path) as pf:
+                content = pf.read()
+        except (IOError, OSError) as err:
+            if self.stat != 'missing':
+                self.logger.warning("%s. The program will continue with its %s.\nUse the -m or --manual option to see "
+                                    "detailed usage instructions." % (err, 'last known good configuration' if
+                                                                       self.started else 'default settings'))
+            self.stat, self.digest = 'missing', None
+            return self._apply(self.values)
+        self.stat = stat
+        digest = hashlib.md5(content).hexdigest()
+        if digest == self.digest:
+            return []
+        self.digest = digest
+        return self._apply(self._parse(content))
+
+    def _parse(self, content):
+        values = dict(self.values)
+        for line in content.splitlines():
+            line = line.strip()
+            if line == '' or line[0] == '#':
+                continue
+            if '=' not in line:
+                self.logger.warning("Invalid configuration line detected and ignored (%s). All configuration "
+                                    "parameters must be provided as key value pairs separated by an equal sign (=)."
+                                    % line)
+                continue
+            opt, arg = [s.strip() for s in line.split('=', 1)]
+            name = opt.lower()
+            if name in ignored:
+                continue
+            elif name not in schema:
+                self.logger.warning("Invalid parameter found in the configuration file: (%s). The program will "
+                                    "continue with its %s." % (opt, 'last known good configuration' if self.started
+                                                               else 'default settings'))
+                continue
+            default, parser, startup, label = schema[name]
+            try:
+                value = parser(arg)
+            except ValueError as err:
+                self.logger.warning('The value of the %s parameter %s. Resetting to %s: %s'
+                                    % (name, err, self._fallback(), _format(self.values[name])))
+                continue
+            if startup and self.started:
+                if value != self.values[name]:
+                    self.logger.warning('%s can only be configured during startup. The change will take effect '
+                                        'after a restart' % name)
+                continue
+            values[name] = value
+        for names, check, message in constraints:
+            if not check(values):
+                self.logger.warning('%s. Resetting to %s: %s' % (message, self._fallback(), ', '.join(
+                    '%s=%s' % (name, _format(self.values[name])) for name in names)))
+                for name in names:
+                    values[name] = self.values[name]
+        return values
+
+    def _apply(self, values):
+        if self.started:
+            changed = [name for name in schema if values[name] != self.values[name]]
+        else:
+            changed = list(schema)
+        for name in changed:
+            if values[name] != schema[name][0] or self.started:
+                self.logger.info('%s has been updated: %s' % (name, _format(values[name])))
+        # A new dictionary is assigned rather than the current one updated, so that a reference obtained by another
+        # thread is never modified.
+        self.values = values
+        self.started = True
+        return changed
+
+    def dump(self):
+        for name, spec in schema.items():
+            self.logger.debug('%s: %s', spec[3], _format(self.values[name]))
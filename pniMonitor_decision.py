@@ -0,0 +1,183 @@
+#!/usr/bin/env python2.7
+
+# Capacity and utilisation computations of pniMonitor.py.
+#
+# The previous and next probe samples of a node are flattened into one column per metric (epoch timestamps, octet
+# counters, speeds, status and accepted prefix counts of the established BGP sessions per AFI), so that the
+# utilisation of every interface and the capacity totals of the node are calculated in a single pass. NumPy is used
+# when it is installed; otherwise the same calculation runs in pure Python.
+#
+# Samples are matched by interface name. An interface without a previous sample (e.g. one that has just been
+# discovered) is warming up: its utilisation is reported as 0 and, if it is a PNI, neither its capacity nor its traffic
+# is counted towards the usable and actual PNI egress until it has been probed twice.
+
+import datetime
+import time
+import collections
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+dF = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def _epoch(ts, cache):
+    # All interfaces of a sample are tagged with the same timestamp, so each distinct string is parsed only once.
+    try:
+        return cache[ts]
+    except KeyError:
+        dt = datetime.datetime.strptime(ts, dF)
+        cache[ts] = epoch = time.mktime(dt.timetuple()) + dt.microsecond / 1e6
+        return epoch
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _prefixes(peers):
+    # Accepted prefixes summed over the peers in the Established (6) state.
+    return sum(_int(status[1]) for status in peers.itervalues() if status[0] == '6')
+
+
+class Columns(object):
+    def __init__(self, disc, prv, nxt):
+        cache = {}
+        self.names = sorted(nxt)
+        self.pni, self.cdn, self.acl_on, self.acl_off = [], [], [], []
+        self.up, self.prv_up, self.warm, self.speed, self.delta_time = [], [], [], [], []
+        self.prv_in, self.nxt_in, self.prv_out, self.nxt_out, self.pfx4, self.pfx6 = [], [], [], [], [], []
+        for name in self.names:
+            n, p = nxt[name], prv.get(name)
+            self.pni.append(disc[name]['type'] == 'pni')
+            self.cdn.append(disc[name]['type'] == 'cdn')
+            self.acl_on.append(disc[name].get('aclStatus') == 'on')
+            self.acl_off.append(disc[name].get('aclStatus') == 'off')
+            self.up.append(n['operStatus'] == 'up')
+            self.speed.append(_int(n['ifSpeed']))
+            self.nxt_in.append(_int(n['ifInOctets']))
+            self.nxt_out.append(_int(n['ifOutOctets']))
+            self.pfx4.append(_prefixes(n.get('peerStatus_ipv4', {})))
+            self.pfx6.append(_prefixes(n.get('peerStatus_ipv6', {})))
+            self.warm.append(p is not None)
+            if p is None:
+                self.prv_up.append(False)
+                self.delta_time.append(0.0)
+                self.prv_in.append(0)
+                self.prv_out.append(0)
+            else:
+                self.prv_up.append(p['operStatus'] == 'up')
+                self.delta_time.append(_epoch(n['ts'], cache) - _epoch(p['ts'], cache))
+                self.prv_in.append(_int(p['ifInOctets']))
+                self.prv_out.append(_int(p['ifOutOctets']))
+
+
+def _capacity_numpy(c, serving_cap, ipv4_minPfx, ipv6_minPfx):
+    pni, cdn = numpy.array(c.pni, bool), numpy.array(c.cdn, bool)
+    up, prv_up = numpy.array(c.up, bool), numpy.array(c.prv_up, bool)
+    speed = numpy.array(c.speed, numpy.int64)
+    delta_time = numpy.array(c.delta_time, numpy.float64)
+    # Octet counters are unsigned 64-bit; the wrapped difference is read back as signed so that a counter reset
+    # yields a negative delta, as it does with Python integers.
+    delta_in = (numpy.array(c.nxt_in, numpy.uint64) - numpy.array(c.prv_in, numpy.uint64)).view(numpy.int64)
+    delta_out = (numpy.array(c.nxt_out, numpy.uint64) - numpy.array(c.prv_out, numpy.uint64)).view(numpy.int64)
+    usable = pni & numpy.array(c.warm, bool) & ((up & (numpy.array(c.pfx4, numpy.int64) > ipv4_minPfx)) |
+                                                (numpy.array(c.pfx6, numpy.int64) > ipv6_minPfx))
+    cdn_up = cdn & up
+    pni_rate = usable & prv_up & (delta_time > 0)
+    cdn_rate = cdn_up & prv_up & (delta_time > 0)
+    delta = numpy.where(pni_rate, delta_out, numpy.where(cdn_rate, delta_in, 0)).astype(numpy.float64)
+    seconds = numpy.where(pni_rate | cdn_rate, delta_time, 1.0)
+    util = delta * 8 / (seconds * 10 ** 6)
+    util_prc = numpy.where(speed > 0, util * 100 / numpy.where(speed > 0, speed, 1), 0.0)
+    max_cdn = speed * serving_cap // 100
+    cdn_unblocked = cdn_up & numpy.array(c.acl_off, bool)
+    cdn_blocked = cdn_up & numpy.array(c.acl_on, bool)
+    return {'util': util.tolist(), 'util_prc': util_prc.tolist(),
+            'actualCdnIn': float(util[cdn_rate].sum()),
+            'physicalCdnIn': int(speed[cdn_up].sum()),
+            'maxCdnIn': int(max_cdn[cdn_up].sum()),
+            'unblocked_maxCdnIn': int(max_cdn[cdn_unblocked].sum()),
+            'actualPniOut': float(util[pni_rate].sum()),
+            'physicalPniOut': int(speed[pni & up].sum()),
+            'usablePniOut': int(speed[usable].sum()),
+            'unblocked': [name for name, u in zip(c.names, cdn_unblocked) if u],
+            'blocked': [name for name, b in zip(c.names, cdn_blocked) if b]}
+
+
+def _capacity_python(c, serving_cap, ipv4_minPfx, ipv6_minPfx):
+    r = {'util': [], 'util_prc': [], 'actualCdnIn': 0.0, 'physicalCdnIn': 0, 'maxCdnIn': 0, 'unblocked_maxCdnIn': 0,
+         'actualPniOut': 0.0, 'physicalPniOut': 0, 'usablePniOut': 0, 'unblocked': [], 'blocked': []}
+    for k, name in enumerate(c.names):
+        speed, up, util = c.speed[k], c.up[k], 0.0
+        rate = c.prv_up[k] and c.delta_time[k] > 0
+        if c.pni[k]:
+            if up:
+                r['physicalPniOut'] += speed
+            if c.warm[k] and (up and c.pfx4[k] > ipv4_minPfx or c.pfx6[k] > ipv6_minPfx):
+                r['usablePniOut'] += speed
+                if rate:
+                    util = (c.nxt_out[k] - c.prv_out[k]) * 8 / (c.delta_time[k] * 10 ** 6)
+                    r['actualPniOut'] += util
+        elif c.cdn[k] and up:
+            r['physicalCdnIn'] += speed
+            r['maxCdnIn'] += speed * serving_cap // 100
+            if rate:
+                util = (c.nxt_in[k] - c.prv_in[k]) * 8 / (c.delta_time[k] * 10 ** 6)
+                r['actualCdnIn'] += util
+            if c.acl_off[k]:
+                r['unblocked'].append(name)
+                r['unblocked_maxCdnIn'] += speed * serving_cap // 100
+            elif c.acl_on[k]:
+                r['blocked'].append(name)
+        r['util'].append(util)
+        r['util_prc'].append(util * 100 / speed if speed > 0 else 0.0)
+    return r
+
+
+def capacity(columns, serving_cap, ipv4_minPfx, ipv6_minPfx):
+    # Returns the per-interface utilisation (Mbps and percentage, in the order of columns.names), the capacity totals
+    # of the node in Mbps and the lists of unblocked and blocked CDN interfaces that are up.
+    if numpy is not None:
+        return _capacity_numpy(columns, serving_cap, ipv4_minPfx, ipv6_minPfx)
+    return _capacity_python(columns, serving_cap, ipv4_minPfx, ipv6_minPfx)
+
+
+Thresholds = collections.namedtuple('Thresholds', ['rising_threshold', 'falling_threshold', 'serving_cap',
+                                                   'ipv4_minPfx', 'ipv6_minPfx'])
+
+
+def decide(disc, prv, nxt, thresholds, totals=None):
+    # Side-effect free decision step of Router._process(). Returns the intended actions as a list of
+    # (decision, interfaces, reason) tuples, where decision is 'block', 'unblock' or None when a risk has been detected
+    # but no valid action is left. The capacity totals can be passed in if they have already been calculated.
+    if totals is None:
+        totals = capacity(Columns(disc, prv, nxt), thresholds.serving_cap, thresholds.ipv4_minPfx,
+                          thresholds.ipv6_minPfx)
+    usablePniOut, actualPniOut = totals['usablePniOut'], totals['actualPniOut']
+    unblocked, blocked = totals['unblocked'], totals['blocked']
+    if usablePniOut == 0:
+        return [('block' if unblocked != [] else None, unblocked, 'no_capacity')]
+    # We can't use actualCDNIn while calculating the rising_threshold because it won't include P2P traffic
+    # and / or the CDN overflow from the other site(s). It is worth revisiting later for DE though.
+    elif actualPniOut / usablePniOut * 100 >= thresholds.rising_threshold:
+        return [('block' if unblocked != [] else None, unblocked, 'rising_threshold')]
+    elif blocked != [] and actualPniOut / usablePniOut * 100 < thresholds.falling_threshold:
+        if totals['maxCdnIn'] + actualPniOut < usablePniOut:
+            return [('unblock', blocked, 'risk_mitigated')]
+        # Otherwise the blocked interfaces are re-enabled one at a time, busiest first, as long as the PNI egress
+        # would stay within the usable capacity with the interface serving at its cap.
+        util = dict(zip(sorted(nxt), totals['util']))
+        for interface in sorted(blocked, key=lambda interface: (-util[interface], interface)):
+            self_maxCdnIn = int(nxt[interface]['ifSpeed']) * thresholds.serving_cap / 100
+            if actualPniOut - totals['actualCdnIn'] + totals['unblocked_maxCdnIn'] + self_maxCdnIn \
+                    < usablePniOut:
+                if usablePniOut < totals['physicalPniOut']:
+                    return [('unblock', [interface], 'risk_partially_mitigated_interface')]
+                return [('unblock', [interface], 'risk_mitigated_interface')]
+    return []
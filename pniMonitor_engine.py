@@ -0,0 +1,206 @@
+#!/usr/bin/env python2.7
+
+# Polling engines used by pniMonitor.py. With engine=pool, node jobs are queued by a single dispatcher loop on the
+# MainThread and executed by a bounded set of long-lived worker threads, instead of one new thread per node in every
+# polling cycle. With engine=scheduler, every node has a long-lived worker of its own on an independent fixed-rate timer.
+
+import threading
+import Queue
+import logging
+import sys
+import time
+
+
+class Job(object):
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+        self.done = threading.Event()
+        self.started = None
+        self.finished = None
+
+    def isAlive(self):
+        return not self.done.is_set()
+
+
+class Engine(object):
+    def __init__(self, max_workers, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.queue = Queue.Queue()
+        self.completed = Queue.Queue()
+        self.workers = []
+        self.retiring = 0
+        self.lock = threading.Lock()
+        self.resize(max_workers)
+
+    def resize(self, max_workers):
+        with self.lock:
+            active = len(self.workers) - self.retiring
+            while active < max_workers:
+                w = threading.Thread(target=self._worker, name='worker-%d' % (len(self.workers) + 1))
+                w.daemon = True
+                self.workers.append(w)
+                w.start()
+                active += 1
+            while active > max_workers:
+                # Idle workers pick up the sentinel and exit; busy ones finish their current job first.
+                self.queue.put(None)
+                self.retiring += 1
+                active -= 1
+            self.max_workers = max_workers
+
+    def submit(self, name, target):
+        job = Job(name, target)
+        self.queue.put(job)
+        return job
+
+    def _worker(self):
+        me = threading.current_thread()
+        idle_name = me.name
+        while True:
+            job = self.queue.get()
+            if job is None:
+                with self.lock:
+                    self.retiring -= 1
+                    self.workers.remove(me)
+                return
+            # Log lines produced by the job carry the node's thread name, as they did with one thread per node.
+            me.name = job.name
+            job.started = time.time()
+            try:
+                job.target()
+            except SystemExit:
+                pass
+            except:
+                self.logger.error('Unexpected error in %s: %s:%s' % ((job.name,) + sys.exc_info()[:2]))
+            finally:
+                job.finished = time.time()
+                me.name = idle_name
+                job.done.set()
+                self.completed.put(job)
+
+    def wait(self, jobs, timeout=None):
+        # Returns the jobs that have not completed within the timeout.
+        deadline = None if timeout is None else time.time() + timeout
+        pending = set(job for job in jobs if job.isAlive())
+        while pending:
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                break
+            try:
+                job = self.completed.get(timeout=remaining if remaining is not None else 3600)
+            except Queue.Empty:
+                continue
+            pending.discard(job)
+        return [job for job in jobs if job.isAlive()]
+
+
+class NodeTimer(object):
+    def __init__(self, node, scheduled):
+        self.node = node
+        self.scheduled = scheduled
+        self.active = True
+        self.running = False
+        self.reported = False
+        self.started = None
+        self.lag = 0.0
+        self.duration = 0.0
+        self.runs = 0
+        self.skipped = 0
+        self.thread = None
+
+
+class Scheduler(object):
+    # Used when engine=scheduler is configured. Every node has its own long-lived worker thread running the node's job
+    # on a fixed-rate timer (one slot per period, offset from the other nodes), so that a slow or hung node delays only
+    # its own cycles. The lag of each run behind its slot and the slots skipped by overrunning nodes are recorded.
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.period = None
+        self.factory = None
+        self.timers = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+
+    def update(self, nodes, period, factory):
+        # factory(node) returns the (name, target) of the node's job. It is called when the node is due, so that
+        # every run picks up the configuration in effect at the time.
+        with self.lock:
+            self.period, self.factory = period, factory
+            now = time.time()
+            for node in self.timers.keys():
+                if node not in nodes:
+                    self.timers.pop(node).active = False
+            for n, node in enumerate(nodes):
+                if node not in self.timers:
+                    # New nodes are spread evenly across the period instead of all starting at once.
+                    timer = NodeTimer(node, now + float(period) * n / len(nodes))
+                    timer.thread = threading.Thread(target=self._run, args=(timer,), name='scheduler_%s' % node)
+                    timer.thread.daemon = True
+                    self.timers[node] = timer
+                    timer.thread.start()
+            self.wake.notify_all()
+
+    def _run(self, timer):
+        me = threading.current_thread()
+        idle_name = me.name
+        while True:
+            with self.lock:
+                while timer.active and time.time() < timer.scheduled:
+                    self.wake.wait(timer.scheduled - time.time())
+                if not timer.active:
+                    return
+                name, target = self.factory(timer.node)
+                period = self.period
+                timer.running, timer.reported, timer.started = True, False, time.time()
+                timer.lag = timer.started - timer.scheduled
+            me.name = name
+            try:
+                target()
+            except SystemExit:
+                pass
+            except:
+                self.logger.error('Unexpected error in %s: %s:%s' % ((name,) + sys.exc_info()[:2]))
+            finally:
+                me.name = idle_name
+            with self.lock:
+                finished = time.time()
+                timer.running, timer.duration = False, finished - timer.started
+                timer.runs += 1
+                scheduled = timer.scheduled + period
+                if finished > scheduled:
+                    skipped = int((finished - scheduled) // period) + 1
+                    timer.skipped += skipped
+                    scheduled += skipped * period
+                    self.logger.warning('%s took %.1f seconds to complete, longer than the polling period (%s seconds). '
+                                        '%d polling slot(s) skipped' % (name, timer.duration, period, skipped))
+                timer.scheduled = scheduled
+
+    def overdue(self):
+        # Nodes running past the end of their slot, reported once per run.
+        with self.lock:
+            now = time.time()
+            late = [timer for timer in self.timers.values() if timer.running and not timer.reported and
+                    now > timer.started - timer.lag + self.period]
+            for timer in late:
+                timer.reported = True
+            return [(timer.node, now - timer.started) for timer in late]
+
+    def stats(self):
+        # {node: (lag of the last run, duration of the last run, runs, slots skipped)}
+        with self.lock:
+            return dict((node, (timer.lag, timer.duration, timer.runs, timer.skipped))
+                        for node, timer in self.timers.items())
+
+    def stop(self, timeout=None):
+        # Stops the timers and waits for the running jobs; returns the nodes still running after the timeout.
+        with self.lock:
+            timers = self.timers.values()
+            self.timers = {}
+            for timer in timers:
+                timer.active = False
+            self.wake.notify_all()
+        deadline = None if timeout is None else time.time() + timeout
+        for timer in timers:
+            timer.thread.join(None if deadline is None else max(deadline - time.time(), 0))
+        return [timer.node for timer in timers if timer.thread.is_alive()]
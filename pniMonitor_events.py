@@ -0,0 +1,187 @@
+#!/usr/bin/env python2.7
+
+# SNMP trap and syslog listener for pniMonitor.py. SNMPv2c traps / informs (linkDown, linkUp,
+# cbgpPeer2BackwardTransition) and IOS-XR syslog messages (interface UPDOWN, BGP ADJCHANGE) received on the configured
+# local UDP ports are matched to the nodes and interfaces registered from the discovery data of every polling cycle.
+# A matching event schedules an out-of-band re-evaluation of that node only; events received while a re-evaluation of
+# the same node is pending or running are coalesced into a single follow-up run. Messages from unknown sources, or
+# about interfaces and BGP peers that are not monitored, are ignored.
+
+import socket
+import select
+import threading
+import re
+import logging
+import pniMonitor_snmp
+
+snmpTrapOID = pniMonitor_snmp.oid('.1.3.6.1.6.3.1.1.4.1.0')
+ifIndex = pniMonitor_snmp.oid('.1.3.6.1.2.1.2.2.1.1')
+cbgpPeer2Entry = pniMonitor_snmp.oid('.1.3.6.1.4.1.9.9.187.1.2.5.1')
+trap_names = {pniMonitor_snmp.oid('.1.3.6.1.6.3.1.1.5.3'): 'linkDown',
+              pniMonitor_snmp.oid('.1.3.6.1.6.3.1.1.5.4'): 'linkUp',
+              pniMonitor_snmp.oid('.1.3.6.1.4.1.9.9.187.0.6'): 'cbgpPeer2BackwardTransNotification',
+              pniMonitor_snmp.oid('.1.3.6.1.4.1.9.9.187.0.8'): 'cbgpPeer2BackwardTransition'}
+
+# e.g. %PKT_INFRA-LINK-3-UPDOWN : Interface Bundle-Ether1, changed state to Down
+#      %ROUTING-BGP-5-ADJCHANGE : neighbor 10.0.0.1 Down - BGP Notification sent: hold time expired (VRF: default)
+syslog_link_re = re.compile(r'%[\w-]*UPDOWN\s*:\s*(?:Line protocol on\s+)?Interface\s+([\w/.-]+),\s*'
+                            r'changed state to\s+(\w+)', re.I)
+syslog_bgp_re = re.compile(r'%[\w-]*BGP-\d-ADJCHANGE\s*:\s*neighbor\s+([\da-fA-F:.]+)\s+(Up|Down)', re.I)
+
+
+def _packed(address):
+    # Peer addresses are saved in the discovery data as dotted IPv4 or colon separated hex bytes (IPv6).
+    try:
+        if ':' not in address:
+            return socket.inet_pton(socket.AF_INET, address)
+        elif len(address.split(':')) == 16:
+            return ''.join(chr(int(n, 16)) for n in address.split(':'))
+        return socket.inet_pton(socket.AF_INET6, address)
+    except (socket.error, ValueError):
+        return None
+
+
+class Listener(object):
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.nodes = {}
+        self.index = {}
+        self.handlers = {}
+        self.pending = {}
+        self.workers = {}
+        self.sockets = {}
+        self.ports = {'trap': 0, 'syslog': 0}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def configure(self, trap_port, syslog_port):
+        for kind, port in (('trap', trap_port), ('syslog', syslog_port)):
+            if self.ports[kind] == port and (port == 0 or kind in self.sockets):
+                continue
+            sock = None
+            if port != 0:
+                try:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                    sock.bind(('', port))
+                except socket.error as err:
+                    self.logger.error('Unable to listen for %s messages on UDP port %s: %s' % (kind, port, err))
+                    if sock is not None:
+                        sock.close()
+                    sock = None
+                else:
+                    self.logger.info('Listening for %s messages on UDP port %s' % (kind, port))
+            with self.lock:
+                old = self.sockets.pop(kind, None)
+                if sock is not None:
+                    self.sockets[kind] = sock
+                self.ports[kind] = port
+            if old is not None:
+                old.close()
+        with self.lock:
+            if self.sockets and (self.thread is None or not self.thread.is_alive()):
+                self.thread = threading.Thread(target=self._listen, name='event-listener')
+                self.thread.daemon = True
+                self.thread.start()
+
+    def register(self, node, ipaddr, disc, handler):
+        # handler(events) re-evaluates the node; it is called from a per-node worker thread.
+        index = {'ifIndex': {}, 'names': {}, 'peers': {}, 'addresses': {}}
+        for interface in disc:
+            index['ifIndex'][disc[interface]['ifIndex']] = interface
+            index['names'][interface.lower()] = interface
+            for afi in ('ipv4', 'ipv6'):
+                for peeraddr, cbgpPeer2index in disc[interface].get('peer_' + afi, []):
+                    index['peers'][cbgpPeer2index] = (peeraddr, interface)
+                    index['addresses'][_packed(peeraddr)] = (peeraddr, interface)
+        with self.lock:
+            self.nodes[ipaddr] = node
+            self.index[node] = index
+            self.handlers[node] = handler
+
+    def _listen(self):
+        while True:
+            with self.lock:
+                sockets = self.sockets.items()
+            if sockets == []:
+                return
+            try:
+                ready = select.select([sock for kind, sock in sockets], [], [], 1)[0]
+            except (select.error, socket.error, ValueError):
+                continue
+            for kind, sock in sockets:
+                if sock not in ready:
+                    continue
+                try:
+                    data, source = sock.recvfrom(65535)
+                except socket.error:
+                    continue
+                with self.lock:
+                    node = self.nodes.get(source[0])
+                if node is None:
+                    self.logger.debug('Ignoring %s message from an unknown source: %s' % (kind, source[0]))
+                    continue
+                try:
+                    event = self._trap(node, data, sock, source) if kind == 'trap' else self._syslog(node, data)
+                except (pniMonitor_snmp.SnmpError, IndexError):
+                    self.logger.debug('Ignoring malformed %s message from %s' % (kind, node))
+                    continue
+                if event is not None:
+                    self._trigger(node, event)
+
+    def _trap(self, node, data, sock, source):
+        message = pniMonitor_snmp.decode(data)
+        if message['type'] not in (pniMonitor_snmp.TRAP, pniMonitor_snmp.INFORM):
+            return None
+        if message['type'] == pniMonitor_snmp.INFORM:
+            sock.sendto(pniMonitor_snmp.encode(pniMonitor_snmp.RESPONSE, message['request_id'], message['varbinds'],
+                                               message['community']), source)
+        varbinds = dict(message['varbinds'])
+        name = trap_names.get(varbinds.get(snmpTrapOID))
+        if name is None:
+            return None
+        index = self.index[node]
+        for o, value in message['varbinds']:
+            if name.startswith('link') and o[:len(ifIndex)] == ifIndex:
+                interface = index['ifIndex'].get(str(value))
+                if interface is not None:
+                    return '%s %s' % (name, interface)
+            elif name.startswith('cbgp') and o[:len(cbgpPeer2Entry)] == cbgpPeer2Entry:
+                peer = index['peers'].get('.'.join(str(n) for n in o[len(cbgpPeer2Entry) + 1:]))
+                if peer is not None:
+                    return '%s %s (%s)' % (name, peer[0], peer[1])
+        return None
+
+    def _syslog(self, node, data):
+        index = self.index[node]
+        match = syslog_link_re.search(data)
+        if match and match.group(1).lower() in index['names']:
+            return 'UPDOWN %s %s' % (index['names'][match.group(1).lower()], match.group(2))
+        match = syslog_bgp_re.search(data)
+        if match and _packed(match.group(1)) in index['addresses']:
+            peer = index['addresses'][_packed(match.group(1))]
+            return 'ADJCHANGE %s %s (%s)' % (match.group(1), match.group(2), peer[1])
+        return None
+
+    def _trigger(self, node, event):
+        with self.lock:
+            self.pending.setdefault(node, []).append(event)
+            if node not in self.workers:
+                self.workers[node] = threading.Thread(target=self._run, args=(node,), name='event_%s' % node)
+                self.workers[node].daemon = True
+                self.workers[node].start()
+
+    def _run(self, node):
+        while True:
+            with self.lock:
+                events = self.pending.pop(node, None)
+                if events is None:
+                    del self.workers[node]
+                    return
+                handler = self.handlers[node]
+            try:
+                handler(events)
+            except SystemExit:
+                pass
+            except Exception as err:
+                self.logger.error('Unexpected error during the out-of-band re-evaluation of %s: %s' % (node, err))
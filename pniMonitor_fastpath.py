@@ -0,0 +1,94 @@
+#!/usr/bin/env python2.7
+
+# Adaptive fast-path polling for pniMonitor.py. When the risk factor of a node comes within fast_path_margin of the
+# rising_threshold in a regular polling cycle, the node is armed and a watcher thread polls only its PNI interfaces
+# (ifOperStatus, ifHCOutOctets and the BGP peer states) every fast_path_frequency seconds until the node is disarmed,
+# either by the watcher itself (headroom restored, CDN interfaces blocked or an error) or by the next regular cycle.
+# The regular cycle and the watcher of a node never run at the same time, and every poll takes place at least
+# fast_path_frequency seconds after the sample it is compared against was stored, even when the regular cycle re-armed
+# the node while the watcher was waiting.
+
+import logging
+import sys
+import threading
+import time
+
+
+class FastPath(object):
+    def __init__(self, frequency=5, margin=5, logger=None):
+        self.frequency = frequency
+        self.margin = margin
+        self.armed = {}
+        self.watchers = {}
+        self.node_locks = {}
+        self.lock = threading.Lock()
+        self.logger = logger or logging.getLogger(__name__)
+
+    def configure(self, frequency, margin):
+        self.frequency = frequency
+        self.margin = margin
+        if margin == 0:
+            with self.lock:
+                self.armed.clear()
+
+    def reset(self):
+        # Disarms all nodes; returns the nodes that were armed. Their watchers stop at their next wake-up.
+        with self.lock:
+            armed = self.armed.keys()
+            self.armed.clear()
+            return armed
+
+    def node_lock(self, node):
+        with self.lock:
+            return self.node_locks.setdefault(node, threading.Lock())
+
+    def arm(self, node, poll, state):
+        # poll(state) runs a fast-path cycle and returns the state for the next one, or None to disarm the node.
+        # Returns True if the node was not armed already.
+        with self.lock:
+            new = node not in self.armed
+            self.armed[node] = (poll, state, time.time())
+            if node not in self.watchers:
+                self.watchers[node] = threading.Thread(target=self._watch, args=(node,), name='fastpath_%s' % node)
+                self.watchers[node].daemon = True
+                self.watchers[node].start()
+            return new
+
+    def disarm(self, node):
+        with self.lock:
+            return self.armed.pop(node, None) is not None
+
+    def _watch(self, node):
+        while True:
+            with self.lock:
+                entry = self.armed.get(node)
+                if entry is None:
+                    del self.watchers[node]
+                    return
+            # The wake-up is rescheduled from the time the state was stored, which moves whenever the node is re-armed.
+            wait = entry[2] + self.frequency - time.time()
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            with self.node_lock(node):
+                with self.lock:
+                    # The regular cycle may have re-armed or disarmed the node while the lock was awaited.
+                    if self.armed.get(node) is not entry:
+                        continue
+                poll, state = entry[:2]
+                try:
+                    state = poll(state)
+                except SystemExit:
+                    # The poll has halted the node and logged the reason already.
+                    state = None
+                except Exception:
+                    self.logger.error('Unexpected error during the fast-path polling of %s: %s:%s. The node is '
+                                      'disarmed until the next regular polling cycle' % ((node,) + sys.exc_info()[:2]),
+                                      exc_info=True)
+                    state = None
+                with self.lock:
+                    if self.armed.get(node) is entry:
+                        if state is None:
+                            del self.armed[node]
+                        else:
+                            self.armed[node] = (poll, state, time.time())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python2.7
+
+# Metrics of pniMonitor.py in the Prometheus text exposition format (version 0.0.4). Counters, gauges and histograms
+# are updated by the polling threads and rendered on demand, either by a local HTTP endpoint (metrics_port) or into a
+# file that is rewritten atomically after every polling cycle (metrics_file), e.g. for the textfile collector of the
+# Prometheus node_exporter.
+
+import threading
+import BaseHTTPServer
+import SocketServer
+import socket
+import logging
+import os
+
+# Upper bounds (in seconds) of the histogram buckets, from single SNMP round trips to whole polling cycles.
+buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+families = {
+    'pnimonitor_cycle_duration_seconds': ('histogram', 'Duration of the polling cycle of a node.'),
+    'pnimonitor_phase_duration_seconds': ('histogram', 'Duration of each phase of the polling cycle of a node '
+                                                       '(dns, discovery, probe, process, acl, audit).'),
+    'pnimonitor_last_cycle_timestamp_seconds': ('gauge', 'Completion time of the last polling cycle of a node.'),
+    'pnimonitor_deadline_exceeded_total': ('counter', 'Operations halted because the cycle deadline expired.'),
+    'pnimonitor_snmp_request_duration_seconds': ('histogram', 'Round-trip time of the SNMP requests (native '
+                                                              'backend) or the run time of the NetSNMP commands.'),
+    'pnimonitor_snmp_retries_total': ('counter', 'SNMP requests re-sent after a timeout (native backend).'),
+    'pnimonitor_snmp_timeouts_total': ('counter', 'SNMP operations that failed with a timeout.'),
+    'pnimonitor_ssh_connect_duration_seconds': ('histogram', 'Time taken to establish new SSH sessions.'),
+    'pnimonitor_ssh_command_duration_seconds': ('histogram', 'Latency of the SSH commands (or pipelined batches).'),
+    'pnimonitor_interface_utilisation_mbps': ('gauge', 'Egress (PNI) or ingress (CDN) utilisation of an interface.'),
+    'pnimonitor_interface_utilisation_percent': ('gauge', 'Utilisation of an interface relative to its speed.'),
+    'pnimonitor_capacity_mbps': ('gauge', 'Capacity totals of a node, as calculated by the _process() function.'),
+    'pnimonitor_acl_changes_total': ('counter', 'CDN interfaces blocked or unblocked.'),
+    'pnimonitor_acl_failures_total': ('counter', 'Block or unblock attempts that could not be verified.'),
+}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if pairs == []:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, _escape(v)) for k, v in pairs)
+
+
+def _value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Registry(object):
+    def __init__(self):
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def _series(self, name, labels):
+        return self.series.setdefault(name, {}), tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            series, key = self._series(name, labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            series, key = self._series(name, labels)
+            series[key] = value
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            series, key = self._series(name, labels)
+            if key not in series:
+                series[key] = [[0] * len(buckets), 0.0, 0]
+            histogram = series[key]
+            for n, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][n] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def remove(self, name, **labels):
+        # Drops the series of `name` that carry all the given labels, e.g. those of a decommissioned interface.
+        with self.lock:
+            series = self.series.get(name, {})
+            for key in [key for key in series if set(labels.items()) <= set(key)]:
+                del series[key]
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name in sorted(self.series):
+                kind, description = families.get(name, ('untyped', ''))
+                lines.append('# HELP %s %s' % (name, description))
+                lines.append('# TYPE %s %s' % (name, kind))
+                for key, value in sorted(self.series[name].items()):
+                    if kind == 'histogram':
+                        for bound, count in zip(buckets, value[0]):
+                            lines.append('%s_bucket%s %d' % (name, _labels(key, [('le', _value(bound))]), count))
+                        lines.append('%s_bucket%s %d' % (name, _labels(key, [('le', '+Inf')]), value[2]))
+                        lines.append('%s_sum%s %s' % (name, _labels(key), _value(value[1])))
+                        lines.append('%s_count%s %d' % (name, _labels(key), value[2]))
+                    else:
+                        lines.append('%s%s %s' % (name, _labels(key), _value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        # e.g. the scraper closing the connection early; nothing to report.
+        pass
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.registry.render()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Exporter(object):
+    def __init__(self, registry, logger=None):
+        self.registry = registry
+        self.logger = logger or logging.getLogger(__name__)
+        self.port = 0
+        self.path = ''
+        self.server = None
+
+    def configure(self, port, path):
+        self.path = path
+        if port == self.port and (port == 0 or self.server is not None):
+            return
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.port = port
+        if port != 0:
+            try:
+                self.server = _Server(('', port), _Handler)
+            except socket.error as err:
+                self.logger.error('Unable to serve metrics on TCP port %s: %s' % (port, err))
+                return
+            self.server.registry = self.registry
+            thread = threading.Thread(target=self.server.serve_forever, name='metrics-exporter')
+            thread.daemon = True
+            thread.start()
+            self.logger.info('Serving metrics on TCP port %s' % port)
+
+    def write(self):
+        if self.path == '':
+            return
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                f.write(self.registry.render())
+            os.rename(tmp, self.path)
+        except (IOError, OSError) as err:
+            self.logger.warning('Metrics file could not be written: %s' % err)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python2.7
+
+# Profiling mode of pniMonitor.py (--profile or profile=on). Every polling cycle of a node, and each of its phases
+# (dns, discovery, probe, process, acl, audit), is timed and a histogram of the timings is written to
+# pniMonitor_profile.log at the end of every polling cycle of the MainThread. If profile_slowest is set, the cycle of
+# each node is also run under cProfile (which profiles the calling thread only) and the statistics of a cycle are
+# written to the same log whenever it is among the N slowest cycles of the day, so that an overrun can be attributed to
+# the functions it was spent in (subprocess forks, SSH reads, strptime, logging, etc).
+
+import cProfile
+import pstats
+import StringIO
+import contextlib
+import threading
+import datetime
+import heapq
+import logging
+import time
+import pniMonitor_metrics
+
+phases = ('cycle', 'dns', 'discovery', 'probe', 'process', 'acl', 'audit')
+
+
+def _percentile(values, p):
+    return values[min(int(len(values) * p / 100.0), len(values) - 1)]
+
+
+def _histogram(values):
+    # Number of values per bucket (not cumulative); empty buckets are left out.
+    counts, lower = [], None
+    for bound in pniMonitor_metrics.buckets + (float('inf'),):
+        n = len([v for v in values if (lower is None or v > lower) and v <= bound])
+        if n:
+            counts.append('%s:%d' % ('<=%s' % bound if bound != float('inf') else '>%s' % lower, n))
+        lower = bound
+    return ' '.join(counts)
+
+
+class Profiler(object):
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.enabled = False
+        self.slowest = 0
+        self.timings = {}
+        self.ranking = []
+        self.day = None
+        self.lock = threading.Lock()
+
+    def configure(self, enabled, slowest):
+        with self.lock:
+            if slowest != self.slowest:
+                self.ranking = []
+            self.enabled, self.slowest = enabled, slowest
+            if not enabled:
+                self.timings = {}
+
+    def phase(self, node, phase, duration):
+        if self.enabled:
+            with self.lock:
+                self.timings.setdefault(phase, []).append((duration, node))
+
+    @contextlib.contextmanager
+    def cycle(self, node):
+        if not self.enabled:
+            yield
+            return
+        profile = cProfile.Profile() if self.slowest > 0 else None
+        started = time.time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            duration = time.time() - started
+            self.phase(node, 'cycle', duration)
+            if profile is not None and self._rank(duration):
+                self._dump(node, duration, profile)
+
+    def _rank(self, duration):
+        # Keeps the durations of the N slowest cycles of the day in a min-heap.
+        with self.lock:
+            if self.day != datetime.date.today():
+                self.day, self.ranking = datetime.date.today(), []
+            if len(self.ranking) < self.slowest:
+                heapq.heappush(self.ranking, duration)
+            elif self.ranking != [] and duration > self.ranking[0]:
+                heapq.heapreplace(self.ranking, duration)
+            else:
+                return False
+            return True
+
+    def _dump(self, node, duration, profile):
+        output = StringIO.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(30)
+        self.logger.info('Polling cycle of %s completed in %.3f seconds (among the %d slowest today). cProfile '
+                         'statistics:\n%s' % (node, duration, self.slowest, output.getvalue()))
+
+    def report(self):
+        with self.lock:
+            timings, self.timings = self.timings, {}
+        if timings == {}:
+            return
+        lines = ['Timings of the last polling cycle (seconds):']
+        for phase in [p for p in phases if p in timings] + sorted(p for p in timings if p not in phases):
+            values = sorted(timings[phase])
+            durations = [duration for duration, node in values]
+            lines.append('%-10s n=%-4d mean=%.3f p50=%.3f p90=%.3f p99=%.3f max=%.3f (%s) %s'
+                         % (phase, len(values), sum(durations) / len(durations), _percentile(durations, 50),
+                            _percentile(durations, 90), _percentile(durations, 99), values[-1][0], values[-1][1],
+                            _histogram(durations)))
+        self.logger.info('\n'.join(lines))
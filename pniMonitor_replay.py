@@ -0,0 +1,155 @@
+#!/usr/bin/env python2.7
+
+# Offline replay of the probe histories recorded by pniMonitor.py through its decision logic.
+#
+# Usage: pniMonitor_replay.py [-r <rising_threshold>] [-f <falling_threshold>] [-c <cdn_serving_cap>]
+#                             [-4 <ipv4_min_prefixes>] [-6 <ipv6_min_prefixes>] [-d <directory> ...] [-a] [<node> ...]
+#
+# The discovery (.dsc) and probe (.prb) files of the given nodes (all nodes with a probe file in the directories by
+# default) are read without being modified, and every pair of consecutive samples is passed to
+# pniMonitor_decision.decide() as fast as the CPU allows. The blocks and unblocks are applied to an in-memory copy of
+# the discovery data only. The program prints a timeline of the actions followed by a summary per node: the time spent
+# at or above the rising threshold, the number of ACL configuration pushes and the CDN interface hours spent blocked.
+#
+# A probe file holds the last data_retention polling cycles only. Longer periods can be replayed from copies of the
+# probe files archived at least once every data_retention cycles, by giving -d once per archive directory: the
+# histories of a node are merged in timestamp order, samples present in more than one copy are replayed once, and the
+# discovery file is taken from the last directory that has one.
+#
+# All CDN interfaces start unblocked, unless -a is given to start from the ACL status saved in the discovery file.
+
+import sys
+import os
+import getopt
+import time
+import datetime
+import pniMonitor_store
+import pniMonitor_decision
+
+dF = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def usage(args):
+    print "Usage: %s [-r <rising_threshold>] [-f <falling_threshold>] [-c <cdn_serving_cap>] " \
+          "[-4 <ipv4_min_prefixes>] [-6 <ipv6_min_prefixes>] [-d <directory> ...] [-a] [<node> ...]" % args[0]
+
+
+def epoch(ts):
+    dt = datetime.datetime.strptime(ts, dF)
+    return time.mktime(dt.timetuple()) + dt.microsecond / 1e6
+
+
+def replay(node, directories, thresholds, saved_acl=False):
+    paths = [os.path.join(directory, '.do_not_modify_'.upper() + node) for directory in directories]
+    dsc = [path + '.dsc' for path in paths if os.path.exists(path + '.dsc')]
+    prb = [path + '.prb' for path in paths if os.path.exists(path + '.prb')]
+    if dsc == [] or prb == []:
+        raise IOError('No %s file found for %s' % ('discovery' if dsc == [] else 'probe', node))
+    disc = dict((name, dict(attributes)) for name, attributes in
+                pniMonitor_store.load_discovery(dsc[-1])[0].items())
+    if not saved_acl:
+        for attributes in disc.values():
+            if attributes['type'] == 'cdn':
+                attributes['aclStatus'] = 'off'
+    # Keyed by the timestamp of the sample, so that the overlapping part of two archived copies is replayed once.
+    history = {}
+    for path in prb:
+        for sample in pniMonitor_store.load_history(path):
+            sample = dict((name, sample[name]) for name in sample if name in disc)
+            if sample != {}:
+                history[max(sample[name]['ts'] for name in sample)] = sample
+    samples = [history[ts] for ts in sorted(history)]
+    timeline = []
+    stats = {'samples': len(samples), 'seconds': 0.0, 'above': 0.0, 'blocks': 0, 'unblocks': 0, 'blocked': 0.0}
+    for prv, nxt in zip(samples, samples[1:]):
+        ts = max(nxt[name]['ts'] for name in nxt)
+        delta_time = epoch(ts) - epoch(max(prv[name]['ts'] for name in prv))
+        stats['seconds'] += delta_time
+        stats['blocked'] += delta_time * len([name for name in disc if disc[name].get('aclStatus') == 'on'])
+        totals = pniMonitor_decision.capacity(pniMonitor_decision.Columns(disc, prv, nxt), thresholds.serving_cap,
+                                              thresholds.ipv4_minPfx, thresholds.ipv6_minPfx)
+        if totals['usablePniOut'] == 0:
+            risk = None
+        else:
+            risk = totals['actualPniOut'] / totals['usablePniOut'] * 100
+        if risk is None or risk >= thresholds.rising_threshold:
+            stats['above'] += delta_time
+        for decision, interfaces, reason in pniMonitor_decision.decide(disc, prv, nxt, thresholds, totals):
+            if decision is None:
+                continue
+            for interface in interfaces:
+                disc[interface]['aclStatus'] = 'on' if decision == 'block' else 'off'
+            stats[decision + 's'] += 1
+            timeline.append((ts, node, decision, reason, risk, interfaces))
+    return timeline, stats
+
+
+def main(args):
+    thresholds = {'rising_threshold': 95, 'falling_threshold': 90, 'serving_cap': 90, 'ipv4_minPfx': 0,
+                  'ipv6_minPfx': 50}
+    directories, saved_acl = [], False
+    try:
+        options, nodes = getopt.getopt(args[1:], "hr:f:c:4:6:d:a", ["help"])
+        for opt, arg in options:
+            if opt in ('-h', '--help'):
+                usage(args)
+                sys.exit(0)
+            elif opt == '-r':
+                thresholds['rising_threshold'] = int(arg)
+            elif opt == '-f':
+                thresholds['falling_threshold'] = int(arg)
+            elif opt == '-c':
+                thresholds['serving_cap'] = int(arg)
+            elif opt == '-4':
+                thresholds['ipv4_minPfx'] = int(arg)
+            elif opt == '-6':
+                thresholds['ipv6_minPfx'] = int(arg)
+            elif opt == '-d':
+                directories.append(arg)
+            elif opt == '-a':
+                saved_acl = True
+    except (getopt.GetoptError, ValueError) as err:
+        print err
+        usage(args)
+        sys.exit(2)
+    if thresholds['falling_threshold'] > thresholds['rising_threshold']:
+        print "falling_threshold (%d) must not be greater than rising_threshold (%d)" \
+              % (thresholds['falling_threshold'], thresholds['rising_threshold'])
+        sys.exit(2)
+    thresholds = pniMonitor_decision.Thresholds(**thresholds)
+    directories = directories or ['.']
+    prefix = '.do_not_modify_'.upper()
+    if nodes == []:
+        nodes = sorted(set(f[len(prefix):-len('.prb')] for directory in directories for f in os.listdir(directory)
+                           if f.startswith(prefix) and f.endswith('.prb')))
+    start = time.time()
+    timeline, summary = [], []
+    for node in nodes:
+        try:
+            events, stats = replay(node, directories, thresholds, saved_acl)
+        except (IOError, OSError, pniMonitor_store.StoreError) as err:
+            print "%s: skipped (%s)" % (node, err)
+            continue
+        timeline += events
+        summary.append((node, stats))
+    elapsed = time.time() - start
+    for ts, node, decision, reason, risk, interfaces in sorted(timeline):
+        print "%s %s %-7s %-35s risk=%-6s %s" % (ts[:19], node, decision, reason,
+                                                 'n/a' if risk is None else '%.1f' % risk, ', '.join(interfaces))
+    print
+    print "%-20s %8s %10s %14s %7s %9s %13s" % ('node', 'samples', 'hours', 'above_rising', 'blocks', 'unblocks',
+                                                'blocked_hours')
+    seconds = 0.0
+    for node, stats in summary:
+        seconds += stats['seconds']
+        print "%-20s %8d %10.1f %13.1f%% %7d %9d %13.1f" \
+              % (node, stats['samples'], stats['seconds'] / 3600,
+                 stats['above'] * 100 / stats['seconds'] if stats['seconds'] else 0.0, stats['blocks'],
+                 stats['unblocks'], stats['blocked'] / 3600)
+    print
+    print "Config pushes: %d, replayed %.1f hours of data in %.2f seconds" \
+          % (sum(stats['blocks'] + stats['unblocks'] for node, stats in summary), seconds / 3600, elapsed)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,549 @@
+#!/usr/bin/env python2.7
+
+# Native SNMPv2c client (and a minimal agent stand-in) used by pniMonitor.py in place of the NetSNMP
+# snmpget / snmpwalk subprocesses when snmp_backend=native is configured.
+
+import socket
+import select
+import threading
+import random
+import bisect
+import time
+
+VERSION_2C = 1
+
+GET, GETNEXT, RESPONSE, SET, GETBULK, INFORM, TRAP, REPORT = 0xa0, 0xa1, 0xa2, 0xa3, 0xa5, 0xa6, 0xa7, 0xa8
+
+error_codes = {0: 'noError', 1: 'tooBig', 2: 'noSuchName', 3: 'badValue', 4: 'readOnly', 5: 'genErr',
+               6: 'noAccess', 7: 'wrongType', 8: 'wrongLength', 9: 'wrongEncoding', 10: 'wrongValue',
+               11: 'noCreation', 12: 'inconsistentValue', 13: 'resourceUnavailable', 14: 'commitFailed',
+               15: 'undoFailed', 16: 'authorizationError', 17: 'notWritable', 18: 'inconsistentName'}
+
+
+class SnmpError(Exception):
+    pass
+
+
+class SnmpTimeout(SnmpError):
+    pass
+
+
+class SnmpDeadline(SnmpTimeout):
+    pass
+
+
+class SnmpResponseError(SnmpError):
+    def __init__(self, status, index):
+        SnmpError.__init__(self, '%s (index %s)' % (error_codes.get(status, status), index))
+        self.status = status
+        self.index = index
+
+
+class ObjectIdentifier(tuple):
+    def __str__(self):
+        return '.' + '.'.join(str(n) for n in self)
+
+
+class OctetString(str):
+    pass
+
+
+class IpAddress(str):
+    def __str__(self):
+        return '.'.join(str(ord(c)) for c in self)
+
+
+class Counter32(long):
+    pass
+
+
+class Gauge32(long):
+    pass
+
+
+class TimeTicks(long):
+    pass
+
+
+class Counter64(long):
+    pass
+
+
+class Opaque(str):
+    pass
+
+
+class _Exception(object):
+    def __init__(self, tag, name, text):
+        self.tag = tag
+        self.name = name
+        self.text = text
+
+    def __repr__(self):
+        return self.name
+
+    def __str__(self):
+        return self.text
+
+noSuchObject = _Exception(0x80, 'noSuchObject', 'No Such Object available on this agent at this OID')
+noSuchInstance = _Exception(0x81, 'noSuchInstance', 'No Such Instance currently exists at this OID')
+endOfMibView = _Exception(0x82, 'endOfMibView', 'No more variables left in this MIB View (It is past the end of '
+                                                 'the MIB tree)')
+exceptions = dict((e.tag, e) for e in (noSuchObject, noSuchInstance, endOfMibView))
+
+_unsigned = {0x41: Counter32, 0x42: Gauge32, 0x43: TimeTicks, 0x46: Counter64}
+
+
+def oid(value):
+    if isinstance(value, ObjectIdentifier):
+        return value
+    elif isinstance(value, basestring):
+        return ObjectIdentifier(int(n) for n in value.strip('.').split('.') if n != '')
+    return ObjectIdentifier(value)
+
+
+def _len(n):
+    if n < 0x80:
+        return chr(n)
+    s = ''
+    while n:
+        s = chr(n & 0xff) + s
+        n >>= 8
+    return chr(0x80 | len(s)) + s
+
+
+def _tlv(tag, payload):
+    return chr(tag) + _len(len(payload)) + payload
+
+
+def _int(n, tag=0x02):
+    s = ''
+    while True:
+        s = chr(n & 0xff) + s
+        n >>= 8
+        if (n == 0 and not ord(s[0]) & 0x80) or (n == -1 and ord(s[0]) & 0x80):
+            break
+    return _tlv(tag, s)
+
+
+def _uint(n, tag):
+    s = ''
+    while True:
+        s = chr(n & 0xff) + s
+        n >>= 8
+        if n == 0:
+            break
+    if ord(s[0]) & 0x80:
+        s = '\x00' + s
+    return _tlv(tag, s)
+
+
+def _subid(n):
+    s = chr(n & 0x7f)
+    n >>= 7
+    while n:
+        s = chr(0x80 | (n & 0x7f)) + s
+        n >>= 7
+    return s
+
+
+def _oid(o):
+    o = oid(o)
+    if len(o) < 2:
+        o = ObjectIdentifier(tuple(o) + (0,) * (2 - len(o)))
+    return _tlv(0x06, chr(o[0] * 40 + o[1]) + ''.join(_subid(n) for n in o[2:]))
+
+
+def encode_value(value):
+    if value is None:
+        return '\x05\x00'
+    elif isinstance(value, _Exception):
+        return chr(value.tag) + '\x00'
+    elif isinstance(value, ObjectIdentifier):
+        return _oid(value)
+    elif isinstance(value, IpAddress):
+        return _tlv(0x40, value)
+    elif isinstance(value, Opaque):
+        return _tlv(0x44, value)
+    elif isinstance(value, basestring):
+        return _tlv(0x04, value)
+    elif isinstance(value, (Counter32, Gauge32, TimeTicks, Counter64)):
+        tag = [t for t in _unsigned if isinstance(value, _unsigned[t])][0]
+        return _uint(value, tag)
+    elif isinstance(value, (int, long)):
+        return _int(value)
+    raise SnmpError('Unsupported value type: %r' % type(value))
+
+
+def encode(pdu_type, request_id, varbinds, community, error_status=0, error_index=0):
+    vbl = ''.join(_tlv(0x30, _oid(o) + encode_value(v)) for o, v in varbinds)
+    pdu = _tlv(pdu_type, _int(request_id) + _int(error_status) + _int(error_index) + _tlv(0x30, vbl))
+    return _tlv(0x30, _int(VERSION_2C) + _tlv(0x04, community) + pdu)
+
+
+def _read(data, pos):
+    tag = ord(data[pos])
+    length = ord(data[pos + 1])
+    pos += 2
+    if length & 0x80:
+        n = length & 0x7f
+        length = 0
+        for c in data[pos:pos + n]:
+            length = (length << 8) | ord(c)
+        pos += n
+    if pos + length > len(data):
+        raise SnmpError('Truncated message')
+    return tag, data[pos:pos + length], pos + length
+
+
+def _decode_int(payload):
+    n = 0
+    for c in payload:
+        n = (n << 8) | ord(c)
+    if payload and ord(payload[0]) & 0x80:
+        n -= 1 << (8 * len(payload))
+    return n
+
+
+def _decode_oid(payload):
+    first = ord(payload[0])
+    subids = [first // 40, first % 40] if first < 80 else [2, first - 80]
+    n = 0
+    for c in payload[1:]:
+        n = (n << 7) | (ord(c) & 0x7f)
+        if not ord(c) & 0x80:
+            subids.append(n)
+            n = 0
+    return ObjectIdentifier(subids)
+
+
+def decode_value(tag, payload):
+    if tag == 0x02:
+        return _decode_int(payload)
+    elif tag == 0x04:
+        return OctetString(payload)
+    elif tag == 0x05:
+        return None
+    elif tag == 0x06:
+        return _decode_oid(payload)
+    elif tag == 0x40:
+        return IpAddress(payload)
+    elif tag == 0x44:
+        return Opaque(payload)
+    elif tag in _unsigned:
+        n = 0
+        for c in payload:
+            n = (n << 8) | ord(c)
+        return _unsigned[tag](n)
+    elif tag in exceptions:
+        return exceptions[tag]
+    raise SnmpError('Unsupported value tag: 0x%02x' % tag)
+
+
+def decode(data):
+    tag, msg, _ = _read(data, 0)
+    if tag != 0x30:
+        raise SnmpError('Malformed message')
+    _, version, pos = _read(msg, 0)
+    _, community, pos = _read(msg, pos)
+    pdu_type, pdu, _ = _read(msg, pos)
+    _, request_id, pos = _read(pdu, 0)
+    _, error_status, pos = _read(pdu, pos)
+    _, error_index, pos = _read(pdu, pos)
+    _, vbl, _ = _read(pdu, pos)
+    varbinds = []
+    pos = 0
+    while pos < len(vbl):
+        _, vb, pos = _read(vbl, pos)
+        _, o, vpos = _read(vb, 0)
+        vtag, v, _ = _read(vb, vpos)
+        varbinds.append((_decode_oid(o), decode_value(vtag, v)))
+    return {'version': _decode_int(version), 'community': community, 'type': pdu_type,
+            'request_id': _decode_int(request_id), 'error_status': _decode_int(error_status),
+            'error_index': _decode_int(error_index), 'varbinds': varbinds}
+
+
+def pack(oids, max_size, community='', max_varbinds=None):
+    # Splits a list of OIDs into (offset, chunk) GET requests whose responses are expected to fit in max_size bytes,
+    # budgeting each varbind for the largest value a probed object can return (Counter64).
+    budget = max_size - 32 - len(community)
+    start, chunk, size = 0, [], 0
+    for n, o in enumerate(oids):
+        vb = len(_oid(o)) + 15
+        if chunk and (size + vb > budget or len(chunk) == max_varbinds):
+            yield start, chunk
+            start, chunk, size = n, [], 0
+        chunk.append(o)
+        size += vb
+    if chunk:
+        yield start, chunk
+
+
+class Session(object):
+    def __init__(self, host, community, timeout=3, retries=2, port=161, bufsize=65535):
+        self.host = host
+        self.community = community
+        self.timeout = timeout
+        self.retries = retries
+        self.port = port
+        self.bufsize = bufsize
+        self.sock = None
+        self.request_id = random.randint(1, 2 ** 30)
+        self.lock = threading.Lock()
+
+    def _socket(self):
+        if self.sock is None:
+            family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+            self.sock = socket.socket(family, socket.SOCK_DGRAM)
+            self.sock.connect((self.host, self.port))
+        return self.sock
+
+    def close(self):
+        with self.lock:
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+
+    def _next_id(self):
+        self.request_id = (self.request_id % (2 ** 31 - 1)) + 1
+        return self.request_id
+
+    def _recv(self, sock):
+        try:
+            response = decode(sock.recv(self.bufsize))
+        except socket.error:
+            # ICMP port unreachable surfaces on connected UDP sockets; treat it as a lost packet.
+            return None
+        except (SnmpError, IndexError):
+            return None
+        if response['type'] != RESPONSE:
+            return None
+        return response
+
+    # The timeout and retries given to a request override the session defaults for that request only, and the deadline
+    # is the absolute time (epoch) after which no further requests are sent or waited for, regardless of retries. The
+    # session is shared by all the threads polling the same host, so none of these are kept on it.
+    #
+    # get, getnext, getbulk, get_many and walk return a (varbinds, latencies) tuple, where latencies holds the
+    # (round-trip time, retries) of every request sent; the round-trip time of a request that was never answered is
+    # None. On an SnmpError, the latencies collected until then are attached to the exception.
+    def _measured(self, method, *args, **kwargs):
+        latencies = kwargs['latencies'] = []
+        try:
+            return method(*args, **kwargs), latencies
+        except SnmpError as snmp_err:
+            snmp_err.latencies = latencies
+            raise
+
+    def request(self, pdu_type, varbinds, error_status=0, error_index=0, timeout=None, retries=None, deadline=None,
+                latencies=None):
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        latencies = [] if latencies is None else latencies
+        with self.lock:
+            request_id = self._next_id()
+            message = encode(pdu_type, request_id, varbinds, self.community, error_status, error_index)
+            sock = self._socket()
+            for attempt in range(retries + 1):
+                self._check_deadline(deadline)
+                try:
+                    sock.send(message)
+                except socket.error as sc_err:
+                    raise SnmpError('%s' % sc_err)
+                sent = time.time()
+                expiry = sent + timeout
+                if deadline is not None:
+                    expiry = min(expiry, deadline)
+                while True:
+                    remaining = expiry - time.time()
+                    if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+                        break
+                    response = self._recv(sock)
+                    if response is not None and response['request_id'] == request_id:
+                        latencies.append((time.time() - sent, attempt))
+                        if response['error_status'] != 0:
+                            raise SnmpResponseError(response['error_status'], response['error_index'])
+                        return response['varbinds']
+            latencies.append((None, retries))
+            self._check_deadline(deadline)
+            raise SnmpTimeout('Timeout: No Response from %s' % self.host)
+
+    def _check_deadline(self, deadline):
+        if deadline is not None and time.time() >= deadline:
+            raise SnmpDeadline('Deadline exceeded while waiting for %s' % self.host)
+
+    def get(self, oids, timeout=None, retries=None, deadline=None):
+        return self._measured(self.request, GET, [(oid(o), None) for o in oids], timeout=timeout, retries=retries,
+                              deadline=deadline)
+
+    def get_many(self, oids, max_size=1472, window=16, timeout=None, retries=None, deadline=None):
+        return self._measured(self._get_many, oids, max_size, window, timeout, retries, deadline)
+
+    def _get_many(self, oids, max_size, window, timeout, retries, deadline, latencies):
+        # Packs the OIDs into as few GET requests as fit in max_size and pipelines up to `window` of them on the
+        # socket at once, so the whole set costs roughly one round trip. Requests rejected with tooBig are split in
+        # half and re-queued. Varbinds are returned in the order of the requested OIDs.
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        oids = [oid(o) for o in oids]
+        queue = list(pack(oids, max_size, self.community))
+        done, inflight = {}, {}
+        with self.lock:
+            sock = self._socket()
+            while queue or inflight:
+                while queue and len(inflight) < window:
+                    start, chunk = queue.pop(0)
+                    request_id = self._next_id()
+                    message = encode(GET, request_id, [(o, None) for o in chunk], self.community)
+                    inflight[request_id] = [start, chunk, message, 0, 0]
+                    self._send(sock, inflight[request_id], timeout)
+                self._check_deadline(deadline)
+                now = time.time()
+                for request in inflight.values():
+                    if request[4] <= now:
+                        if request[3] > retries:
+                            latencies.append((None, retries))
+                            raise SnmpTimeout('Timeout: No Response from %s' % self.host)
+                        self._send(sock, request, timeout)
+                remaining = min([request[4] for request in inflight.values()] +
+                                ([deadline] if deadline is not None else [])) - time.time()
+                if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+                    continue
+                response = self._recv(sock)
+                if response is None or response['request_id'] not in inflight:
+                    continue
+                request = inflight.pop(response['request_id'])
+                latencies.append((time.time() - request[4] + timeout, request[3] - 1))
+                start, chunk = request[:2]
+                if response['error_status'] == 1 and len(chunk) > 1:
+                    half = len(chunk) // 2
+                    queue[0:0] = [(start, chunk[:half]), (start + half, chunk[half:])]
+                elif response['error_status'] != 0:
+                    raise SnmpResponseError(response['error_status'], response['error_index'])
+                else:
+                    done[start] = response['varbinds']
+        return [vb for start in sorted(done) for vb in done[start]]
+
+    def _send(self, sock, request, timeout):
+        try:
+            sock.send(request[2])
+        except socket.error as sc_err:
+            raise SnmpError('%s' % sc_err)
+        request[3] += 1
+        request[4] = time.time() + timeout
+
+    def getnext(self, oids, timeout=None, retries=None, deadline=None):
+        return self._measured(self.request, GETNEXT, [(oid(o), None) for o in oids], timeout=timeout, retries=retries,
+                              deadline=deadline)
+
+    def getbulk(self, oids, non_repeaters=0, max_repetitions=25, timeout=None, retries=None, deadline=None):
+        return self._measured(self.request, GETBULK, [(oid(o), None) for o in oids], non_repeaters, max_repetitions,
+                              timeout=timeout, retries=retries, deadline=deadline)
+
+    def walk(self, root, max_repetitions=25, timeout=None, retries=None, deadline=None):
+        return self._measured(self._walk, root, max_repetitions, timeout, retries, deadline)
+
+    def _walk(self, root, max_repetitions, timeout, retries, deadline, latencies):
+        root = oid(root)
+        result = []
+        current = root
+        while True:
+            varbinds = self.request(GETBULK, [(current, None)], 0, max_repetitions, timeout, retries, deadline,
+                                    latencies)
+            if varbinds == []:
+                return result
+            for o, v in varbinds:
+                if o[:len(root)] != root or v is endOfMibView:
+                    return result
+                if o <= current:
+                    raise SnmpError('OID not increasing: %s' % o)
+                result.append((o, v))
+                current = o
+
+
+class Agent(threading.Thread):
+    # A minimal SNMPv2c agent stand-in serving a static or callable view, for local testing.
+    def __init__(self, view, community='public', host='127.0.0.1', port=0, max_size=1472):
+        threading.Thread.__init__(self, name='agent-%s' % port)
+        self.daemon = True
+        self.view = view
+        self.community = community
+        self.max_size = max_size
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.address = self.sock.getsockname()
+        self.requests = 0
+        self.drop = 0
+        self.running = True
+
+    def stop(self):
+        self.running = False
+        self.join()
+        self.sock.close()
+
+    def _view(self):
+        view = self.view() if callable(self.view) else self.view
+        return dict((oid(o), v) for o, v in view.items())
+
+    def _next(self, view, keys, o):
+        i = bisect.bisect_right(keys, o)
+        if i < len(keys):
+            return keys[i], view[keys[i]]
+        return o, endOfMibView
+
+    def respond(self, request):
+        view = self._view()
+        keys = sorted(view)
+        varbinds = []
+        if request['type'] == GET:
+            for o, _ in request['varbinds']:
+                if o in view:
+                    varbinds.append((o, view[o]))
+                elif any(k[:len(o) - 1] == o[:-1] for k in keys):
+                    varbinds.append((o, noSuchInstance))
+                else:
+                    varbinds.append((o, noSuchObject))
+        elif request['type'] == GETNEXT:
+            varbinds = [self._next(view, keys, o) for o, _ in request['varbinds']]
+        elif request['type'] == GETBULK:
+            non_repeaters = max(request['error_status'], 0)
+            max_repetitions = max(request['error_index'], 0)
+            varbinds = [self._next(view, keys, o) for o, _ in request['varbinds'][:non_repeaters]]
+            current = [o for o, _ in request['varbinds'][non_repeaters:]]
+            for r in range(max_repetitions):
+                row = [self._next(view, keys, o) for o in current]
+                varbinds += row
+                current = [o for o, _ in row]
+                if all(v is endOfMibView for _, v in row):
+                    break
+        else:
+            return None
+        response = encode(RESPONSE, request['request_id'], varbinds, self.community)
+        if len(response) > self.max_size:
+            if request['type'] == GETBULK:
+                while varbinds and len(response) > self.max_size:
+                    varbinds = varbinds[:-1]
+                    response = encode(RESPONSE, request['request_id'], varbinds, self.community)
+            else:
+                response = encode(RESPONSE, request['request_id'], request['varbinds'], self.community,
+                                  error_status=1, error_index=0)
+        return response
+
+    def run(self):
+        while self.running:
+            if not select.select([self.sock], [], [], 0.1)[0]:
+                continue
+            data, peer = self.sock.recvfrom(65535)
+            try:
+                request = decode(data)
+            except (SnmpError, IndexError):
+                continue
+            if request['community'] != self.community:
+                continue
+            self.requests += 1
+            if self.drop > 0:
+                self.drop -= 1
+                continue
+            response = self.respond(request)
+            if response is not None:
+                self.sock.sendto(response, peer)
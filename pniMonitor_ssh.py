@@ -0,0 +1,181 @@
+#!/usr/bin/env python2.7
+
+# Persistent per-node SSH sessions used by pniMonitor.py. Each node keeps one authenticated transport and one
+# interactive shell across polling cycles; sessions are kept alive with SSH keepalives, evicted when idle for longer
+# than ssh_idle_timeout and transparently re-established when the router drops them.
+
+import threading
+import time
+import select
+import re
+import paramiko
+
+
+class SshTimeout(Exception):
+    pass
+
+
+class SshClosed(Exception):
+    def __init__(self, message, outputs):
+        Exception.__init__(self, message)
+        self.outputs = outputs
+
+
+class Connection(object):
+    def __init__(self, node, ipaddr, username, password, timeout=5, keepalive=30, bufsize=65536, port=22):
+        self.node = node
+        self.ipaddr = ipaddr
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.bufsize = bufsize
+        # IOS-XR prompts, e.g. RP/0/RSP0/CPU0:er12.enslo# or RP/0/RSP0/CPU0:er12.enslo(config-if)#
+        self.prompt = re.compile(r'[\w/]+/CPU0:%s(?:\([\w-]+\))?#' % re.escape(node))
+        self.latencies = []
+        self.client = None
+        self.shell = None
+        self.lock = threading.Lock()
+        self.last_used = time.time()
+        self.reused = False
+
+    def connected(self):
+        transport = self.client.get_transport() if self.client is not None else None
+        return transport is not None and transport.is_active()
+
+    def connect(self):
+        self.close()
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            client.connect(self.ipaddr, port=self.port, username=self.username, password=self.password,
+                           timeout=self.timeout, banner_timeout=self.timeout, auth_timeout=self.timeout,
+                           look_for_keys=False, allow_agent=False)
+        except:
+            client.close()
+            raise
+        client.get_transport().set_keepalive(self.keepalive)
+        self.client = client
+
+    def invoke_shell(self):
+        if self.shell is not None and not self.shell.closed and self.shell.get_transport().is_active():
+            return self.shell
+        self.shell = self.client.invoke_shell()
+        # Drain the banner and the first prompt, so that the output of the first command is not mixed with them.
+        self._read(1, time.time() + self.timeout)
+        self.run(['term len 0'], self.timeout)
+        return self.shell
+
+    def _read(self, prompts, deadline):
+        # Waits on the channel until the given number of prompts have been received and returns the output split
+        # after each prompt.
+        output, outputs, scan = '', [], 0
+        while len(outputs) < prompts:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not select.select([self.shell], [], [], remaining)[0]:
+                raise SshTimeout('No prompt received within the deadline')
+            data = self.shell.recv(self.bufsize)
+            if data == '':
+                raise SshClosed('SSH connection closed prematurely', outputs + [output[scan:]])
+            output += data
+            for match in self.prompt.finditer(output, max(scan, len(output) - len(data) - 128)):
+                if match.start() >= scan:
+                    outputs.append(output[scan:match.end()])
+                    scan = match.end()
+        return outputs
+
+    def run(self, commands, timeout=30, pipeline=False):
+        # Sends the commands one by one, or all at once if pipeline is set, and records the latency of each.
+        outputs = []
+        for batch in [commands] if pipeline else [[cmd] for cmd in commands]:
+            start = time.time()
+            self.shell.sendall(''.join(cmd + '\n' for cmd in batch))
+            try:
+                outputs += self._read(len(batch), start + timeout)
+            except SshClosed as closed:
+                closed.outputs = outputs + closed.outputs
+                raise
+            self.latencies.append((' / '.join(batch), time.time() - start))
+        return outputs
+
+    def close(self):
+        if self.shell is not None:
+            try:
+                self.shell.send('exit\n')
+            except:
+                pass
+            self.shell.close()
+            self.shell = None
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+
+class SessionPool(object):
+    def __init__(self, keepalive=30, idle_timeout=900):
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self.connections = {}
+        self.lock = threading.Lock()
+        self.reaper = None
+
+    def configure(self, keepalive, idle_timeout):
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+
+    def acquire(self, node, ipaddr, username, password, timeout=5):
+        with self.lock:
+            if node not in self.connections:
+                self.connections[node] = Connection(node, ipaddr, username, password, timeout, self.keepalive)
+            conn = self.connections[node]
+            if self.reaper is None or not self.reaper.is_alive():
+                self.reaper = threading.Thread(target=self._reap, name='ssh-reaper')
+                self.reaper.daemon = True
+                self.reaper.start()
+        conn.lock.acquire()
+        try:
+            if (conn.ipaddr, conn.password) != (ipaddr, password):
+                conn.ipaddr, conn.password = ipaddr, password
+                conn.close()
+            conn.keepalive, conn.timeout = self.keepalive, timeout
+            conn.latencies = []
+            conn.reused = conn.connected()
+            if conn.reused:
+                try:
+                    conn.client.get_transport().send_ignore()
+                except (EOFError, paramiko.SSHException, IOError):
+                    conn.reused = False
+            if not conn.reused:
+                conn.connect()
+        except:
+            conn.lock.release()
+            raise
+        conn.last_used = time.time()
+        return conn
+
+    def release(self, conn, discard=False):
+        conn.last_used = time.time()
+        if discard or self.idle_timeout == 0:
+            conn.close()
+        conn.lock.release()
+
+    def evict(self, idle_timeout=None):
+        idle_timeout = self.idle_timeout if idle_timeout is None else idle_timeout
+        with self.lock:
+            connections = self.connections.values()
+        for conn in connections:
+            if time.time() - conn.last_used >= idle_timeout and conn.lock.acquire(False):
+                try:
+                    if conn.client is not None:
+                        conn.close()
+                finally:
+                    conn.lock.release()
+
+    def close(self):
+        self.evict(0)
+
+    def _reap(self):
+        while True:
+            time.sleep(min(max(self.idle_timeout / 10.0, 1), 60))
+            self.evict()
@@ -0,0 +1,437 @@
+#!/usr/bin/env python2.7
+
+# On-disk storage of the discovery data and probe samples collected by pniMonitor.py.
+#
+# Each .dsc file is a one-line header (magic, schema version, CRC32 and length of the payload) followed by the
+# discovery data and the change indicators it was collected with (sysUpTime, ifTableLastChange, a hash of the
+# interface descriptions, the interface tags and the acl_name) in marshal format. The files are replaced atomically and
+# a file failing any of the header checks is never loaded. Files written by earlier releases as str(dict) are
+# converted when they are read.
+#
+# Each .prb file is a memory-mapped ring buffer holding the last `retention` samples of every monitored interface as
+# fixed-size records, so that appending a sample and reading the latest one are O(1) regardless of data_retention.
+#
+#   header     magic, version, retention, max_peers, interfaces, record size
+#   directory  one entry per interface: name (up to 64 bytes), head (next slot to write), count (slots in use)
+#   rings      interfaces * retention records: ts, adminStatus, operStatus, ifSpeed, ifInOctets, ifOutOctets and up
+#              to max_peers BGP peers (afi, address, state, accepted prefixes)
+
+import os
+import mmap
+import struct
+import socket
+import binascii
+import datetime
+import time
+import ast
+import threading
+import Queue
+import logging
+import sys
+import marshal
+import zlib
+
+MAGIC = 'PNIR'
+VERSION = 1
+
+DSC_MAGIC = 'PNID'
+DSC_VERSION = 2
+
+NAME_SIZE = 64
+
+HEADER = struct.Struct('<4sHHHHI')
+ENTRY = struct.Struct('<%dsII' % NAME_SIZE)
+RECORD = struct.Struct('<dBBIQQH')
+PEER = struct.Struct('<B16sBI')
+
+MISSING = 2 ** 32 - 1
+MISSING64 = 2 ** 64 - 1
+NO_PEERS = 2 ** 16 - 1
+NO_SUCH_INSTANCE = 'No Such Instance currently exists at this OID'
+
+status_codes = {'up': 1, 'down': 2, 'testing': 3, 'unknown': 4, 'dormant': 5, 'notPresent': 6, 'lowerLayerDown': 7}
+status_names = dict((v, k) for k, v in status_codes.items())
+
+dF = "%Y-%m-%d %H:%M:%S.%f"
+
+
+class StoreError(Exception):
+    pass
+
+
+def _number(value, missing):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return missing
+
+
+def _text(value, missing):
+    return NO_SUCH_INSTANCE if value == missing else str(value)
+
+
+def _address(afi, addr):
+    if afi == 4:
+        return socket.inet_aton(addr) + '\x00' * 12
+    return binascii.unhexlify(addr.replace(':', ''))
+
+
+def _peer_address(afi, packed):
+    if afi == 4:
+        return socket.inet_ntoa(packed[:4])
+    return ':'.join('%02x' % ord(c) for c in packed)
+
+
+def _epoch(ts):
+    if isinstance(ts, datetime.datetime):
+        dt = ts
+    else:
+        try:
+            dt = datetime.datetime.strptime(ts, dF)
+        except ValueError:
+            dt = datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
+    return time.mktime(dt.timetuple()) + dt.microsecond / 1e6
+
+
+def _timestamp(epoch):
+    seconds = int(epoch)
+    micro = int(round((epoch - seconds) * 1e6))
+    if micro == 1000000:
+        seconds, micro = seconds + 1, 0
+    return datetime.datetime.fromtimestamp(seconds).replace(microsecond=micro).strftime(dF)
+
+
+def _peers(sample):
+    return sum(len(sample.get('peerStatus_' + afi, {})) for afi in ('ipv4', 'ipv6'))
+
+
+def _legacy_samples(path):
+    samples = []
+    with open(path) as f:
+        for line in f:
+            try:
+                samples.append(ast.literal_eval(line.strip()))
+            except (ValueError, SyntaxError):
+                pass
+    return samples
+
+
+def _write_atomic(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp, path)
+
+
+# Schema migrations, keyed by the version they upgrade from.
+dsc_migrations = {1: lambda disc: {'interfaces': disc, 'indicators': {}}}
+
+
+def save_discovery(path, disc, indicators=None):
+    payload = marshal.dumps({'interfaces': disc, 'indicators': indicators or {}}, 2)
+    header = '%s %d %08x %d\n' % (DSC_MAGIC, DSC_VERSION, zlib.crc32(payload) & 0xffffffff, len(payload))
+    _write_atomic(path, header + payload)
+
+
+def load_discovery(path):
+    # Returns the discovery data and the change indicators stored with it.
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(DSC_MAGIC + ' '):
+        # Legacy str(dict) format; converted in place so it is parsed only once.
+        try:
+            disc = ast.literal_eval(data)
+        except (ValueError, SyntaxError):
+            raise StoreError('Unreadable discovery file: %s' % path)
+        save_discovery(path, disc)
+        return disc, {}
+    header, _, payload = data.partition('\n')
+    try:
+        magic, version, checksum, length = header.split(' ')
+        version, checksum, length = int(version), int(checksum, 16), int(length)
+    except ValueError:
+        raise StoreError('Corrupt discovery file header: %s' % path)
+    if len(payload) != length or zlib.crc32(payload) & 0xffffffff != checksum:
+        raise StoreError('Discovery file checksum mismatch: %s' % path)
+    if version > DSC_VERSION:
+        raise StoreError('Unsupported discovery file version %d: %s' % (version, path))
+    try:
+        data = marshal.loads(payload)
+    except (ValueError, EOFError, TypeError):
+        raise StoreError('Unreadable discovery file: %s' % path)
+    if version < DSC_VERSION:
+        for v in range(version, DSC_VERSION):
+            data = dsc_migrations[v](data)
+        save_discovery(path, data['interfaces'], data['indicators'])
+    return data['interfaces'], data['indicators']
+
+
+class RingStore(object):
+    def __init__(self, path, retention, readonly=False):
+        self.path = path
+        self.retention = retention
+        self.mm = None
+        self.fd = None
+        if readonly:
+            self._open(readonly)
+            self.retention = self.header[2]
+            return
+        if not os.path.exists(path):
+            self._create(path, retention, 0, [])
+        else:
+            with open(path, 'rb') as f:
+                magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                self._migrate(path)
+        self._open()
+        if self.header[2] != retention:
+            self._rebuild(self.names, self.max_peers, retention)
+
+    def _create(self, path, retention, max_peers, names, rings=None):
+        record_size = RECORD.size + max_peers * PEER.size
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, retention, max_peers, len(names), record_size))
+            for name in names:
+                records = (rings or {}).get(name, [])[-retention:]
+                f.write(ENTRY.pack(name, len(records) % retention, len(records)))
+            for name in names:
+                records = (rings or {}).get(name, [])[-retention:]
+                for record in records:
+                    f.write(record[:record_size].ljust(record_size, '\x00'))
+                f.write('\x00' * record_size * (retention - len(records)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, path)
+
+    def _migrate(self, path):
+        # Converts a text .prb file written by earlier releases (one str(dict) per line).
+        samples = _legacy_samples(path)[-self.retention:]
+        names = sorted(set(name for sample in samples for name in sample if len(name) <= NAME_SIZE))
+        max_peers = max([_peers(sample[name]) for sample in samples for name in sample] or [0])
+        rings = {}
+        for sample in samples:
+            for name in sample:
+                if len(name) <= NAME_SIZE:
+                    rings.setdefault(name, []).append(self._pack(sample[name], max_peers))
+        self._create(path, self.retention, max_peers, names, rings)
+
+    def _open(self, readonly=False):
+        self.close()
+        if readonly:
+            self.fd = os.open(self.path, os.O_RDONLY)
+            self.mm = mmap.mmap(self.fd, 0, access=mmap.ACCESS_READ)
+        else:
+            self.fd = os.open(self.path, os.O_RDWR)
+            self.mm = mmap.mmap(self.fd, 0)
+        try:
+            self._index()
+        except StoreError:
+            self.close()
+            raise
+
+    def _index(self):
+        if len(self.mm) < HEADER.size:
+            raise StoreError('Truncated probe file: %s' % self.path)
+        self.header = HEADER.unpack_from(self.mm, 0)
+        magic, version, retention, self.max_peers, count, self.record_size = self.header
+        if (magic != MAGIC or version != VERSION or retention < 1 or
+                self.record_size != RECORD.size + self.max_peers * PEER.size):
+            raise StoreError('Unsupported probe file format: %s' % self.path)
+        self.data = HEADER.size + count * ENTRY.size
+        if len(self.mm) != self.data + count * retention * self.record_size:
+            raise StoreError('Truncated probe file: %s' % self.path)
+        self.names = [ENTRY.unpack_from(self.mm, HEADER.size + n * ENTRY.size)[0].rstrip('\x00')
+                      for n in range(count)]
+        self.index = dict((name, n) for n, name in enumerate(self.names))
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _rings(self):
+        retention = self.header[2]
+        rings = {}
+        for n, name in enumerate(self.names):
+            head, count = ENTRY.unpack_from(self.mm, HEADER.size + n * ENTRY.size)[1:]
+            rings[name] = [self._slot(n, (head - count + k) % retention) for k in range(count)]
+        return rings
+
+    def _rebuild(self, names, max_peers, retention):
+        # Interfaces added, more peers per interface or a new data_retention; the existing history is carried over.
+        rings = self._rings()
+        self.close()
+        self._create(self.path, retention, max_peers, names, rings)
+        self._open()
+
+    def _offset(self, n, slot):
+        return self.data + (n * self.header[2] + slot) * self.record_size
+
+    def _slot(self, n, slot):
+        offset = self._offset(n, slot)
+        return self.mm[offset:offset + self.record_size]
+
+    def _pack(self, sample, max_peers):
+        peers = []
+        for afi in (4, 6):
+            status = sample.get('peerStatus_ipv%d' % afi, {})
+            for addr in sorted(status):
+                state, accepted = (list(status[addr]) + ['', ''])[:2]
+                peers.append(PEER.pack(afi, _address(afi, addr), _number(state, 0) & 0xff,
+                                       _number(accepted, MISSING)))
+        record = RECORD.pack(_epoch(sample['ts']), status_codes.get(sample['adminStatus'], 0),
+                             status_codes.get(sample['operStatus'], 0), _number(sample['ifSpeed'], MISSING),
+                             _number(sample['ifInOctets'], MISSING64), _number(sample['ifOutOctets'], MISSING64),
+                             len(peers) if 'peerStatus_ipv4' in sample or 'peerStatus_ipv6' in sample else NO_PEERS)
+        return record + ''.join(peers) + '\x00' * (PEER.size * (max_peers - len(peers)))
+
+    def _unpack(self, record):
+        ts, admin, oper, speed, inoctets, outoctets, npeers = RECORD.unpack_from(record, 0)
+        sample = {'ts': _timestamp(ts), 'adminStatus': status_names.get(admin, 'unknown'),
+                  'operStatus': status_names.get(oper, 'unknown'), 'ifSpeed': _text(speed, MISSING),
+                  'ifInOctets': _text(inoctets, MISSING64), 'ifOutOctets': _text(outoctets, MISSING64)}
+        if npeers != NO_PEERS:
+            sample['peerStatus_ipv4'], sample['peerStatus_ipv6'] = {}, {}
+            for p in range(npeers):
+                afi, addr, state, accepted = PEER.unpack_from(record, RECORD.size + p * PEER.size)
+                sample['peerStatus_ipv%d' % afi][_peer_address(afi, addr)] = [str(state), _text(accepted, MISSING)]
+        return sample
+
+    def append(self, sample):
+        # Interface names longer than NAME_SIZE are not stored, rather than truncated into a name that another
+        # interface may share (or that no longer matches its own after a restart). Returns them.
+        skipped = sorted(name for name in sample if len(name) > NAME_SIZE)
+        sample = dict((name, sample[name]) for name in sample if len(name) <= NAME_SIZE)
+        names = [name for name in sample if name not in self.index]
+        max_peers = max([_peers(sample[name]) for name in sample] + [self.max_peers])
+        if names != [] or max_peers > self.max_peers:
+            self._rebuild(self.names + sorted(names), max_peers, self.header[2])
+        retention = self.header[2]
+        for name in sample:
+            n = self.index[name]
+            entry = HEADER.size + n * ENTRY.size
+            head, count = ENTRY.unpack_from(self.mm, entry)[1:]
+            offset = self._offset(n, head)
+            self.mm[offset:offset + self.record_size] = self._pack(sample[name], self.max_peers)
+            ENTRY.pack_into(self.mm, entry, name, (head + 1) % retention, min(count + 1, retention))
+        return skipped
+
+    def latest(self):
+        retention = self.header[2]
+        sample = {}
+        for n, name in enumerate(self.names):
+            head, count = ENTRY.unpack_from(self.mm, HEADER.size + n * ENTRY.size)[1:]
+            if count > 0:
+                sample[name] = self._unpack(self._slot(n, (head - 1) % retention))
+        return sample
+
+    def history(self):
+        # All retained samples in chronological order, grouped by the timestamp they were collected with.
+        samples = {}
+        for name, records in self._rings().items():
+            for record in records:
+                ts = RECORD.unpack_from(record, 0)[0]
+                samples.setdefault(ts, {})[name] = self._unpack(record)
+        return [samples[ts] for ts in sorted(samples)]
+
+
+def load_history(path):
+    # Read-only counterpart of RingStore(path).history(); the file is neither migrated nor resized.
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+    if magic != MAGIC:
+        return _legacy_samples(path)
+    store = RingStore(path, None, readonly=True)
+    try:
+        return store.history()
+    finally:
+        store.close()
+
+
+class SampleCache(object):
+    # Process-wide cache of the latest probe sample per node. The probe files are only read when a node is first seen
+    # (e.g. after a restart) and are otherwise written behind by a background thread as a crash-recovery snapshot, so
+    # that no file I/O takes place between probing a node and processing its data.
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.samples = {}
+        self.stale = {}
+        self.stores = {}
+        self.oversized = set()
+        self.lock = threading.Lock()
+        self.queue = Queue.Queue()
+        self.writer = None
+
+    def load(self, node, path, retention):
+        with self.lock:
+            if node in self.samples:
+                return self.samples[node]
+        self.flush()
+        try:
+            store = RingStore(path, retention)
+        except StoreError as err:
+            # A truncated or corrupt probe file costs the node its history, but must not halt it in every cycle.
+            self.logger.warning('%s. The file will be recreated and the probe() history of %s is lost' % (err, node))
+            os.remove(path)
+            store = RingStore(path, retention)
+        try:
+            sample = store.latest()
+        finally:
+            store.close()
+        with self.lock:
+            stale = self.stale.pop(node, ())
+            return self.samples.setdefault(node, dict((k, v) for k, v in sample.items() if k not in stale))
+
+    def _start(self):
+        if self.writer is None or not self.writer.is_alive():
+            self.writer = threading.Thread(target=self._write, name='prb-writer')
+            self.writer.daemon = True
+            self.writer.start()
+
+    def put(self, node, path, retention, sample):
+        with self.lock:
+            self.samples[node] = sample
+            self._start()
+        self.queue.put((path, retention, sample))
+
+    def forget(self, node, names):
+        # Drops the previous sample of the given interfaces, e.g. when their ifIndex has changed. If the node has not
+        # been loaded yet, the interfaces are dropped when it is.
+        with self.lock:
+            if node in self.samples:
+                self.samples[node] = dict((k, v) for k, v in self.samples[node].items() if k not in names)
+            else:
+                self.stale.setdefault(node, set()).update(names)
+
+    def flush(self):
+        if self.writer is not None and self.writer.is_alive():
+            self.queue.join()
+
+    def _write(self):
+        while True:
+            path, retention, sample = self.queue.get()
+            try:
+                store = self.stores.get(path)
+                if store is not None and store.header[2] != retention:
+                    store.close()
+                    del self.stores[path]
+                    store = None
+                if store is None:
+                    store = self.stores[path] = RingStore(path, retention)
+                skipped = [name for name in store.append(sample) if (path, name) not in self.oversized]
+                if skipped != []:
+                    self.oversized.update((path, name) for name in skipped)
+                    self.logger.warning('Interface name(s) longer than %d bytes cannot be saved to file %s. Their '
+                                        'probe() data is kept in memory only and does not survive a restart: %s'
+                                        % (NAME_SIZE, path, skipped))
+            except:
+                self.logger.error('Unexpected error while writing probe() data to file %s: %s:%s'
+                                  % ((path,) + sys.exc_info()[:2]))
+            finally:
+                self.queue.task_done()
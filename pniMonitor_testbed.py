@@ -0,0 +1,376 @@
+#!/usr/bin/env python2.7
+
+# Local test bed and scaling benchmark of pniMonitor.py; no live routers required.
+#
+# Usage: pniMonitor_testbed.py [-n <nodes>] [-i <interfaces per node>] [-b <bgp peers per pni>] [-c <cycles>]
+#                              [-f <frequency>] [-e <threads|pool>] [-w <workers>] [-l <ssh latency (ms)>] [-s]
+#                              [-d <directory>]
+#
+# A child process emulates the routers: one SNMPv2c agent per node, on a loopback address of its own (127.1.0.1
+# onwards), serving synthetic IF-MIB, IP-MIB and CISCO-BGP4-MIB tables with moving counters, and an SSH server that
+# emulates the IOS-XR prompt, 'configure' / 'commit' and the 'sh access-lists ... usage pfilter' output of every node.
+# Half of the interfaces of a node are PNIs and the other half CDN interfaces; the PNI egress of each node follows a
+# slow wave, so that some nodes cross the rising and falling thresholds and have their CDN interfaces blocked and
+# unblocked over SSH.
+#
+# The parent process runs full pniMonitor polling cycles (discovery on the first cycle, then probe, process and ACL
+# changes) against them with the native SNMP backend, and reports the wall time of every cycle, the percentiles of the
+# per-node cycle latency, and the CPU time and RSS of the monitoring process alone.
+
+import sys
+import os
+import getopt
+import time
+import math
+import random
+import socket
+import select
+import threading
+import functools
+import multiprocessing
+import resource
+import tempfile
+import paramiko
+import pniMonitor_snmp
+import pniMonitor_ssh
+import pniMonitor_engine
+
+snmp_port = 16161
+ssh_port = 10022
+acl_name = 'CDPautomation_RhmUdpBlock'
+password = 'testbed'
+
+ifName = '.1.3.6.1.2.1.31.1.1.1.1'
+ifAlias = '.1.3.6.1.2.1.31.1.1.1.18'
+ipAddressIfIndex = '.1.3.6.1.2.1.4.34.1.3'
+cbgpPeer2LocalAddr = '.1.3.6.1.4.1.9.9.187.1.2.5.1.6'
+cbgpPeer2State = '.1.3.6.1.4.1.9.9.187.1.2.5.1.3'
+cbgpPeer2AcceptedPrefixes = '.1.3.6.1.4.1.9.9.187.1.2.8.1.1'
+ifAdminStatus = '.1.3.6.1.2.1.2.2.1.7'
+ifOperStatus = '.1.3.6.1.2.1.2.2.1.8'
+ifHighSpeed = '.1.3.6.1.2.1.31.1.1.1.15'
+ifHCInOctets = '.1.3.6.1.2.1.31.1.1.1.6'
+ifHCOutOctets = '.1.3.6.1.2.1.31.1.1.1.10'
+sysUpTime = '.1.3.6.1.2.1.1.3.0'
+ifTableLastChange = '.1.3.6.1.2.1.31.1.5.0'
+
+
+def usage(args):
+    print "Usage: %s [-n <nodes>] [-i <interfaces per node>] [-b <bgp peers per pni>] [-c <cycles>] " \
+          "[-f <frequency>] [-e <threads|pool>] [-w <workers>] [-l <ssh latency (ms)>] [-s] [-d <directory>]" % args[0]
+
+
+def addresses(count):
+    return ['127.1.%d.%d' % (n // 250, n % 250 + 1) for n in range(count)]
+
+
+def _index(address):
+    # IP-MIB / CISCO-BGP4-MIB address index: <type>.<length>.<octets>
+    if ':' in address:
+        octets = socket.inet_pton(socket.AF_INET6, address)
+        return '2.16.' + '.'.join(str(ord(c)) for c in octets), octets
+    octets = socket.inet_pton(socket.AF_INET, address)
+    return '1.4.' + '.'.join(str(ord(c)) for c in octets), octets
+
+
+class Model(object):
+    # The MIB view of a synthetic router. Octet counters are the integral of a utilisation that follows a sine wave
+    # (u0 + amp * sin(2 * pi * t / period + phase)) from the start of the test bed, so they only ever grow.
+    def __init__(self, node, interfaces, peers, seed):
+        rnd = random.Random(seed)
+        self.node = node
+        self.t0 = time.time()
+        self.view = {pniMonitor_snmp.oid(ifTableLastChange): pniMonitor_snmp.TimeTicks(4200)}
+        self.counters = []
+        wave = (rnd.uniform(0.55, 0.9), 0.1, rnd.uniform(120, 600), rnd.uniform(0, 2 * math.pi))
+        for n in range(interfaces):
+            index = str(n + 1)
+            kind = 'pni' if n % 2 == 0 else 'cdn'
+            speed = rnd.choice([10000, 20000, 40000, 100000])
+            self._set(ifName, index, pniMonitor_snmp.OctetString('Bundle-Ether%s' % index))
+            self._set(ifAlias, index, pniMonitor_snmp.OctetString('CDPautomation_%s testbed %s' % (kind.upper(),
+                                                                                                   index)))
+            self._set(ifAdminStatus, index, 1)
+            self._set(ifOperStatus, index, 1)
+            self._set(ifHighSpeed, index, pniMonitor_snmp.Gauge32(speed))
+            if kind == 'pni':
+                out_wave, in_wave = wave, (0.2, 0.05, 300, 0)
+                for local in ('10.%d.%d.1' % (n // 256, n % 256), '2001:db8:%x::1' % n):
+                    self._set(ipAddressIfIndex, _index(local)[0], int(index))
+                    for p in range(peers):
+                        peer = local[:-1] + str(p + 2)
+                        afi = '2.1' if ':' in local else '1.1'
+                        self._set(cbgpPeer2LocalAddr, _index(peer)[0], pniMonitor_snmp.OctetString(_index(local)[1]))
+                        self._set(cbgpPeer2State, _index(peer)[0], 6)
+                        self._set(cbgpPeer2AcceptedPrefixes, _index(peer)[0] + '.' + afi,
+                                  pniMonitor_snmp.Gauge32(rnd.randint(100, 1000)))
+            else:
+                out_wave, in_wave = (0.1, 0.05, 300, 0), (0.5, 0.3, rnd.uniform(120, 600), rnd.uniform(0, 2 * math.pi))
+            for column, (u0, amp, period, phase) in ((ifHCInOctets, in_wave), (ifHCOutOctets, out_wave)):
+                self.counters.append((pniMonitor_snmp.oid(column + '.' + index), speed * 10 ** 6 / 8.0, u0, amp,
+                                      period, phase, rnd.randint(0, 2 ** 60)))
+
+    def _set(self, column, index, value):
+        self.view[pniMonitor_snmp.oid(column + '.' + index)] = value
+
+    def __call__(self):
+        t = time.time() - self.t0
+        for o, rate, u0, amp, period, phase, base in self.counters:
+            octets = rate * (u0 * t - amp * period / (2 * math.pi) * (math.cos(2 * math.pi * t / period + phase) -
+                                                                      math.cos(phase)))
+            self.view[o] = pniMonitor_snmp.Counter64(base + int(octets))
+        self.view[pniMonitor_snmp.oid(sysUpTime)] = pniMonitor_snmp.TimeTicks(int(t * 100) + 360000)
+        return self.view
+
+
+class Agent(pniMonitor_snmp.Agent):
+    # Serves the view of a Model, whose OIDs are already parsed.
+    def _view(self):
+        return self.view()
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        return True
+
+
+class SshServer(threading.Thread):
+    # IOS-XR CLI stand-in for all nodes; the node is identified by the local address of the connection.
+    def __init__(self, nodes, port, interfaces, latency=0):
+        threading.Thread.__init__(self, name='ssh-server')
+        self.daemon = True
+        self.key = paramiko.RSAKey.generate(2048)
+        self.latency = latency
+        self.interfaces = interfaces
+        self.applied = dict((node, set()) for node in nodes)
+        self.listeners = []
+        for node in nodes:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((node, port))
+            sock.listen(5)
+            self.listeners.append(sock)
+
+    def run(self):
+        while True:
+            for sock in select.select(self.listeners, [], [])[0]:
+                conn, peer = sock.accept()
+                thread = threading.Thread(target=self.serve, args=(conn, conn.getsockname()[0]))
+                thread.daemon = True
+                thread.start()
+
+    def usage(self, node):
+        output = 'Location : 0/0/CPU0\r\n'
+        for interface in sorted(self.applied[node]):
+            output += 'Interface : %s\r\n    Input ACL : N/A\r\n    Output ACL : %s\r\n' % (interface, acl_name)
+        return output
+
+    def serve(self, conn, node):
+        transport = paramiko.Transport(conn)
+        transport.add_server_key(self.key)
+        try:
+            transport.start_server(server=_ServerInterface())
+            channel = transport.accept(30)
+            if channel is None:
+                return
+            mode, interface, pending, buf = '', None, [], ''
+            channel.send('\r\n\r\nRP/0/RSP0/CPU0:%s#' % node)
+            while True:
+                data = channel.recv(65536)
+                if data == '':
+                    return
+                buf += data
+                while '\n' in buf:
+                    line, buf = buf.split('\n', 1)
+                    line, output = line.strip(), ''
+                    if self.latency:
+                        time.sleep(self.latency)
+                    if line == 'exit' and mode == '':
+                        return
+                    elif line == 'configure':
+                        mode = '(config)'
+                    elif line.startswith('interface '):
+                        interface, mode = line.split()[1], '(config-if)'
+                    elif line == 'ipv4 access-group %s egress' % acl_name:
+                        pending.append((self.applied[node].add, interface))
+                    elif line == 'no ipv4 access-group %s egress' % acl_name:
+                        pending.append((self.applied[node].discard, interface))
+                    elif line == 'exit':
+                        mode = '(config)'
+                    elif line == 'commit':
+                        for change, name in pending:
+                            change(name)
+                        pending = []
+                    elif line == 'end':
+                        mode, pending = '', []
+                    elif line.startswith('sh access-lists %s usage pfilter' % acl_name):
+                        output = self.usage(node)
+                    channel.send('%s\r\n%sRP/0/RSP0/CPU0:%s%s#' % (line, output, node, mode))
+        except (EOFError, socket.error, paramiko.SSHException):
+            pass
+        finally:
+            transport.close()
+
+
+def serve(nodes, interfaces, peers, latency, community, ready):
+    agents = []
+    for n, node in enumerate(nodes):
+        agent = Agent(Model(node, interfaces, peers, n), community, node, snmp_port)
+        agent.start()
+        agents.append(agent)
+    SshServer(nodes, ssh_port, interfaces, latency).start()
+    ready.set()
+    while True:
+        time.sleep(60)
+
+
+def _timed(router, latencies):
+    start, completed = time.time(), False
+    try:
+        router.run()
+        completed = True
+    finally:
+        latencies.append((time.time() - start, completed))
+
+
+def _percentile(values, p):
+    return values[min(int(len(values) * p / 100.0), len(values) - 1)] if values else 0.0
+
+
+def _rss():
+    # Current resident set size (MB) on Linux; the peak RSS elsewhere.
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _cpu(usage):
+    return usage.ru_utime + usage.ru_stime
+
+
+def main(args):
+    nodes, interfaces, peers, cycles, frequency, engine, workers, latency = 20, 20, 2, 5, 10, 'threads', 50, 0
+    dryrun, directory = False, None
+    try:
+        options, remainder = getopt.getopt(args[1:], "hn:i:b:c:f:e:w:l:sd:", ["help"])
+        for opt, arg in options:
+            if opt in ('-h', '--help'):
+                usage(args)
+                sys.exit(0)
+            elif opt == '-n':
+                nodes = int(arg)
+            elif opt == '-i':
+                interfaces = int(arg)
+            elif opt == '-b':
+                peers = int(arg)
+            elif opt == '-c':
+                cycles = int(arg)
+            elif opt == '-f':
+                frequency = int(arg)
+            elif opt == '-e':
+                if arg not in ('threads', 'pool'):
+                    raise ValueError('engine must be one of threads or pool: %s' % arg)
+                engine = arg
+            elif opt == '-w':
+                workers = int(arg)
+            elif opt == '-l':
+                latency = int(arg) / 1000.0
+            elif opt == '-s':
+                dryrun = True
+            elif opt == '-d':
+                directory = arg
+    except (getopt.GetoptError, ValueError) as err:
+        print err
+        usage(args)
+        sys.exit(2)
+    if not 0 < nodes <= 250 * 256 or interfaces < 2:
+        print "The number of nodes must be between 1 and 64000, with at least 2 interfaces each"
+        sys.exit(2)
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix='pniMonitor_testbed.')
+    elif not os.path.isdir(directory):
+        os.makedirs(directory)
+    os.chdir(directory)
+    inventory = addresses(nodes)
+    # The stand-ins are forked before any threads are started in this process, and pniMonitor is imported only after
+    # the change of directory, as it opens its log files in the working directory.
+    ready = multiprocessing.Event()
+    standin = multiprocessing.Process(target=serve, args=(inventory, interfaces, peers, latency, 'kN8qpTxH', ready),
+                                      name='testbed-routers')
+    standin.start()
+    if not ready.wait(120):
+        print "The router stand-ins failed to start"
+        standin.terminate()
+        sys.exit(1)
+    import pniMonitor
+    for node in inventory:
+        pniMonitor.snmp_sessions[node] = pniMonitor_snmp.Session(node, pniMonitor.community, port=snmp_port)
+        pniMonitor.ssh_pool.connections[node] = pniMonitor_ssh.Connection(node, node, pniMonitor.un, password,
+                                                                          port=ssh_port)
+    pool = pniMonitor_engine.Engine(workers, pniMonitor.main_logger) if engine == 'pool' else None
+    print "Nodes: %d, interfaces per node: %d (%d PNI with %d BGP peers per AFI each), engine: %s%s, frequency: %d " \
+          "seconds, working directory: %s" % (nodes, interfaces, (interfaces + 1) // 2, peers, engine,
+                                               ' (%d workers)' % workers if pool else '', frequency, directory)
+    print
+    print "%5s %9s %9s %9s %9s %9s %9s %7s %9s" % ('cycle', 'wall_s', 'p50_s', 'p90_s', 'p99_s', 'max_s', 'cpu_s',
+                                                   'failed', 'rss_mb')
+    steady, steady_cpu = [], 0.0
+    for cycle in range(cycles):
+        start, usage = time.time(), resource.getrusage(resource.RUSAGE_SELF)
+        latencies = []
+        routers = [pniMonitor.Router(n + 1, node, password, cycle == 0, 95, 90, 90, acl_name, dryrun, 2,
+                                     ('CDPautomation_PNI', 'CDPautomation_CDN'), (0, 50), 3, 2, 'native', 'bulk', 1472,
+                                     30, frequency) for n, node in enumerate(inventory)]
+        if pool is not None:
+            for job in [pool.submit(router.name, functools.partial(_timed, router, latencies)) for router in routers]:
+                job.done.wait()
+        else:
+            threads = [threading.Thread(target=_timed, args=(router, latencies), name=router.name)
+                       for router in routers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        wall, cpu = time.time() - start, _cpu(resource.getrusage(resource.RUSAGE_SELF)) - _cpu(usage)
+        durations = sorted(duration for duration, completed in latencies)
+        print "%5d %9.3f %9.3f %9.3f %9.3f %9.3f %9.3f %7d %9.1f" \
+              % (cycle + 1, wall, _percentile(durations, 50), _percentile(durations, 90),
+                 _percentile(durations, 99), durations[-1], cpu, len([c for d, c in latencies if not c]), _rss())
+        if cycle > 0:
+            steady += durations
+            steady_cpu += cpu
+        if cycle < cycles - 1:
+            time.sleep(max(start + frequency - time.time(), 0))
+    standin.terminate()
+    standin.join()
+    print
+    if steady != []:
+        steady.sort()
+        print "Steady state (cycles 2-%d): node cycle latency p50 %.3f, p90 %.3f, p99 %.3f, max %.3f seconds" \
+              % (cycles, _percentile(steady, 50), _percentile(steady, 90), _percentile(steady, 99), steady[-1])
+        print "CPU time per node cycle: %.2f ms" % (steady_cpu * 1000 / len(steady))
+    print "ACL changes: %d, peak RSS: %.1f MB, router stand-ins CPU time: %.1f seconds" \
+          % (sum(pniMonitor.metrics.series.get('pnimonitor_acl_changes_total', {}).values()),
+             resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+             _cpu(resource.getrusage(resource.RUSAGE_CHILDREN)))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python2.7
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import pniMonitor
+
+
+class DiscoveryDeadlineTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def router(self, cycletimeout, discoverytimeout, duration):
+        router = pniMonitor.Router(1, 'node', 'pw', True, 95, 90, 90, 'acl', True, 2,
+                                   ('CDPautomation_PNI', 'CDPautomation_CDN'), (0, 50), 3, 2, 'native', 'bulk', 1472,
+                                   30, cycletimeout, discoverytimeout)
+        router.dns = lambda node: '127.0.0.1'
+        router.deadlines = []
+
+        def discovery(ipaddr, cached=None, cached_indicators=None):
+            # Stands in for the SNMP walks and the SSH ACL check of a large node; every operation checks the deadline.
+            started = time.time()
+            while time.time() - started < duration:
+                router._timeout('snmpwalk', 5)
+                time.sleep(0.05)
+            router.deadlines.append(pniMonitor.cycle.deadline)
+            return {}
+        router.discovery = discovery
+        return router
+
+    def test_discovery_longer_than_the_cycle(self):
+        router = self.router(0.2, 2, 0.5)
+        router._cycle()
+        completed = time.time()
+        self.assertEqual(len(router.deadlines), 1)
+        # The rest of the cycle gets a deadline of its own once the discovery has completed.
+        self.assertAlmostEqual(pniMonitor.cycle.deadline, completed + 0.2, delta=0.1)
+
+    def test_discovery_timeout(self):
+        router = self.router(5, 0.3, 1)
+        self.assertRaises(SystemExit, router._cycle)
+        self.assertEqual(router.deadlines, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
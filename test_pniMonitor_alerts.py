@@ -0,0 +1,111 @@
+#!/usr/bin/env python2.7
+
+import asyncore
+import smtpd
+import threading
+import time
+import logging
+import unittest
+import pniMonitor_alerts
+
+
+class Sink(smtpd.SMTPServer):
+    # A local SMTP server that keeps the messages it receives.
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ('127.0.0.1', 0), None)
+        self.address = self.socket.getsockname()
+        self.messages = []
+        self.received = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve(self):
+        while self.running:
+            asyncore.loop(0.05, count=1)
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        self.messages.append(data)
+        self.received.set()
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.close()
+
+
+class DispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.sink = Sink()
+        self.logger = logging.getLogger('test.alerts')
+        self.logger.propagate = False
+
+    def tearDown(self):
+        self.dispatcher.close(5)
+        self.logger.removeHandler(self.dispatcher)
+        self.sink.stop()
+
+    def dispatcher_for(self, queue_size=1000):
+        self.dispatcher = pniMonitor_alerts.Dispatcher(self.sink.address, 'no-reply@domain1.com', 'PNI Monitor',
+                                                       queue_size=queue_size, retries=0)
+        self.logger.addHandler(self.dispatcher)
+        return self.dispatcher
+
+    def log(self, node, message):
+        # Logged from a thread named as the node's subThread, as the Router threads do.
+        thread = threading.Thread(target=self.logger.error, args=(message,), name='thread-1_%s' % node)
+        thread.start()
+        thread.join()
+
+    def subject(self, message):
+        return [line for line in message.split('\n') if line.startswith('Subject: ')][0][len('Subject: '):]
+
+    def test_single_alert(self):
+        self.dispatcher_for().configure(['support@domain1.com'], 0.2)
+        self.log('router1', 'Operation halted. Unknown host: router1')
+        self.assertTrue(self.sink.received.wait(5))
+        self.assertEqual(self.subject(self.sink.messages[0]), 'PNI Monitor')
+        self.assertIn('Operation halted. Unknown host: router1', self.sink.messages[0])
+
+    def test_digest(self):
+        self.dispatcher_for().configure(['support@domain1.com'], 0.5)
+        for n in range(3):
+            self.log('router1', 'Unexpected error during snmpget operation [_snmp() Err no.2]: Timeout %d' % n)
+        self.log('router2', 'Unexpected error during snmpget operation [_snmp() Err no.2]: Timeout')
+        self.assertTrue(self.sink.received.wait(5))
+        time.sleep(0.2)
+        self.assertEqual(len(self.sink.messages), 1)
+        message = self.sink.messages[0]
+        self.assertEqual(self.subject(message), 'PNI Monitor - 4 alerts from 2 source(s)')
+        self.assertIn('[router1] _snmp() Err no.2: 3 occurrences between', message)
+        self.assertIn('Timeout 0', message)
+        self.assertIn('Timeout 2', message)
+        self.assertNotIn('Timeout 1', message)
+
+    def test_queue_limit(self):
+        # Without a running worker, the queue fills up; the records that do not fit are counted in the next digest.
+        dispatcher = self.dispatcher_for(queue_size=2)
+        for n in range(5):
+            self.log('router%d' % n, 'Operation halted. Unknown host: router%d' % n)
+        self.assertEqual(dispatcher.dropped, 3)
+        dispatcher.configure(['support@domain1.com'], 0.2)
+        self.assertTrue(self.sink.received.wait(5))
+        message = self.sink.messages[0]
+        self.assertEqual(self.subject(message), 'PNI Monitor - 5 alerts from 2 source(s)')
+        self.assertIn('3 further alert(s) were dropped while the alert queue was full.', message)
+
+    def test_flush_at_shutdown(self):
+        # The digest window is not waited for when the dispatcher is closed at exit.
+        dispatcher = self.dispatcher_for()
+        dispatcher.configure(['support@domain1.com'], 60)
+        self.log('router1', 'Operation halted. Unknown host: router1')
+        started = time.time()
+        dispatcher.close(5)
+        self.assertLess(time.time() - started, 5)
+        self.assertEqual(len(self.sink.messages), 1)
+        self.assertFalse(dispatcher.thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
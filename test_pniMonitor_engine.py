@@ -0,0 +1,37 @@
+#!/usr/bin/env python2.7
+
+import logging
+import unittest
+import pniMonitor_engine
+
+logging.getLogger('test').addHandler(logging.NullHandler())
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = pniMonitor_engine.Scheduler(logging.getLogger('test'))
+
+    def tearDown(self):
+        self.scheduler.stop(5)
+
+    def offsets(self, nodes, period):
+        self.scheduler.update(nodes, period, lambda node: ('thread-1_%s' % node, lambda: None))
+        with self.scheduler.lock:
+            # The first slot of each node, whether or not its first run has already taken place.
+            first = dict((node, timer.scheduled - timer.runs * period) for node, timer in self.scheduler.timers.items())
+        return [first[node] - first[nodes[0]] for node in nodes]
+
+    def assertSpacing(self, offsets, expected):
+        self.assertEqual(len(offsets), len(expected))
+        for offset, slot in zip(offsets, expected):
+            self.assertAlmostEqual(offset, slot, places=6)
+
+    def test_integer_period(self):
+        self.assertSpacing(self.offsets(['router1', 'router2', 'router3', 'router4'], 1), [0, 0.25, 0.5, 0.75])
+
+    def test_float_period(self):
+        self.assertSpacing(self.offsets(['router1', 'router2', 'router3'], 1.5), [0, 0.5, 1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
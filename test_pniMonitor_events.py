@@ -0,0 +1,75 @@
+#!/usr/bin/env python2.7
+
+import socket
+import threading
+import logging
+import unittest
+import pniMonitor_events
+
+logging.getLogger('test').addHandler(logging.NullHandler())
+
+disc = {'Bundle-Ether1': {'type': 'pni', 'ifIndex': '1', 'peer_ipv4': [('10.0.0.1', '1.4.10.0.0.1')]},
+        'Bundle-Ether2': {'type': 'cdn', 'ifIndex': '2'}}
+
+
+def free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class ListenerTest(unittest.TestCase):
+    def setUp(self):
+        self.listener = pniMonitor_events.Listener(logging.getLogger('test'))
+        self.port = free_port()
+        self.listener.configure(0, self.port)
+        self.events = {'a': [], 'b': []}
+        self.release = threading.Event()
+        self.handled = dict((node, threading.Event()) for node in self.events)
+        self.listener.register('a', '127.0.0.1', disc, self.handler('a'))
+        self.listener.register('b', '127.0.0.2', disc, self.handler('b'))
+
+    def tearDown(self):
+        self.release.set()
+        self.listener.configure(0, 0)
+
+    def handler(self, node):
+        def reevaluate(events):
+            self.events[node].append(events)
+            self.handled[node].set()
+            if node == 'a':
+                self.release.wait(5)
+        return reevaluate
+
+    def send(self, source, message):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind((source, 0))
+        sock.sendto(message, ('127.0.0.1', self.port))
+        sock.close()
+
+    def test_slow_reevaluation_does_not_hold_up_other_nodes(self):
+        self.send('127.0.0.1', '<187>%PKT_INFRA-LINK-3-UPDOWN : Interface Bundle-Ether1, changed state to Down')
+        self.assertTrue(self.handled['a'].wait(2))
+        self.send('127.0.0.2', '<189>%ROUTING-BGP-5-ADJCHANGE : neighbor 10.0.0.1 Down - hold time expired')
+        self.assertTrue(self.handled['b'].wait(2))
+        self.assertEqual(self.events['b'], [['ADJCHANGE 10.0.0.1 Down (Bundle-Ether1)']])
+
+    def test_events_are_coalesced_while_a_reevaluation_runs(self):
+        self.send('127.0.0.1', '<187>%PKT_INFRA-LINK-3-UPDOWN : Interface Bundle-Ether1, changed state to Down')
+        self.assertTrue(self.handled['a'].wait(2))
+        self.handled['a'].clear()
+        self.send('127.0.0.1', '<187>%PKT_INFRA-LINK-3-UPDOWN : Interface Bundle-Ether1, changed state to Up')
+        self.send('127.0.0.1', '<187>%PKT_INFRA-LINK-3-UPDOWN : Interface Bundle-Ether2, changed state to Down')
+        # Messages about other interfaces and from unknown sources are ignored.
+        self.send('127.0.0.1', '<187>%PKT_INFRA-LINK-3-UPDOWN : Interface Bundle-Ether3, changed state to Down')
+        self.send('127.0.0.3', '<187>%PKT_INFRA-LINK-3-UPDOWN : Interface Bundle-Ether1, changed state to Down')
+        threading.Timer(0.5, self.release.set).start()
+        self.assertTrue(self.handled['a'].wait(2))
+        self.assertEqual(self.events['a'], [['UPDOWN Bundle-Ether1 Down'],
+                                            ['UPDOWN Bundle-Ether1 Up', 'UPDOWN Bundle-Ether2 Down']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python2.7
+
+import threading
+import time
+import logging
+import unittest
+import pniMonitor_fastpath
+
+logging.getLogger('test').addHandler(logging.NullHandler())
+
+
+class FastPathTest(unittest.TestCase):
+    def setUp(self):
+        self.fast_path = pniMonitor_fastpath.FastPath(frequency=0.3, logger=logging.getLogger('test'))
+        self.polls = []
+        self.polled = threading.Event()
+
+    def poll(self, state):
+        self.polls.append((time.time(), state))
+        self.polled.set()
+        return None
+
+    def test_rearm_during_sleep(self):
+        self.fast_path.arm('node', self.poll, 'first')
+        time.sleep(0.2)
+        rearmed = time.time()
+        self.assertFalse(self.fast_path.arm('node', self.poll, 'second'))
+        self.assertTrue(self.polled.wait(2))
+        self.assertEqual([state for polled, state in self.polls], ['second'])
+        self.assertGreaterEqual(self.polls[0][0] - rearmed, 0.3)
+
+    def test_rearm_while_waiting_for_the_node_lock(self):
+        # The regular cycle holds the node lock past the wake-up of the watcher and re-arms the node with a new sample.
+        self.fast_path.arm('node', self.poll, 'first')
+        with self.fast_path.node_lock('node'):
+            time.sleep(0.4)
+            rearmed = time.time()
+            self.fast_path.arm('node', self.poll, 'second')
+        self.assertTrue(self.polled.wait(2))
+        self.assertEqual([state for polled, state in self.polls], ['second'])
+        self.assertGreaterEqual(self.polls[0][0] - rearmed, 0.3)
+
+    def test_disarm_on_unexpected_error(self):
+        def poll(state):
+            self.polled.set()
+            raise KeyError(state)
+        self.fast_path.arm('node', poll, 'first')
+        self.assertTrue(self.polled.wait(2))
+        time.sleep(0.1)
+        self.assertEqual(self.fast_path.armed, {})
+        self.assertEqual(self.fast_path.watchers, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
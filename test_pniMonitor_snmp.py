@@ -0,0 +1,213 @@
+#!/usr/bin/env python2.7
+
+import socket
+import threading
+import unittest
+import pniMonitor_snmp
+from pniMonitor_snmp import Agent, Session, oid, OctetString, Counter64, TimeTicks
+
+ifName, ifAlias, ifOperStatus, ifHCOutOctets = ('.1.3.6.1.2.1.31.1.1.1.1', '.1.3.6.1.2.1.31.1.1.1.18',
+                                                '.1.3.6.1.2.1.2.2.1.8', '.1.3.6.1.2.1.31.1.1.1.10')
+ipAddressIfIndex = '.1.3.6.1.2.1.4.34.1.3'
+cbgpPeer2LocalAddr, cbgpPeer2State = '.1.3.6.1.4.1.9.9.187.1.2.5.1.6', '.1.3.6.1.4.1.9.9.187.1.2.5.1.3'
+sysUpTime = '.1.3.6.1.2.1.1.3.0'
+
+view = {sysUpTime: TimeTicks(123456)}
+for n in range(1, 101):
+    view['%s.%d' % (ifName, n)] = OctetString('Bundle-Ether%d' % n)
+    view['%s.%d' % (ifAlias, n)] = OctetString('CDPautomation_PNI to AS65000' if n == 1 else 'unused')
+    view['%s.%d' % (ifOperStatus, n)] = 1 if n % 2 else 2
+    view['%s.%d' % (ifHCOutOctets, n)] = Counter64(n * 10 ** 12)
+view[ipAddressIfIndex + '.1.4.10.0.0.2'] = 1
+view[ipAddressIfIndex + '.2.16.32.1.13.184.0.0.0.0.0.0.0.0.0.0.0.2'] = 1
+view[cbgpPeer2LocalAddr + '.1.4.10.0.0.1'] = OctetString('\x0a\x00\x00\x02')
+view[cbgpPeer2LocalAddr + '.2.16.32.1.13.184.0.0.0.0.0.0.0.0.0.0.0.1'] = \
+    OctetString('\x20\x01\x0d\xb8' + '\x00' * 11 + '\x02')
+view[cbgpPeer2State + '.1.4.10.0.0.1'] = 6
+
+
+class SessionTest(unittest.TestCase):
+    def setUp(self):
+        self.agent = Agent(view)
+        self.agent.start()
+        self.session = Session('127.0.0.1', 'public', timeout=0.2, retries=1, port=self.agent.address[1])
+
+    def tearDown(self):
+        self.session.close()
+        self.agent.stop()
+
+    def test_get(self):
+        varbinds, latencies = self.session.get([ifName + '.1', ifHCOutOctets + '.2', ifName + '.999',
+                                                '.1.3.6.1.2.1.99.1'])
+        self.assertEqual([o for o, v in varbinds], [oid(ifName + '.1'), oid(ifHCOutOctets + '.2'),
+                                                    oid(ifName + '.999'), oid('.1.3.6.1.2.1.99.1')])
+        self.assertEqual(varbinds[0][1], 'Bundle-Ether1')
+        self.assertTrue(isinstance(varbinds[0][1], OctetString))
+        self.assertEqual(varbinds[1][1], 2 * 10 ** 12)
+        self.assertTrue(isinstance(varbinds[1][1], Counter64))
+        self.assertTrue(varbinds[2][1] is pniMonitor_snmp.noSuchInstance)
+        self.assertTrue(varbinds[3][1] is pniMonitor_snmp.noSuchObject)
+        self.assertEqual(len(latencies), 1)
+        self.assertEqual(latencies[0][1], 0)
+
+    def test_get_many(self):
+        oids = ['%s.%d' % (column, n) for n in range(1, 101) for column in (ifOperStatus, ifHCOutOctets)]
+        varbinds, latencies = self.session.get_many(oids, max_size=484)
+        self.assertEqual([o for o, v in varbinds], [oid(o) for o in oids])
+        self.assertEqual([v for o, v in varbinds], [view[o] for o in oids])
+        self.assertTrue(len(latencies) > 1)
+
+    def test_get_many_too_big(self):
+        # The agent answers the requests that do not fit its own limit with tooBig; they are split and re-sent.
+        self.agent.max_size = 484
+        oids = ['%s.%d' % (ifName, n) for n in range(1, 101)]
+        varbinds, latencies = self.session.get_many(oids, max_size=1472)
+        self.assertEqual([v for o, v in varbinds], [view[o] for o in oids])
+        self.assertTrue(self.agent.requests > len(latencies) - 1 > 1)
+
+    def test_getbulk(self):
+        varbinds, latencies = self.session.getbulk([sysUpTime, ifName], non_repeaters=1, max_repetitions=3)
+        # The non-repeater is answered as a GETNEXT, the repeater with max_repetitions rows.
+        self.assertEqual(varbinds[0], (oid(ifOperStatus + '.1'), 1))
+        self.assertEqual([o for o, v in varbinds[1:]], [oid('%s.%d' % (ifName, n)) for n in range(1, 4)])
+
+    def test_walk(self):
+        varbinds, latencies = self.session.walk(ifAlias, max_repetitions=10)
+        self.assertEqual([o for o, v in varbinds], [oid('%s.%d' % (ifAlias, n)) for n in range(1, 101)])
+        self.assertEqual(len(latencies), 11)
+        varbinds, latencies = self.session.walk(cbgpPeer2State)
+        self.assertEqual(varbinds, [(oid(cbgpPeer2State + '.1.4.10.0.0.1'), 6)])
+        # Past the end of the MIB view.
+        varbinds, latencies = self.session.walk('.1.3.6.1.4.1.9.9.187.1.2.5.1.7')
+        self.assertEqual(varbinds, [])
+
+    def test_retry(self):
+        self.agent.drop = 1
+        varbinds, latencies = self.session.get([ifName + '.1'])
+        self.assertEqual(varbinds[0][1], 'Bundle-Ether1')
+        self.assertEqual(latencies[0][1], 1)
+        self.assertEqual(self.agent.requests, 2)
+
+    def test_timeout(self):
+        self.agent.drop = 10
+        with self.assertRaises(pniMonitor_snmp.SnmpTimeout) as raised:
+            self.session.get([ifName + '.1'], timeout=0.1, retries=2)
+        self.assertEqual(raised.exception.latencies, [(None, 2)])
+        self.assertEqual(self.agent.requests, 3)
+        self.agent.drop = 10
+        with self.assertRaises(pniMonitor_snmp.SnmpTimeout):
+            self.session.get_many([ifName + '.1', ifName + '.2'], timeout=0.1, retries=0)
+
+    def test_deadline(self):
+        self.agent.drop = 10
+        with self.assertRaises(pniMonitor_snmp.SnmpDeadline):
+            self.session.get([ifName + '.1'], timeout=1, retries=5, deadline=pniMonitor_snmp.time.time() + 0.2)
+
+
+class TruncatedResponseTest(unittest.TestCase):
+    # An agent stand-in that answers every request with a truncated response PDU, followed by the complete one if
+    # `complete` is set.
+    def setUp(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.session = Session('127.0.0.1', 'public', timeout=0.2, retries=1, port=self.sock.getsockname()[1])
+        self.complete = False
+        self.thread = threading.Thread(target=self.respond)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.session.close()
+        self.sock.close()
+
+    def respond(self):
+        while True:
+            try:
+                data, peer = self.sock.recvfrom(65535)
+            except socket.error:
+                return
+            request = pniMonitor_snmp.decode(data)
+            response = pniMonitor_snmp.encode(pniMonitor_snmp.RESPONSE, request['request_id'],
+                                              [(o, 1) for o, v in request['varbinds']], 'public')
+            for length in (1, len(response) // 2, len(response) - 1):
+                self.sock.sendto(response[:length], peer)
+            if self.complete:
+                self.sock.sendto(response, peer)
+
+    def test_truncated_response_is_ignored(self):
+        self.complete = True
+        varbinds, latencies = self.session.get([ifName + '.1'])
+        self.assertEqual(varbinds, [(oid(ifName + '.1'), 1)])
+
+    def test_truncated_response_only(self):
+        self.assertRaises(pniMonitor_snmp.SnmpTimeout, self.session.get, [ifName + '.1'])
+        self.assertRaises(pniMonitor_snmp.SnmpTimeout, self.session.get_many, [ifName + '.1'])
+
+
+class NetsnmpFormatTest(unittest.TestCase):
+    # The native backend renders its results as the NetSNMP tools would, for the parsing in pniMonitor.py.
+    def setUp(self):
+        import pniMonitor
+        self.pniMonitor = pniMonitor
+        pniMonitor.cycle.deadline = None
+        self.agent = Agent(view, community=pniMonitor.community)
+        self.agent.start()
+        pniMonitor.snmp_sessions['127.0.0.1'] = Session('127.0.0.1', pniMonitor.community, port=self.agent.address[1])
+        self.router = pniMonitor.Router(1, 'node', 'pw', False, 95, 90, 90, 'acl', True, 2,
+                                        ('CDPautomation_PNI', 'CDPautomation_CDN'), (0, 50), 1, 1, 'native', 'bulk',
+                                        1472)
+
+    def tearDown(self):
+        self.pniMonitor.snmp_sessions.pop('127.0.0.1').close()
+        self.agent.stop()
+
+    def test_netsnmp_format(self):
+        netsnmp_format = self.pniMonitor.netsnmp_format
+        for o, value, quiet, text in [
+                (ifName + '.1', OctetString('Bundle-Ether1'), 'off', 'IF-MIB::ifName.1 = STRING: Bundle-Ether1'),
+                (ifName + '.1', OctetString('Bundle-Ether1'), 'on', 'Bundle-Ether1'),
+                (ifOperStatus + '.1', 1, 'off', 'IF-MIB::ifOperStatus.1 = INTEGER: up(1)'),
+                (ifOperStatus + '.2', 2, 'on', 'down'),
+                (ifHCOutOctets + '.1', Counter64(10 ** 12), 'off',
+                 'IF-MIB::ifHCOutOctets.1 = Counter64: 1000000000000'),
+                (ifHCOutOctets + '.1', Counter64(10 ** 12), 'on', '1000000000000'),
+                (cbgpPeer2State + '.1.4.10.0.0.1', 6, 'on', '6'),
+                (sysUpTime, TimeTicks(123456), 'on', '(123456)'),
+                (ipAddressIfIndex + '.1.4.10.0.0.2', 1, 'off', 'IP-MIB::ipAddressIfIndex.ipv4."10.0.0.2" = INTEGER: 1'),
+                (cbgpPeer2LocalAddr + '.1.4.10.0.0.1', OctetString('\x0a\x00\x00\x02'), 'off',
+                 'SNMPv2-SMI::enterprises.9.9.187.1.2.5.1.6.1.4.10.0.0.1 = Hex-STRING: 0A 00 00 02 '),
+                (ifName + '.999', pniMonitor_snmp.noSuchInstance, 'off',
+                 'IF-MIB::ifName.999 = No Such Instance currently exists at this OID')]:
+            self.assertEqual(netsnmp_format(oid(o), value, quiet), text)
+
+    def test_router_snmp(self):
+        # Compared with the output of snmpwalk / snmpget -Oqv for the same view, as parsed by discovery() and probe().
+        self.assertEqual(self.router.snmp('127.0.0.1', [ifAlias], quiet='off')[:2],
+                         ['IF-MIB::ifAlias.1 = STRING: CDPautomation_PNI to AS65000',
+                          'IF-MIB::ifAlias.2 = STRING: unused'])
+        self.assertEqual(self.router.snmp('127.0.0.1', [ipAddressIfIndex], quiet='off'),
+                         ['IP-MIB::ipAddressIfIndex.ipv4."10.0.0.2" = INTEGER: 1',
+                          'IP-MIB::ipAddressIfIndex.ipv6."20:01:0d:b8:00:00:00:00:00:00:00:00:00:00:00:02" = '
+                          'INTEGER: 1'])
+        self.assertEqual(self.router.snmp('127.0.0.1', [cbgpPeer2LocalAddr], quiet='off'),
+                         ['SNMPv2-SMI::enterprises.9.9.187.1.2.5.1.6.1.4.10.0.0.1 = Hex-STRING: 0A 00 00 02 ',
+                          'SNMPv2-SMI::enterprises.9.9.187.1.2.5.1.6.2.16.32.1.13.184.0.0.0.0.0.0.0.0.0.0.0.1 = '
+                          'Hex-STRING: 20 01 0D B8 00 00 00 00 00 00 00 00 00 00 00 02 '])
+        self.assertEqual(self.router.snmp('127.0.0.1', [ifOperStatus + '.1', ifOperStatus + '.2', ifHCOutOctets + '.3',
+                                                        cbgpPeer2State + '.1.4.10.0.0.1'], cmd='snmpget'),
+                         ['up', 'down', '3000000000000', '6'])
+
+    def test_correlate(self):
+        # The tables walked through the native backend are associated with the PNI interface as NetSNMP's would be.
+        disc = {'Bundle-Ether1': {'ifIndex': '1', 'type': 'pni'}}
+        ipTable = [i.split(' ') for i in self.router.snmp('127.0.0.1', [ipAddressIfIndex], quiet='off')]
+        peerTable = [i.split(' ') for i in self.router.snmp('127.0.0.1', [cbgpPeer2LocalAddr], quiet='off')]
+        self.router.correlate(disc, ['Bundle-Ether1'], ipTable, peerTable)
+        self.assertEqual(disc['Bundle-Ether1']['peer_ipv4'], [('10.0.0.1', '1.4.10.0.0.1')])
+        self.assertEqual(disc['Bundle-Ether1']['peer_ipv6'],
+                         [('20:01:0d:b8:00:00:00:00:00:00:00:00:00:00:00:01',
+                           '2.16.32.1.13.184.0.0.0.0.0.0.0.0.0.0.0.1')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python2.7
+
+import os
+import shutil
+import tempfile
+import logging
+import unittest
+import pniMonitor_store
+
+logging.getLogger('test').addHandler(logging.NullHandler())
+
+
+def sample(ts, names):
+    return dict((name, {'ts': ts, 'adminStatus': 'up', 'operStatus': 'up', 'ifSpeed': '100000',
+                        'ifInOctets': '1000', 'ifOutOctets': '2000'}) for name in names)
+
+
+class RingStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, '.DO_NOT_MODIFY_NODE.prb')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_long_interface_names(self):
+        # Two names that only differ after the first NAME_SIZE bytes must not share a ring.
+        prefix = 'Bundle-Ether1.' + 'x' * pniMonitor_store.NAME_SIZE
+        names = ['Bundle-Ether1', prefix + 'a', prefix + 'b']
+        store = pniMonitor_store.RingStore(self.path, 4)
+        self.assertEqual(store.append(sample('2026-10-18 10:00:00.000000', names)), [prefix + 'a', prefix + 'b'])
+        store.close()
+        store = pniMonitor_store.RingStore(self.path, 4)
+        self.assertEqual(store.names, ['Bundle-Ether1'])
+        self.assertEqual(store.append(sample('2026-10-18 10:00:30.000000', names)), [prefix + 'a', prefix + 'b'])
+        self.assertEqual(store.names, ['Bundle-Ether1'])
+        self.assertEqual(sorted(store.latest()), ['Bundle-Ether1'])
+        store.close()
+
+    def test_corrupt_file_is_recreated(self):
+        store = pniMonitor_store.RingStore(self.path, 4)
+        store.append(sample('2026-10-18 10:00:00.000000', ['Bundle-Ether1']))
+        store.close()
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        for corrupt in (data[:len(pniMonitor_store.MAGIC) + 2], data[:-1], data[:8] + '\xff' * 8 + data[16:]):
+            with open(self.path, 'wb') as f:
+                f.write(corrupt)
+            self.assertRaises(pniMonitor_store.StoreError, pniMonitor_store.RingStore, self.path, 4)
+            cache = pniMonitor_store.SampleCache(logging.getLogger('test'))
+            self.assertEqual(cache.load('NODE', self.path, 4), {})
+            cache.put('NODE', self.path, 4, sample('2026-10-18 10:00:30.000000', ['Bundle-Ether1']))
+            cache.flush()
+            self.assertEqual(pniMonitor_store.SampleCache().load('NODE', self.path, 4)['Bundle-Ether1']['ts'],
+                             '2026-10-18 10:00:30.000000')
+            for store in cache.stores.values():
+                store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()